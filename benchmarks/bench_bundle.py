@@ -0,0 +1,145 @@
+# Benchmark the inference bundle against the pickled model
+#
+# python -m benchmarks.bench_bundle --model_pickle_filename data/trained_classifier.pkl --bundle_dirname data/trained_classifier_bundle
+
+
+import argparse
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from src.config import BUNDLE_DIRNAME, DEFAULT_TEST_MESSAGE, MODEL_PICKLE_FILENAME
+
+
+def _load_and_predict(loader, filename, messages, queue):
+    """
+    Load the model, predict the messages and put the measures in the queue. Run in a fresh process
+
+    Args:
+        loader (str): "pickle" or "bundle"
+        filename (str): pickle filename or bundle directory
+        messages (list): list of messages to be classified
+        queue (multiprocessing.Queue): queue receiving the measures
+
+    Returns:
+        None
+    """
+    from src.classifier import bundle, train
+    from src.memory_usage import get_peak_rss_mb, get_rss_mb
+
+    rss_before = get_rss_mb()
+    start = time.perf_counter()
+    model = (
+        train.load_model(filename, use_bundle=False)
+        if loader == "pickle"
+        else bundle.load_bundle(filename)
+    )
+    load_time = time.perf_counter() - start
+    rss_loaded = get_rss_mb()
+    start = time.perf_counter()
+    category_predicted = model.predict(messages)
+    predict_time = time.perf_counter() - start
+    queue.put(
+        {
+            "load_time": load_time,
+            "predict_time": predict_time,
+            "rss_model_mb": None if rss_before is None else rss_loaded - rss_before,
+            "rss_after_predict_mb": get_rss_mb(),
+            "peak_rss_mb": get_peak_rss_mb(),
+            "category_predicted": np.asarray(category_predicted),
+        }
+    )
+
+
+def measure(loader, filename, messages):
+    """
+    Return the measures of a loader taken in a fresh process
+
+    Args:
+        loader (str): "pickle" or "bundle"
+        filename (str): pickle filename or bundle directory
+        messages (list): list of messages to be classified
+
+    Returns:
+        measures (dict): dictionary of the measures (name, value)
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_load_and_predict, args=(loader, filename, messages, queue))
+    process.start()
+    measures = queue.get()
+    process.join()
+    return measures
+
+
+def run_benchmark(model_pickle_filename, bundle_dirname, messages):
+    """
+    Print load time, predict time, size on disk and resident memory of the pickle and of the bundle
+
+    Args:
+        model_pickle_filename (str): pickle filename
+        bundle_dirname (str): bundle directory
+        messages (list): list of messages to be classified
+
+    Returns:
+        results (dict): dictionary of the measures of each loader (loader, measures)
+    """
+    from src.classifier.bundle import get_bundle_size
+
+    results = {
+        "pickle": measure("pickle", model_pickle_filename, messages),
+        "bundle": measure("bundle", bundle_dirname, messages),
+    }
+    results["pickle"]["size_mb"] = os.path.getsize(model_pickle_filename) / 2**20
+    results["bundle"]["size_mb"] = get_bundle_size(bundle_dirname) / 2**20
+    same_predictions = np.array_equal(
+        results["pickle"].pop("category_predicted"), results["bundle"].pop("category_predicted")
+    )
+    print("{:<24}{:>14}{:>14}".format("", "pickle", "bundle"))
+    for name in results["pickle"]:
+        print(
+            "{:<24}{:>14.3f}{:>14.3f}".format(
+                name,
+                results["pickle"][name] or float("nan"),
+                results["bundle"][name] or float("nan"),
+            )
+        )
+    print("Same predictions: {}".format(same_predictions))
+    return results
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+        bundle_dirname (str): bundle directory. Default value BUNDLE_DIRNAME
+        n_messages (int): number of messages classified after loading
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Bundle Benchmark")
+    parser.add_argument(
+        "--model_pickle_filename",
+        type=str,
+        default=MODEL_PICKLE_FILENAME,
+        help="Pickle filename of the model",
+    )
+    parser.add_argument(
+        "--bundle_dirname", type=str, default=BUNDLE_DIRNAME, help="Directory of the bundle"
+    )
+    parser.add_argument(
+        "--n_messages", type=int, default=100, help="Number of messages classified after loading"
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.model_pickle_filename, args.bundle_dirname, args.n_messages
+
+
+if __name__ == "__main__":
+    print("Benchmark the inference bundle against the pickled model")
+    model_pickle_filename, bundle_dirname, n_messages = parse_input_arguments()
+    run_benchmark(model_pickle_filename, bundle_dirname, [DEFAULT_TEST_MESSAGE] * n_messages)
+else:
+    pass
@@ -0,0 +1,153 @@
+# Benchmark the classifier backends: fit time, latency, throughput, model size and F1 per category
+#
+# python -m benchmarks.bench_classifiers --database_filename data/db.sqlite3 --n_rows 10000
+
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+
+from src.classifier import tokenizer, train
+from src.config import DATABASE_FILENAME
+
+# Number of single message predictions used to measure the latency
+N_LATENCY_MESSAGES = 200
+
+
+def measure_classifier(classifier, X_train, X_test, Y_train, Y_test, n_estimators=100):
+    """
+    Fit the model with the classifier backend and return its measures
+
+    Args:
+        classifier (str): classifier backend (see train.CLASSIFIERS)
+        X_train (list): training messages
+        X_test (list): test messages
+        Y_train (numpy.ndarray): training categories
+        Y_test (numpy.ndarray): test categories
+        n_estimators (int): number of trees of the forest backends. Default value 100
+
+    Returns:
+        measures (dict): dictionary of the measures
+    """
+    model = train.build_model(classifier=classifier)
+    model.set_params(
+        **{name: n_estimators for name in model.get_params() if name.endswith("n_estimators")}
+    )
+    start = time.perf_counter()
+    model.fit(X_train, Y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Y_pred = model.predict(X_test)
+    throughput = len(X_test) / (time.perf_counter() - start)
+
+    latencies = []
+    for message in X_test[:N_LATENCY_MESSAGES]:
+        start = time.perf_counter()
+        model.predict([message])
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "classifier": classifier,
+        "fit_seconds": fit_seconds,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "throughput": throughput,
+        "size_mb": len(pickle.dumps(model)) / 2**20,
+        "f1": [
+            f1_score(Y_test[:, i], Y_pred[:, i], average="macro", zero_division=0)
+            for i in range(Y_test.shape[1])
+        ],
+    }
+
+
+def run_benchmark(X, Y, category_names, classifiers, n_estimators=100):
+    """
+    Fit every classifier backend on the same split and print the measures side by side. The
+    messages are tokenized once before the first fit
+
+    Args:
+        X (list): messages
+        Y (numpy.ndarray): categories
+        category_names (list): list of the category names
+        classifiers (list): list of the classifier backends
+        n_estimators (int): number of trees of the forest backends. Default value 100
+
+    Returns:
+        results (list): list of the dictionaries of the measures
+    """
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=0)
+    tokenizer.pretokenize(X)
+    results = [
+        measure_classifier(classifier, X_train, X_test, Y_train, Y_test, n_estimators)
+        for classifier in classifiers
+    ]
+    tokenizer.clear_corpus_cache()
+
+    print("{:<24}".format("") + "".join("{:>20}".format(r["classifier"]) for r in results))
+    for name, key, value_format in [
+        ("Fit (s)", "fit_seconds", "{:>20.2f}"),
+        ("Latency p50 (ms)", "p50_ms", "{:>20.2f}"),
+        ("Latency p99 (ms)", "p99_ms", "{:>20.2f}"),
+        ("Throughput (msg/s)", "throughput", "{:>20.0f}"),
+        ("Model size (MB)", "size_mb", "{:>20.1f}"),
+    ]:
+        print("{:<24}".format(name) + "".join(value_format.format(r[key]) for r in results))
+    print(
+        "{:<24}".format("Mean F1") + "".join("{:>20.3f}".format(np.mean(r["f1"])) for r in results)
+    )
+    for i, category_name in enumerate(category_names):
+        print(
+            "{:<24}".format("F1 " + category_name)
+            + "".join("{:>20.3f}".format(r["f1"][i]) for r in results)
+        )
+    return results
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename or training snapshot directory. Default value DATABASE_FILENAME
+        classifiers (list): list of the classifier backends
+        n_rows (int): number of messages to be used
+        n_estimators (int): number of trees of the forest backends
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Classifier Benchmark")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data (or training snapshot directory)",
+    )
+    parser.add_argument(
+        "--classifier",
+        type=str,
+        nargs="+",
+        choices=train.CLASSIFIERS,
+        default=train.CLASSIFIERS,
+        help="Classifier backends to be benchmarked",
+    )
+    parser.add_argument(
+        "--n_rows", type=int, default=None, help="Number of messages to be used (default all)"
+    )
+    parser.add_argument("--n_estimators", type=int, default=100, help="Number of trees per forest")
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename, args.classifier, args.n_rows, args.n_estimators
+
+
+if __name__ == "__main__":
+    print("Benchmark the classifier backends")
+    database_filename, classifiers, n_rows, n_estimators = parse_input_arguments()
+    X, Y, category_names = train.load_data(database_filename)
+    run_benchmark(
+        X[:n_rows].tolist(), Y[:n_rows].to_numpy(), category_names, classifiers, n_estimators
+    )
+else:
+    pass
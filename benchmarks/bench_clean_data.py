@@ -0,0 +1,155 @@
+# Benchmark clean_data against the original implementation on a scaled copy of the dataset
+#
+# python -m benchmarks.bench_clean_data --scale 10 100
+
+
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+
+from src.config import CATEGORIES_FILENAME, MESSAGES_FILENAME
+from src.data_preparation import etl_pipeline
+
+
+def reference_clean_data(df):
+    """
+    Original implementation of clean_data, kept as reference for speed and correctness
+
+    Args:
+        df (pandas.DataFrame): dataframe containing the uncleaned dataset
+
+    Returns:
+        df (pandas.DataFrame): dataframe containing the cleaned dataset
+    """
+    categories = df.categories.str.split(pat=";", expand=True)
+    row = categories.iloc[0, :]
+    category_colnames = row.apply(lambda x: x[:-2])
+    categories.columns = category_colnames
+    for column in categories:
+        categories[column] = categories[column].str[-1]
+        categories[column] = categories[column].astype(int)
+    df = df.drop("categories", axis=1)
+    df = pd.concat([df, categories], axis=1)
+    df = df.drop_duplicates()
+    return df
+
+
+def scale_dataframe(df, scale):
+    """
+    Return a copy of the dataset repeated scale times with new ids for every copy
+
+    Args:
+        df (pandas.DataFrame): dataframe containing the uncleaned dataset
+        scale (int): number of copies
+
+    Returns:
+        df (pandas.DataFrame): scaled dataframe
+    """
+    id_offset = int(df["id"].max()) + 1
+    return pd.concat(
+        [df.assign(id=df["id"] + i * id_offset) for i in range(scale)], ignore_index=True
+    )
+
+
+def measure(function, df):
+    """
+    Return the result of the function, the elapsed seconds and the peak of the traced memory
+
+    Args:
+        function (callable): cleaning function
+        df (pandas.DataFrame): dataframe containing the uncleaned dataset
+
+    Returns:
+        result (pandas.DataFrame): result of the function
+        elapsed (float): elapsed seconds
+        peak (float): peak traced memory in MB
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(df)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_benchmark(df, scales):
+    """
+    Clean the scaled datasets with both implementations and print the timings
+
+    Args:
+        df (pandas.DataFrame): dataframe containing the uncleaned dataset
+        scales (list): list of the scale factors
+
+    Returns:
+        results (list): list of the dictionaries of the measures
+    """
+    results = []
+    for scale in scales:
+        scaled = scale_dataframe(df, scale)
+        reference, reference_time, reference_peak = measure(reference_clean_data, scaled)
+        cleaned, elapsed, peak = measure(etl_pipeline.clean_data, scaled)
+        pd.testing.assert_frame_equal(cleaned, reference, check_dtype=False)
+        results.append(
+            {
+                "scale": scale,
+                "rows": len(scaled),
+                "reference_seconds": reference_time,
+                "seconds": elapsed,
+                "reference_peak_mb": reference_peak,
+                "peak_mb": peak,
+            }
+        )
+        print(
+            "Scale {:>4} ({} rows): reference {:.3f}s {:.0f} MB, clean_data {:.3f}s {:.0f} MB, speedup {:.1f}x".format(
+                scale,
+                len(scaled),
+                reference_time,
+                reference_peak,
+                elapsed,
+                peak,
+                reference_time / elapsed,
+            )
+        )
+    return results
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        messages_filename (str): messages filename. Default value MESSAGES_FILENAME
+        categories_filename (str): categories filename. Default value CATEGORIES_FILENAME
+        scales (list): list of the scale factors
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Clean Data Benchmark")
+    parser.add_argument(
+        "--messages_filename",
+        type=str,
+        default=MESSAGES_FILENAME,
+        help="Messages dataset filename",
+    )
+    parser.add_argument(
+        "--categories_filename",
+        type=str,
+        default=CATEGORIES_FILENAME,
+        help="Categories dataset filename",
+    )
+    parser.add_argument(
+        "--scale", type=int, nargs="+", default=[1, 10, 100], help="Scale factors of the dataset"
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.messages_filename, args.categories_filename, args.scale
+
+
+if __name__ == "__main__":
+    print("Benchmark clean_data against the original implementation")
+    messages_filename, categories_filename, scales = parse_input_arguments()
+    df = etl_pipeline.load_data(messages_filename, categories_filename)
+    run_benchmark(df, scales)
+else:
+    pass
@@ -0,0 +1,88 @@
+# Benchmark the training time with the parallelism plan at different numbers of cores
+#
+# python -m benchmarks.bench_parallelism --database_filename data/db.sqlite3 --n_jobs 1 2 4 8 -1
+
+
+import argparse
+import time
+
+from src.classifier import parallelism, tokenizer, train
+from src.config import DATABASE_FILENAME
+
+
+def run_benchmark(X, Y, n_jobs_list, n_estimators=100):
+    """
+    Fit the model built by train.build_model with the plan of each number of cores and print the
+    fit time and the speedup over one core. The messages are tokenized once before the first fit
+
+    Args:
+        X (pandas.Series): messages
+        Y (pandas.DataFrame): dataframe containing the categories
+        n_jobs_list (list): list of the numbers of cores (-1 for all the cores)
+        n_estimators (int): number of trees of each forest. Default value 100
+
+    Returns:
+        results (list): list of the dictionaries of the measures
+    """
+    tokenizer.pretokenize(X)
+    results = []
+    for n_jobs in n_jobs_list:
+        model = train.build_model()
+        model.set_params(clf__estimator__n_estimators=n_estimators)
+        plan = parallelism.make_parallelism_plan(n_jobs, n_outputs=Y.shape[1])
+        parallelism.apply_parallelism_plan(model, plan)
+        start = time.perf_counter()
+        model.fit(X, Y)
+        seconds = time.perf_counter() - start
+        results.append(
+            {"n_cores": parallelism.get_n_cores(n_jobs), "plan": plan._asdict(), "seconds": seconds}
+        )
+        print(
+            "Cores {:>3}: {} fit {:.2f}s speedup {:.1f}x".format(
+                results[-1]["n_cores"], plan, seconds, results[0]["seconds"] / seconds
+            )
+        )
+    tokenizer.clear_corpus_cache()
+    return results
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename or training snapshot directory. Default value DATABASE_FILENAME
+        n_jobs_list (list): list of the numbers of cores
+        n_rows (int): number of messages to be used
+        n_estimators (int): number of trees of each forest
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Parallelism Benchmark")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data (or training snapshot directory)",
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, -1],
+        help="Numbers of cores to be benchmarked (-1 to use all the cores)",
+    )
+    parser.add_argument(
+        "--n_rows", type=int, default=None, help="Number of messages to be used (default all)"
+    )
+    parser.add_argument("--n_estimators", type=int, default=100, help="Number of trees per forest")
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename, args.n_jobs, args.n_rows, args.n_estimators
+
+
+if __name__ == "__main__":
+    print("Benchmark the training time with the parallelism plan")
+    database_filename, n_jobs_list, n_rows, n_estimators = parse_input_arguments()
+    X, Y, category_names = train.load_data(database_filename)
+    run_benchmark(X[:n_rows], Y[:n_rows], n_jobs_list, n_estimators)
+else:
+    pass
@@ -0,0 +1,411 @@
+# End-to-end benchmark of the ETL, training and inference stages on synthetic data
+#
+# python -m benchmarks.bench_pipeline --n_messages 1000 10000 --output_filename bench_pipeline.json
+# python -m benchmarks.bench_pipeline --compare bench_base.json bench_pipeline.json
+
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.model_selection import train_test_split
+
+from benchmarks.synthetic import write_synthetic_dataset
+from src.classifier import tokenizer, train
+from src.data_preparation import etl_pipeline
+from src.memory_usage import get_peak_rss_mb, get_rss_mb, reset_peak_rss
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_N_MESSAGES = [1000, 10000]
+DEFAULT_N_ESTIMATORS = 10
+DEFAULT_N_SINGLE_PREDICTIONS = 100
+# Relative increase of a measure flagged as regression
+DEFAULT_THRESHOLD = 0.2
+# Absolute differences below these are noise and never flagged
+MIN_SECONDS = 0.05
+MIN_MB = 5.0
+COMPARED_METRICS = {"seconds": MIN_SECONDS, "peak_rss_mb": MIN_MB}
+
+
+class SimpleLemmatizer:
+    """
+    Lemmatizer leaving the words unchanged, used with --simple_tokenizer
+    """
+
+    def lemmatize(self, word):
+        return word
+
+
+def use_simple_tokenizer():
+    """
+    Replace the NLTK tokenizer and lemmatizer with a regular expression and no lemmatization, so
+    that the benchmark runs on a machine without the NLTK data. The timings of tokenization are not
+    comparable with runs using NLTK
+
+    Returns:
+        None
+    """
+    tokenizer.word_tokenize = re.compile(r"\w+|[^\w\s]").findall
+    tokenizer._lemmatizer = SimpleLemmatizer()
+    tokenizer.clean_token.cache_clear()
+
+
+class StageRecorder:
+    """
+    Record elapsed time and memory of the stages of a run
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def measure(self, name, items=None):
+        """
+        Context manager measuring a stage: elapsed seconds, peak resident memory during the stage
+        (of the whole process where the peak can not be reset), resident memory growth and throughput
+
+        Args:
+            name (str): stage name
+            items (int): number of items (messages) processed by the stage. Default value None
+
+        Returns:
+            stage (dict): dictionary filled with the measures when the stage ends
+        """
+        stage = {}
+        reset_peak_rss()
+        rss_before = get_rss_mb()
+        start = time.perf_counter()
+        yield stage
+        stage["seconds"] = time.perf_counter() - start
+        stage["peak_rss_mb"] = get_peak_rss_mb()
+        rss_after = get_rss_mb()
+        if rss_before is not None and rss_after is not None:
+            stage["rss_delta_mb"] = rss_after - rss_before
+        if items is not None:
+            stage["items"] = items
+            stage["items_per_second"] = items / stage["seconds"] if stage["seconds"] > 0 else None
+        self.stages[name] = stage
+
+
+def run_pipeline(
+    n_messages,
+    dirname,
+    classifier=train.DEFAULT_CLASSIFIER,
+    vectorizer=train.DEFAULT_VECTORIZER,
+    n_estimators=DEFAULT_N_ESTIMATORS,
+    n_single_predictions=DEFAULT_N_SINGLE_PREDICTIONS,
+    seed=0,
+):
+    """
+    Run all the stages on a synthetic dataset and measure each of them
+
+    Args:
+        n_messages (int): number of messages of the synthetic dataset
+        dirname (str): working directory for the csv files, the database and the model
+        classifier (str): classifier backend (see train.build_classifier). Default value train.DEFAULT_CLASSIFIER
+        vectorizer (str): vectorizer (see train.build_vectorizer). Default value train.DEFAULT_VECTORIZER
+        n_estimators (int): number of trees of the forests. Default value DEFAULT_N_ESTIMATORS
+        n_single_predictions (int): number of messages classified one at a time. Default value DEFAULT_N_SINGLE_PREDICTIONS
+        seed (int): seed of the dataset and of the split. Default value 0
+
+    Returns:
+        stages (dict): dictionary of the measures of every stage (name, measures)
+    """
+    messages_filename, categories_filename = write_synthetic_dataset(dirname, n_messages, seed)
+    database_filename = os.path.join(dirname, "db.sqlite3")
+    model_pickle_filename = os.path.join(dirname, "trained_classifier.pkl")
+    recorder = StageRecorder()
+
+    with recorder.measure("etl_load_data"):
+        df = etl_pipeline.load_data(messages_filename, categories_filename)
+    with recorder.measure("etl_clean_data", len(df)):
+        df = etl_pipeline.clean_data(df)
+    with recorder.measure("etl_save_data", len(df)):
+        etl_pipeline.save_data(df, database_filename)
+    del df
+
+    with recorder.measure("train_load_data"):
+        X, Y, category_names = train.load_data(database_filename)
+    X_train, X_test, Y_train, _ = train_test_split(X, Y, test_size=0.2, random_state=seed)
+
+    tokenizer.clear_corpus_cache()
+    tokenizer.clean_token.cache_clear()
+    with recorder.measure("tokenize", len(X_train)):
+        tokenizer.pretokenize(X_train)
+
+    model = train.build_model(classifier=classifier, vectorizer=vectorizer)
+    model.set_params(
+        **{name: n_estimators for name in model.get_params() if name.endswith("n_estimators")}
+    )
+    with recorder.measure("fit", len(X_train)):
+        model.fit(X_train, Y_train)
+    with recorder.measure("save_model"):
+        train.save_model(model, model_pickle_filename, category_names)
+    del model
+    tokenizer.clear_corpus_cache()
+    with recorder.measure("load_model"):
+        model = train.load_model(model_pickle_filename)
+
+    single_messages = list(X_test[:n_single_predictions])
+    latencies = []
+    with recorder.measure("predict_single", len(single_messages)) as stage:
+        for message in single_messages:
+            start = time.perf_counter()
+            model.predict([message])
+            latencies.append(time.perf_counter() - start)
+    if len(latencies) > 0:
+        stage["p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+        stage["p99_ms"] = float(np.percentile(latencies, 99) * 1000)
+    with recorder.measure("predict_batch", len(X_test)):
+        model.predict(list(X_test))
+    tokenizer.clear_corpus_cache()
+    return recorder.stages
+
+
+def get_environment():
+    """
+    Return the versions and the hardware the benchmark ran on
+
+    Returns:
+        environment (dict): dictionary of the environment
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def run_benchmark(n_messages_list, output_filename=None, simple_tokenizer=False, **pipeline_params):
+    """
+    Run the pipeline for every dataset size and save the results in a json file
+
+    Args:
+        n_messages_list (list): list of the numbers of messages
+        output_filename (str): json filename of the results. Default value None (In case of None the results are not saved)
+        simple_tokenizer (bool): if True use the tokenizer without NLTK data (see use_simple_tokenizer). Default value False
+        **pipeline_params: classifier, vectorizer, n_estimators, n_single_predictions and seed of run_pipeline
+
+    Returns:
+        results (dict): environment, parameters and stages of every run
+    """
+    if simple_tokenizer is True:
+        use_simple_tokenizer()
+    else:
+        tokenizer.download_nltk_data(download=False)
+    results = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": get_environment(),
+        "params": {**pipeline_params, "simple_tokenizer": simple_tokenizer},
+        "runs": [],
+    }
+    for n_messages in n_messages_list:
+        with tempfile.TemporaryDirectory() as dirname:
+            stages = run_pipeline(n_messages, dirname, **pipeline_params)
+        results["runs"].append({"n_messages": n_messages, "stages": stages})
+        print("Messages: {}".format(n_messages))
+        for name, stage in stages.items():
+            print(
+                "    {:<16} {:>9.3f} s {:>8.1f} MB".format(
+                    name, stage["seconds"], stage["peak_rss_mb"] or 0.0
+                )
+            )
+    if output_filename is not None:
+        with open(output_filename, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Results saved in {}".format(output_filename))
+    return results
+
+
+def compare_results(base, new, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the stages of two benchmark results run on the same dataset sizes. A measure is a
+    regression when it grows more than threshold and more than the noise level of its metric
+    (COMPARED_METRICS)
+
+    Args:
+        base (dict): results of the reference run
+        new (dict): results of the run to check
+        threshold (float): relative increase flagged as regression. Default value DEFAULT_THRESHOLD
+
+    Returns:
+        comparison (list): list of dictionaries (n_messages, stage, metric, base, new, ratio, regression)
+    """
+    base_runs = {run["n_messages"]: run["stages"] for run in base["runs"]}
+    comparison = []
+    for run in new["runs"]:
+        base_stages = base_runs.get(run["n_messages"], {})
+        for name, stage in run["stages"].items():
+            for metric, noise in COMPARED_METRICS.items():
+                base_value = base_stages.get(name, {}).get(metric)
+                new_value = stage.get(metric)
+                if base_value is None or new_value is None:
+                    continue
+                comparison.append(
+                    {
+                        "n_messages": run["n_messages"],
+                        "stage": name,
+                        "metric": metric,
+                        "base": base_value,
+                        "new": new_value,
+                        "ratio": new_value / base_value if base_value > 0 else None,
+                        "regression": new_value > base_value * (1 + threshold)
+                        and new_value - base_value > noise,
+                    }
+                )
+    return comparison
+
+
+def print_comparison(comparison):
+    """
+    Print the comparison of two benchmark results
+
+    Args:
+        comparison (list): list returned by compare_results
+
+    Returns:
+        None
+    """
+    for row in comparison:
+        print(
+            "{:>8} {:<16} {:<12} {:>10.3f} {:>10.3f} {:>7} {}".format(
+                row["n_messages"],
+                row["stage"],
+                row["metric"],
+                row["base"],
+                row["new"],
+                "-" if row["ratio"] is None else "{:.2f}x".format(row["ratio"]),
+                "REGRESSION" if row["regression"] else "",
+            )
+        )
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        n_messages_list (list): list of the numbers of messages
+        output_filename (str): json filename of the results
+        simple_tokenizer (bool): if True use the tokenizer without NLTK data
+        pipeline_params (dict): classifier, vectorizer, n_estimators, n_single_predictions and seed
+        compare_filenames (list): json filenames of the base and new results to compare or None
+        threshold (float): relative increase flagged as regression
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline End-to-end Benchmark")
+    parser.add_argument(
+        "--n_messages",
+        type=int,
+        nargs="+",
+        default=DEFAULT_N_MESSAGES,
+        help="Numbers of messages of the synthetic datasets",
+    )
+    parser.add_argument(
+        "--output_filename",
+        type=str,
+        default="bench_pipeline.json",
+        help="Json filename of the results",
+    )
+    parser.add_argument(
+        "--simple_tokenizer",
+        action="store_true",
+        default=False,
+        help="Tokenize without the NLTK data (regular expression, no lemmatization)",
+    )
+    parser.add_argument(
+        "--classifier",
+        type=str,
+        choices=train.CLASSIFIERS,
+        default=train.DEFAULT_CLASSIFIER,
+        help="Classifier backend",
+    )
+    parser.add_argument(
+        "--vectorizer",
+        type=str,
+        choices=train.VECTORIZERS,
+        default=train.DEFAULT_VECTORIZER,
+        help="Vectorizer",
+    )
+    parser.add_argument(
+        "--n_estimators",
+        type=int,
+        default=DEFAULT_N_ESTIMATORS,
+        help="Number of trees of the forests",
+    )
+    parser.add_argument(
+        "--n_single_predictions",
+        type=int,
+        default=DEFAULT_N_SINGLE_PREDICTIONS,
+        help="Number of messages classified one at a time",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the dataset and of the split")
+    parser.add_argument(
+        "--compare",
+        type=str,
+        nargs=2,
+        default=None,
+        metavar=("BASE", "NEW"),
+        help="Compare two json results instead of running the benchmark",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Relative increase of time or memory flagged as regression",
+    )
+    args = parser.parse_args()
+    # print(args)
+    pipeline_params = {
+        "classifier": args.classifier,
+        "vectorizer": args.vectorizer,
+        "n_estimators": args.n_estimators,
+        "n_single_predictions": args.n_single_predictions,
+        "seed": args.seed,
+    }
+    return (
+        args.n_messages,
+        args.output_filename,
+        args.simple_tokenizer,
+        pipeline_params,
+        args.compare,
+        args.threshold,
+    )
+
+
+if __name__ == "__main__":
+    print("End-to-end benchmark of the ETL, training and inference stages")
+    (
+        n_messages_list,
+        output_filename,
+        simple_tokenizer,
+        pipeline_params,
+        compare_filenames,
+        threshold,
+    ) = parse_input_arguments()
+    if compare_filenames is not None:
+        with open(compare_filenames[0]) as f:
+            base = json.load(f)
+        with open(compare_filenames[1]) as f:
+            new = json.load(f)
+        comparison = compare_results(base, new, threshold)
+        print_comparison(comparison)
+        n_regressions = sum(row["regression"] for row in comparison)
+        print("Regressions: {}".format(n_regressions))
+        # A non zero exit code lets a CI job fail on regressions
+        sys.exit(1 if n_regressions > 0 else 0)
+    run_benchmark(n_messages_list, output_filename, simple_tokenizer, **pipeline_params)
+else:
+    pass
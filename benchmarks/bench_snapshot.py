@@ -0,0 +1,112 @@
+# Benchmark loading the training data from the database and from the training snapshot
+#
+# python -m benchmarks.bench_snapshot --database_filename data/db.sqlite3 --scale 1 10
+
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_clean_data import scale_dataframe
+from src.classifier import train
+from src.config import DATABASE_FILENAME
+from src.data_preparation import database, snapshot
+from src.memory_usage import get_rss_mb
+
+
+def measure_load(path):
+    """
+    Load the training data with train.load_data and return the measures
+
+    Args:
+        path (str): database filename or training snapshot directory
+
+    Returns:
+        seconds (float): elapsed seconds
+        rss_mb (float): increase of the resident memory in MB
+    """
+    rss = get_rss_mb()
+    start = time.perf_counter()
+    _ = train.load_data(path)
+    seconds = time.perf_counter() - start
+    return seconds, get_rss_mb() - rss
+
+
+def run_benchmark(df, scales):
+    """
+    Write the scaled datasets in a database, export the snapshot and compare the load times
+
+    Args:
+        df (pandas.DataFrame): dataframe containing the cleaned dataset
+        scales (list): list of the scale factors
+
+    Returns:
+        results (list): list of the dictionaries of the measures
+    """
+    results = []
+    for scale in scales:
+        scaled = scale_dataframe(df, scale)
+        with tempfile.TemporaryDirectory() as dirname:
+            database_filename = os.path.join(dirname, "db.sqlite3")
+            snapshot_dirname = os.path.join(dirname, "snapshot")
+            database.write_messages(database_filename, scaled)
+            start = time.perf_counter()
+            snapshot.export_snapshot(database_filename, snapshot_dirname)
+            export_seconds = time.perf_counter() - start
+            database_seconds, database_rss = measure_load(database_filename)
+            snapshot_seconds, snapshot_rss = measure_load(snapshot_dirname)
+        results.append(
+            {
+                "scale": scale,
+                "rows": len(scaled),
+                "export_seconds": export_seconds,
+                "database_seconds": database_seconds,
+                "snapshot_seconds": snapshot_seconds,
+            }
+        )
+        print(
+            "Scale {:>4} ({} rows): export {:.3f}s, load database {:.3f}s (+{:.0f} MB), "
+            "load snapshot {:.3f}s (+{:.0f} MB), speedup {:.1f}x".format(
+                scale,
+                len(scaled),
+                export_seconds,
+                database_seconds,
+                database_rss,
+                snapshot_seconds,
+                snapshot_rss,
+                database_seconds / snapshot_seconds,
+            )
+        )
+    return results
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        scales (list): list of the scale factors
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Snapshot Benchmark")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data",
+    )
+    parser.add_argument(
+        "--scale", type=int, nargs="+", default=[1, 10], help="Scale factors of the dataset"
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename, args.scale
+
+
+if __name__ == "__main__":
+    print("Benchmark loading the training data from the database and from the snapshot")
+    database_filename, scales = parse_input_arguments()
+    run_benchmark(train.get_df_from_database(database_filename), scales)
+else:
+    pass
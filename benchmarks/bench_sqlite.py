@@ -0,0 +1,185 @@
+# Benchmark the SQLite writer and reader against pandas to_sql and read_sql_table
+#
+# python -m benchmarks.bench_sqlite --scale 1 10
+
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from benchmarks.bench_clean_data import scale_dataframe
+from src.config import CATEGORIES_FILENAME, MESSAGES_FILENAME, TABLE_NAME
+from src.data_preparation import database, etl_pipeline
+
+
+def reference_write(database_filename, df):
+    """
+    Original implementation of save_data: pandas to_sql through SQLAlchemy
+
+    Args:
+        database_filename (str): database filename
+        df (pandas.DataFrame): dataframe containing the cleaned dataset
+
+    Returns:
+        None
+    """
+    engine = create_engine("sqlite:///" + database_filename)
+    df.to_sql(TABLE_NAME, engine, index=False, if_exists="replace")
+    engine.dispose()
+
+
+def reference_read(database_filename):
+    """
+    Original implementation of get_df_from_database: pandas read_sql_table through SQLAlchemy
+
+    Args:
+        database_filename (str): database filename
+
+    Returns:
+        df (pandas.DataFrame): dataframe containing the data
+    """
+    engine = create_engine("sqlite:///" + database_filename)
+    df = pd.read_sql_table(TABLE_NAME, engine)
+    engine.dispose()
+    return df
+
+
+def get_database_size(database_filename):
+    """
+    Return the size of the database including the write-ahead log
+
+    Args:
+        database_filename (str): database filename
+
+    Returns:
+        size (float): size in MB
+    """
+    filenames = [database_filename, database_filename + "-wal"]
+    return sum(os.path.getsize(f) for f in filenames if os.path.exists(f)) / 2**20
+
+
+def measure(df, write, read, dirname, name):
+    """
+    Write and read the dataset in a new database and return the measures
+
+    Args:
+        df (pandas.DataFrame): dataframe containing the cleaned dataset
+        write (callable): function writing the dataframe, called as write(database_filename, df)
+        read (callable): function reading the dataframe, called as read(database_filename)
+        dirname (str): directory of the database
+        name (str): name of the measure
+
+    Returns:
+        measures (dict): dictionary of the measures
+    """
+    database_filename = os.path.join(dirname, name + ".sqlite3")
+    start = time.perf_counter()
+    write(database_filename, df)
+    write_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    result = read(database_filename)
+    read_seconds = time.perf_counter() - start
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), df.reset_index(drop=True), check_dtype=False
+    )
+    return {
+        "name": name,
+        "write_seconds": write_seconds,
+        "read_seconds": read_seconds,
+        "size_mb": get_database_size(database_filename),
+    }
+
+
+def run_benchmark(df, scales, pragmas_list):
+    """
+    Write and read the scaled datasets with to_sql/read_sql_table and with the database writer and
+    reader using each set of pragmas, and print the measures
+
+    Args:
+        df (pandas.DataFrame): dataframe containing the cleaned dataset
+        scales (list): list of the scale factors
+        pragmas_list (list): list of the dictionaries of pragmas used by the writer
+
+    Returns:
+        results (list): list of the dictionaries of the measures
+    """
+    results = []
+    for scale in scales:
+        scaled = scale_dataframe(df, scale)
+        print("Scale {} ({} rows)".format(scale, len(scaled)))
+        with tempfile.TemporaryDirectory() as dirname:
+            measures = [measure(scaled, reference_write, reference_read, dirname, "to_sql")]
+            for i, pragmas in enumerate(pragmas_list):
+                measures.append(
+                    measure(
+                        scaled,
+                        lambda f, df, pragmas=pragmas: database.write_messages(
+                            f, df, pragmas=pragmas
+                        ),
+                        database.read_messages,
+                        dirname,
+                        "writer_{}".format(i),
+                    )
+                )
+                measures[-1]["pragmas"] = pragmas
+        for m in measures:
+            m["scale"] = scale
+            print(
+                "    {:<10} write {:>7.3f}s  read {:>7.3f}s  size {:>8.1f} MB  {}".format(
+                    m["name"],
+                    m["write_seconds"],
+                    m["read_seconds"],
+                    m["size_mb"],
+                    m.get("pragmas", ""),
+                )
+            )
+        results += measures
+    return results
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        messages_filename (str): messages filename. Default value MESSAGES_FILENAME
+        categories_filename (str): categories filename. Default value CATEGORIES_FILENAME
+        scales (list): list of the scale factors
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline SQLite Benchmark")
+    parser.add_argument(
+        "--messages_filename",
+        type=str,
+        default=MESSAGES_FILENAME,
+        help="Messages dataset filename",
+    )
+    parser.add_argument(
+        "--categories_filename",
+        type=str,
+        default=CATEGORIES_FILENAME,
+        help="Categories dataset filename",
+    )
+    parser.add_argument(
+        "--scale", type=int, nargs="+", default=[1, 10], help="Scale factors of the dataset"
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.messages_filename, args.categories_filename, args.scale
+
+
+if __name__ == "__main__":
+    print("Benchmark the SQLite writer and reader against to_sql and read_sql_table")
+    messages_filename, categories_filename, scales = parse_input_arguments()
+    df = etl_pipeline.clean_data(etl_pipeline.load_data(messages_filename, categories_filename))
+    pragmas_list = [
+        {"journal_mode": None, "synchronous": "FULL", "page_size": None},
+        database.DEFAULT_PRAGMAS,
+        {"journal_mode": "WAL", "synchronous": "NORMAL", "page_size": 8192},
+    ]
+    run_benchmark(df, scales, pragmas_list)
+else:
+    pass
@@ -0,0 +1,148 @@
+# Benchmark the tokenizer against the original my_tokenizer implementation
+#
+# python -m benchmarks.bench_tokenizer --messages_filename data/disaster_messages.csv --n_jobs 4
+
+
+import argparse
+import os
+import re
+import time
+
+import pandas as pd
+from nltk.stem import WordNetLemmatizer
+from nltk.tokenize import word_tokenize
+
+from src.classifier import tokenizer
+from src.config import MESSAGES_FILENAME
+
+
+def reference_tokenizer(text):
+    """
+    Original implementation of my_tokenizer, kept as reference for speed and correctness
+
+    Args:
+        text (str): input text
+
+    Returns:
+        clean_tokens (list): tokens obtained from the input text
+    """
+    url_regex = r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+    detected_urls = re.findall(url_regex, text)
+    for url in detected_urls:
+        text = text.replace(url, "urlplaceholder")
+
+    tokens = word_tokenize(text)
+    lemmatizer = WordNetLemmatizer()
+
+    clean_tokens = []
+    for tok in tokens:
+        clean_tok = lemmatizer.lemmatize(tok).lower().strip()
+        clean_tokens.append(clean_tok)
+
+    return clean_tokens
+
+
+def timed(function, *args):
+    """
+    Return the result of the function and the elapsed seconds
+
+    Args:
+        function (callable): function to be called
+        *args: arguments of the function
+
+    Returns:
+        result: result of the function
+        elapsed (float): elapsed seconds
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run_benchmark(messages, n_jobs=1, n_folds=5):
+    """
+    Tokenize the messages with the reference implementation and with the tokenizer and print the timings
+
+    Args:
+        messages (list): list of the messages
+        n_jobs (int): number of processes used by pretokenize. Default value 1
+        n_folds (int): number of passes over the corpus simulated after pretokenize. Default value 5
+
+    Returns:
+        timings (dict): dictionary of the elapsed seconds (benchmark, seconds)
+    """
+    # The messages are tokenized as the vectorizers of the model pass them to the tokenizer
+    messages = [tokenizer.preprocess(message) for message in messages]
+    timings = {}
+    reference, timings["reference"] = timed(lambda: [reference_tokenizer(m) for m in messages])
+
+    tokenizer.clean_token.cache_clear()
+    tokenizer.clear_corpus_cache()
+    cold, timings["tokenize_cold"] = timed(lambda: [tokenizer.tokenize(m) for m in messages])
+    warm, timings["tokenize_warm_lemma_cache"] = timed(
+        lambda: [tokenizer.tokenize(m) for m in messages]
+    )
+
+    tokenizer.clean_token.cache_clear()
+    pretokenized, timings["pretokenize"] = timed(tokenizer.pretokenize, messages, n_jobs)
+    _, timings["pretokenized_passes"] = timed(
+        lambda: [[tokenizer.tokenize(m) for m in messages] for _ in range(n_folds)]
+    )
+    tokenizer.clear_corpus_cache()
+
+    if not (reference == cold == warm == pretokenized):
+        raise AssertionError("The tokenizer does not produce the same tokens of the reference")
+
+    reference_total = timings["reference"] * (n_folds + 1)
+    pretokenized_total = timings["pretokenize"] + timings["pretokenized_passes"]
+    print("Messages: {}".format(len(messages)))
+    for name, seconds in timings.items():
+        print("    {:<28}{:>10.3f}s".format(name, seconds))
+    print(
+        "Speedup of a single pass: {:.1f}x".format(timings["reference"] / timings["tokenize_cold"])
+    )
+    print(
+        "Speedup of {} passes (e.g. fit + {} folds): {:.1f}x".format(
+            n_folds + 1, n_folds, reference_total / pretokenized_total
+        )
+    )
+    return timings
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        messages_filename (str): messages filename. Default value MESSAGES_FILENAME
+        n_jobs (int): number of processes used by pretokenize
+        n_rows (int): number of messages to be used
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Tokenizer Benchmark")
+    parser.add_argument(
+        "--messages_filename",
+        type=str,
+        default=MESSAGES_FILENAME,
+        help="Messages dataset filename",
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes used to pre-tokenize the messages",
+    )
+    parser.add_argument(
+        "--n_rows", type=int, default=None, help="Number of messages to be used (default all)"
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.messages_filename, args.n_jobs, args.n_rows
+
+
+if __name__ == "__main__":
+    print("Benchmark the tokenizer against the original my_tokenizer implementation")
+    messages_filename, n_jobs, n_rows = parse_input_arguments()
+    messages = pd.read_csv(messages_filename, nrows=n_rows)["message"].astype(str).tolist()
+    run_benchmark(messages, n_jobs)
+else:
+    pass
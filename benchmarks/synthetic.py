@@ -0,0 +1,195 @@
+# Synthetic dataset shaped like disaster_messages.csv and disaster_categories.csv
+#
+# python -m benchmarks.synthetic --n_messages 10000 --dirname data/synthetic
+
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+CATEGORY_NAMES = [
+    "related",
+    "request",
+    "offer",
+    "aid_related",
+    "medical_help",
+    "medical_products",
+    "search_and_rescue",
+    "security",
+    "military",
+    "child_alone",
+    "water",
+    "food",
+    "shelter",
+    "clothing",
+    "money",
+    "missing_people",
+    "refugees",
+    "death",
+    "other_aid",
+    "infrastructure_related",
+    "transport",
+    "buildings",
+    "electricity",
+    "tools",
+    "hospitals",
+    "shops",
+    "aid_centers",
+    "other_infrastructure",
+    "weather_related",
+    "floods",
+    "storm",
+    "fire",
+    "earthquake",
+    "cold",
+    "other_weather",
+    "direct_report",
+]
+GENRES = ["direct", "news", "social"]
+GENRE_WEIGHTS = [0.41, 0.50, 0.09]
+FILLER_WORDS = [
+    "the",
+    "we",
+    "are",
+    "in",
+    "please",
+    "people",
+    "area",
+    "help",
+    "need",
+    "there",
+    "is",
+    "no",
+    "our",
+    "village",
+    "city",
+    "since",
+    "yesterday",
+    "government",
+    "report",
+    "thank",
+    "you",
+    "situation",
+    "still",
+    "many",
+    "families",
+]
+# Fraction of the messages repeated with the same id, as in the original dataset
+DUPLICATE_FRACTION = 0.01
+URL = "http://example.com/news"
+
+
+def make_synthetic_dataset(n_messages, seed=0):
+    """
+    Return messages and categories dataframes with the columns and formats of the original csv files.
+    Every category has its name as keyword, so that a model can learn them: related is 1 for most
+    messages and 2 for a few of them, child_alone is always 0 and about 1% of the rows are duplicated
+
+    Args:
+        n_messages (int): number of messages
+        seed (int): seed of the random generator. Default value 0
+
+    Returns:
+        messages (pandas.DataFrame): dataframe with the columns id, message, original and genre
+        categories (pandas.DataFrame): dataframe with the columns id and categories
+    """
+    rng = np.random.default_rng(seed)
+    n_categories = len(CATEGORY_NAMES)
+    # About 76% of the messages are related and only those have other categories, with
+    # frequencies between 0.5% and 55% of the related messages
+    related = (rng.random(n_messages) < 0.76).astype(np.uint8)
+    related[(related == 0) & (rng.random(n_messages) < 0.01)] = 2
+    frequencies = rng.permutation(np.geomspace(0.55, 0.005, n_categories - 1))
+    labels = (rng.random((n_messages, n_categories - 1)) < frequencies).astype(np.uint8)
+    labels[related != 1] = 0
+    labels[:, CATEGORY_NAMES.index("child_alone") - 1] = 0
+    labels = np.column_stack([related, labels])
+
+    n_words = rng.integers(5, 30, size=n_messages)
+    messages = []
+    for i in range(n_messages):
+        words = list(rng.choice(FILLER_WORDS, size=n_words[i]))
+        for j in np.flatnonzero(labels[i, 1:]) + 1:
+            words.insert(int(rng.integers(0, len(words) + 1)), CATEGORY_NAMES[j])
+        if rng.random() < 0.02:
+            words.append(URL)
+        messages.append(" ".join(words).capitalize())
+
+    ids = np.arange(2, 2 + n_messages)
+    duplicates = rng.choice(n_messages, size=int(n_messages * DUPLICATE_FRACTION), replace=False)
+    order = np.sort(np.concatenate([np.arange(n_messages), duplicates]))
+    genre = rng.choice(GENRES, size=n_messages, p=GENRE_WEIGHTS)
+    messages_df = pd.DataFrame(
+        {
+            "id": ids[order],
+            "message": np.array(messages, dtype=object)[order],
+            "original": np.where(genre == "direct", "Original message", None)[order],
+            "genre": genre[order],
+        }
+    )
+    categories_df = pd.DataFrame(
+        {
+            "id": ids[order],
+            "categories": [
+                ";".join(
+                    "{}-{}".format(name, value)
+                    for name, value in zip(CATEGORY_NAMES, labels[i].tolist(), strict=True)
+                )
+                for i in order
+            ],
+        }
+    )
+    return messages_df, categories_df
+
+
+def write_synthetic_dataset(dirname, n_messages, seed=0):
+    """
+    Write a synthetic dataset in csv files named like the original ones
+
+    Args:
+        dirname (str): destination directory
+        n_messages (int): number of messages
+        seed (int): seed of the random generator. Default value 0
+
+    Returns:
+        messages_filename (str): messages filename
+        categories_filename (str): categories filename
+    """
+    os.makedirs(dirname, exist_ok=True)
+    messages_df, categories_df = make_synthetic_dataset(n_messages, seed)
+    messages_filename = os.path.join(dirname, "disaster_messages.csv")
+    categories_filename = os.path.join(dirname, "disaster_categories.csv")
+    messages_df.to_csv(messages_filename, index=False)
+    categories_df.to_csv(categories_filename, index=False)
+    return messages_filename, categories_filename
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        n_messages (int): number of messages
+        dirname (str): destination directory
+        seed (int): seed of the random generator
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Synthetic Dataset")
+    parser.add_argument("--n_messages", type=int, default=10000, help="Number of messages")
+    parser.add_argument(
+        "--dirname", type=str, default="data/synthetic", help="Destination directory"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    args = parser.parse_args()
+    # print(args)
+    return args.n_messages, args.dirname, args.seed
+
+
+if __name__ == "__main__":
+    print("Synthetic dataset")
+    n_messages, dirname, seed = parse_input_arguments()
+    messages_filename, categories_filename = write_synthetic_dataset(dirname, n_messages, seed)
+    print("Messages: {}\nCategories: {}".format(messages_filename, categories_filename))
+else:
+    pass
@@ -3,13 +3,23 @@
 # python dash_app.py
 
 
+import os
+import threading
+
 import dash
 import dash_bootstrap_components as dbc
+import flask
 import plotly.graph_objs as go
 import disaster_response_pipeline
+from src.config import DATABASE_FILENAME
+from src.data_preparation import metadata
+from src.inference import metrics, registry
 
 
 MAX_INPUT_LENGTH = 512
+# Figures of the overview of the training dataset for each database (path, (identity, figures))
+_overview_figures = {}
+_overview_figures_lock = threading.Lock()
 EXTERNAL_STYLESHEETS = [
     "https://maxcdn.bootstrapcdn.com/bootstrap/3.3.7/css/bootstrap.min.css",
     {
@@ -28,9 +38,101 @@ EXTERNAL_STYLESHEETS = [
 ]
 
 
-def _create_app():
+def _build_overview_figures(database_filename=DATABASE_FILENAME):
+    """
+    Build the figures of the overview of the training dataset
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+
+    Returns:
+        figures (dict): dictionary of the figures as plotly json dictionaries (name, figure)
+    """
+    genre_distribution = disaster_response_pipeline.get_genre_distribution(database_filename)
+    top_n_categories = disaster_response_pipeline.get_top_n_categories(database_filename)
+    category_cooccurrence = disaster_response_pipeline.get_category_cooccurrence(database_filename)
+    return {
+        "genre_distribution": go.Figure(
+            data=[
+                go.Bar(
+                    x=list(genre_distribution.keys()),
+                    y=list(genre_distribution.values()),
+                    name="Count",
+                    marker=go.bar.Marker(color="rgb(55, 83, 109)"),
+                )
+            ],
+            layout=go.Layout(
+                title="Message Genre Distribution",
+                showlegend=True,
+                legend=go.layout.Legend(x=0, y=1.0),
+                margin=go.layout.Margin(l=40, r=0, t=40, b=30),
+            ),
+        ).to_dict(),
+        "categories_distribution": go.Figure(
+            data=[
+                go.Bar(
+                    x=list(top_n_categories.keys()),
+                    y=list(top_n_categories.values()),
+                    name="Count",
+                    marker=go.bar.Marker(color="rgb(55, 83, 109)"),
+                )
+            ],
+            layout=go.Layout(
+                title="Categories Distribution",
+                showlegend=True,
+                legend=go.layout.Legend(x=0, y=1.0),
+                margin=go.layout.Margin(l=40, r=0, t=40, b=30),
+            ),
+        ).to_dict(),
+        "categories_cooccurrence": go.Figure(
+            data=[
+                go.Heatmap(
+                    z=category_cooccurrence.values.tolist(),
+                    x=list(category_cooccurrence.columns),
+                    y=list(category_cooccurrence.index),
+                    colorscale="Blues",
+                )
+            ],
+            layout=go.Layout(
+                title="Categories Co-occurrence",
+                margin=go.layout.Margin(l=120, r=0, t=40, b=120),
+            ),
+        ).to_dict(),
+    }
+
+
+def get_overview_figures(database_filename=DATABASE_FILENAME):
+    """
+    Return the figures of the overview of the training dataset. They are built from the aggregates
+    of the dataset metadata, so the cost does not depend on the number of messages, and cached in
+    process until the database file changes
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+
+    Returns:
+        figures (dict): dictionary of the figures as plotly json dictionaries (name, figure)
+    """
+    identity = metadata.get_metadata(database_filename).identity
+    cached = _overview_figures.get(identity[0])
+    if cached is not None and cached[0] == identity:
+        return cached[1]
+    with _overview_figures_lock:
+        cached = _overview_figures.get(identity[0])
+        if cached is None or cached[0] != identity:
+            cached = (identity, _build_overview_figures(database_filename))
+            _overview_figures[identity[0]] = cached
+    return cached[1]
+
+
+def _create_app(wait_for_model=False):
     """
-    Creates dash application
+    Creates dash application. If the model is not present it is trained in a background process
+    while the application already answers: until the model is loaded the results show that the
+    model is warming up and GET /ready answers 503
+
+    Args:
+        wait_for_model (bool): if True train (if needed) and load the model before returning. Default value False
 
     Returns:
         app (dash.Dash): Dash application
@@ -38,7 +140,44 @@ def _create_app():
 
     app = dash.Dash(__name__, external_stylesheets=EXTERNAL_STYLESHEETS)
 
-    model = disaster_response_pipeline.load_pipeline()
+    # The model is reloaded in the background when the pickle file is rewritten (e.g. by training)
+    model_registry = registry.ModelRegistry()
+    training_process = None
+    if wait_for_model is True:
+        disaster_response_pipeline.prepare_model()
+    else:
+        training_process = disaster_response_pipeline.start_background_training()
+    model_registry.reload()
+    model_registry.start()
+
+    @app.server.route("/ready")
+    def ready():
+        """
+        Readiness endpoint: 200 once the model is loaded, 503 while it is warming up or if the training failed
+
+        Returns:
+            response (tuple): json status and HTTP status code
+        """
+        is_ready, status = registry.get_readiness(model_registry, training_process)
+        return flask.jsonify(status), 200 if is_ready else 503
+
+    @app.server.route("/metrics")
+    def prometheus_metrics():
+        """
+        Metrics endpoint: requests, latency of the stages of the model, batch sizes and prediction
+        cache hits in the Prometheus text format
+
+        Returns:
+            response (flask.Response): metrics as text
+        """
+        current = model_registry.get()
+        return flask.Response(
+            disaster_response_pipeline.inference_metrics.to_prometheus(
+                disaster_response_pipeline.prediction_cache,
+                None if current is None else current.version,
+            ),
+            content_type=metrics.PROMETHEUS_CONTENT_TYPE,
+        )
 
     app.layout = dash.html.Div(
         [
@@ -154,19 +293,42 @@ def _create_app():
             results (list): list of dash components
         """
         results = []
-        if len(message) > 0:  # and int(0 if n_click is None else n_click) > 0:
-            category_predicted = model.predict([message])[0]
+        # The model is taken once, so a reload during the request does not change it
+        current = model_registry.get()
+        if current is None and (len(message) > 0 or not os.path.isfile(DATABASE_FILENAME)):
+            _, status = registry.get_readiness(model_registry, training_process)
+            print("Model status: {}".format(status))
+            results.append(
+                dash.html.H3(
+                    "The model training failed, check the server logs"
+                    if status["status"] == "failed"
+                    else "The model is warming up, try again in a few minutes",
+                    className="text-center",
+                )
+            )
+        elif len(message) > 0:  # and int(0 if n_click is None else n_click) > 0:
+            model, model_version = current
+            category_predicted = disaster_response_pipeline.predict_categories(
+                model, [message], model_version=model_version
+            )[0]
             name_category_predicted = disaster_response_pipeline.get_predicted_category_names(
                 category_predicted
             )
             print("Message to be classified: {}".format(message))
+            print("Model version: {}".format(model_version))
             print("Categories:")
             print(name_category_predicted)
+            print(
+                "Prediction cache: {}".format(
+                    disaster_response_pipeline.prediction_cache.get_stats()
+                )
+            )
             results.append(
                 dash.html.Div(
                     [
                         dash.html.H2("Results", className="text-center"),
                         dash.html.H3("Message to be classified: {}".format(message)),
+                        dash.html.P("Model version: {}".format(model_version)),
                         dash.html.H3("Categories", className="text-center"),
                         # , dash.html.H3(', '.join(disaster_response_pipeline.get_predicted_category_names(category_predicted)))
                         # , dash.html.Ul(
@@ -192,53 +354,26 @@ def _create_app():
                         )
                     )
         else:
-            genre_distribution = disaster_response_pipeline.get_genre_distribution()
-            top_n_categories = disaster_response_pipeline.get_top_n_categories()
-
+            figures = get_overview_figures()
             results.append(
                 dash.html.Div(
                     [
                         dash.html.H2("Overview of Training Dataset", className="text-center"),
                         dash.dcc.Graph(
-                            figure=go.Figure(
-                                data=[
-                                    go.Bar(
-                                        x=list(genre_distribution.keys()),
-                                        y=list(genre_distribution.values()),
-                                        name="Count",
-                                        marker=go.bar.Marker(color="rgb(55, 83, 109)"),
-                                    )
-                                ],
-                                layout=go.Layout(
-                                    title="Message Genre Distribution",
-                                    showlegend=True,
-                                    legend=go.layout.Legend(x=0, y=1.0),
-                                    margin=go.layout.Margin(l=40, r=0, t=40, b=30),
-                                ),
-                            ),
+                            figure=figures["genre_distribution"],
                             style={"height": 300},
                             id="genre-distribution-graph",
                         ),
                         dash.dcc.Graph(
-                            figure=go.Figure(
-                                data=[
-                                    go.Bar(
-                                        x=list(top_n_categories.keys()),
-                                        y=list(top_n_categories.values()),
-                                        name="Count",
-                                        marker=go.bar.Marker(color="rgb(55, 83, 109)"),
-                                    )
-                                ],
-                                layout=go.Layout(
-                                    title="Categories Distribution",
-                                    showlegend=True,
-                                    legend=go.layout.Legend(x=0, y=1.0),
-                                    margin=go.layout.Margin(l=40, r=0, t=40, b=30),
-                                ),
-                            ),
+                            figure=figures["categories_distribution"],
                             style={"height": 300},
                             id="categories-distribution-graph",
                         ),
+                        dash.dcc.Graph(
+                            figure=figures["categories_cooccurrence"],
+                            style={"height": 600},
+                            id="categories-cooccurrence-graph",
+                        ),
                     ]
                 )
             )
@@ -4,7 +4,10 @@
 
 import os
 import argparse
+import multiprocessing
+import time
 
+import pandas as pd
 
 from src.config import (
     DATABASE_FILENAME,
@@ -13,8 +16,17 @@ from src.config import (
     MODEL_PICKLE_FILENAME,
     DEFAULT_TEST_MESSAGE,
 )
-import src.classifier.train as train_classifier
-import src.data_preparation.etl_pipeline as etl_pipeline
+from src import instrumentation
+from src.data_preparation import metadata
+from src.inference import batch, cache, metrics
+
+# Seconds between two checks of the model pickle file while another process is training the model
+TRAINING_LOCK_POLL_SECONDS = 1.0
+# Seconds after which a lock file without a pid is considered left by a process that died
+TRAINING_LOCK_STALE_SECONDS = 60.0
+
+prediction_cache = cache.PredictionCache()
+inference_metrics = metrics.InferenceMetrics()
 
 
 def get_category_names(database_filename=DATABASE_FILENAME):
@@ -27,8 +39,7 @@ def get_category_names(database_filename=DATABASE_FILENAME):
     Returns:
         category_names (list): list of the category names
     """
-    df = train_classifier.get_df_from_database(database_filename)
-    return list(df.columns[4:])
+    return list(metadata.get_metadata(database_filename).category_names)
 
 
 def get_genre_distribution(database_filename=DATABASE_FILENAME):
@@ -41,8 +52,7 @@ def get_genre_distribution(database_filename=DATABASE_FILENAME):
     Returns:
         genre_distribution (dict): dictionary of message genre distribution (genre, count)
     """
-    df = train_classifier.get_df_from_database(database_filename)
-    return df.groupby("genre").count()["message"].to_dict()
+    return dict(metadata.get_metadata(database_filename).genre_distribution)
 
 
 def get_top_n_categories(database_filename=DATABASE_FILENAME, n=0):
@@ -56,10 +66,28 @@ def get_top_n_categories(database_filename=DATABASE_FILENAME, n=0):
     Returns:
         top_n_categories (dict): dictionary of the n top categories (category, count)
     """
-    df = train_classifier.get_df_from_database(database_filename)
+    category_totals = metadata.get_metadata(database_filename).category_totals
     if n == 0:
-        n = len(get_category_names(database_filename))
-    return df.iloc[:, 4:].sum().sort_values(ascending=False)[1:n].to_dict()
+        n = len(category_totals)
+    return pd.Series(category_totals).sort_values(ascending=False)[1:n].to_dict()
+
+
+def get_category_cooccurrence(database_filename=DATABASE_FILENAME):
+    """
+    Return the number of messages of each pair of categories
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+
+    Returns:
+        category_cooccurrence (pandas.DataFrame): dataframe of the co-occurrence counts (categories, categories)
+    """
+    dataset_metadata = metadata.get_metadata(database_filename)
+    return pd.DataFrame(
+        dataset_metadata.category_cooccurrence,
+        index=dataset_metadata.category_names,
+        columns=dataset_metadata.category_names,
+    )
 
 
 def get_predicted_category_names(category_predicted):
@@ -76,15 +104,116 @@ def get_predicted_category_names(category_predicted):
     return [category_names[i] for i in range(len(category_predicted)) if category_predicted[i] == 1]
 
 
-def load_pipeline(
+def predict_categories(
+    model, messages, model_pickle_filename=MODEL_PICKLE_FILENAME, model_version=None
+):
+    """
+    Return the predicted categories of the messages. Repeated and near-duplicate messages are served
+    from prediction_cache, which is dropped when the model version changes. The requests and the
+    stages of the model calls are recorded in inference_metrics
+
+    Args:
+        model (pipeline.Pipeline): model used to classify the messages
+        messages (list): list of messages
+        model_pickle_filename (str): pickle filename of the model. Default value MODEL_PICKLE_FILENAME
+        model_version (str): version of the model (see registry.ModelRegistry). Default value None (In case of None the version of the model pickle file will be used)
+
+    Returns:
+        category_predicted (numpy.ndarray): predicted categories (messages, categories)
+    """
+    start = time.perf_counter()
+    if model_version is None:
+        model_version = cache.get_model_version(model_pickle_filename)
+    category_predicted = prediction_cache.predict(
+        metrics.InstrumentedModel(model, inference_metrics), messages, model_version
+    )
+    inference_metrics.record_request(time.perf_counter() - start, len(messages))
+    return category_predicted
+
+
+def _is_stale_training_lock(lock_filename):
+    """
+    Return True if the lock file has been left by a process that no longer runs. A lock file without
+    a pid is being written by the process that just created it, unless it is older than
+    TRAINING_LOCK_STALE_SECONDS (its process died before writing its pid)
+
+    Args:
+        lock_filename (str): lock filename
+
+    Returns:
+        stale (bool): True if the lock can be removed
+    """
+    try:
+        with open(lock_filename) as f:
+            content = f.read()
+            modification_time = os.fstat(f.fileno()).st_mtime
+    except FileNotFoundError:
+        return False
+    try:
+        pid = int(content)
+    except ValueError:
+        pid = 0
+    if pid <= 0:
+        return time.time() - modification_time > TRAINING_LOCK_STALE_SECONDS
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # The process runs as another user
+        return False
+    return False
+
+
+def _acquire_training_lock(lock_filename):
+    """
+    Create the lock file of the training atomically, containing the pid of the process. A stale lock
+    file (see _is_stale_training_lock) is removed
+
+    Args:
+        lock_filename (str): lock filename
+
+    Returns:
+        acquired (bool): True if the lock has been created by this process
+    """
+    try:
+        fd = os.open(lock_filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        if _is_stale_training_lock(lock_filename) is False:
+            return False
+        # The lock is moved away before being checked again and removed: if another waiter already
+        # replaced the stale lock with a fresh one, the fresh one is moved back instead of removed
+        stale_filename = "{}.{}.stale".format(lock_filename, os.getpid())
+        try:
+            os.replace(lock_filename, stale_filename)
+        except FileNotFoundError:
+            return False
+        if _is_stale_training_lock(stale_filename) is False:
+            try:
+                os.link(stale_filename, lock_filename)
+            except FileExistsError:
+                pass
+            os.remove(stale_filename)
+            return False
+        print("Removing the stale training lock...\n    Lock: {}".format(lock_filename))
+        os.remove(stale_filename)
+        return _acquire_training_lock(lock_filename)
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+def prepare_model(
     categories_filename=CATEGORIES_FILENAME,
     messages_filename=MESSAGES_FILENAME,
     database_filename=DATABASE_FILENAME,
     model_pickle_filename=MODEL_PICKLE_FILENAME,
 ):
     """
-    Return an istance of the model created. If the model pickle file is not present the model will be trained and the file cretaed. There is also a check if the
-    training datataset is available. If not the processing of the data will be performed and saved into the database to allow to train the model
+    Create the model pickle file if it is not present. There is also a check if the training dataset
+    is available. If not the processing of the data will be performed and saved into the database to
+    allow to train the model. A lock file next to the pickle file makes sure a single process trains
+    the model, the other ones wait for the pickle file
 
     Args:
         categories_filename (str): categories filename. Default value CATEGORIES_FILENAME
@@ -93,12 +222,31 @@ def load_pipeline(
         model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
 
     Returns:
-        model (pipeline.Pipeline): model loaded
+        None
     """
     print("Check if model present...\n    Model: {}".format(model_pickle_filename))
-    if os.path.isfile(model_pickle_filename) is False:
+    if os.path.isfile(model_pickle_filename) is True:
+        print("Ok")
+        return
+    # Only one process trains the model (e.g. the two processes of the debug server reloader),
+    # the others wait for its pickle file
+    lock_filename = model_pickle_filename + ".lock"
+    while _acquire_training_lock(lock_filename) is False:
+        if os.path.isfile(model_pickle_filename) is True:
+            print("Ok, trained by another process")
+            return
+        time.sleep(TRAINING_LOCK_POLL_SECONDS)
+    try:
+        if os.path.isfile(model_pickle_filename) is True:
+            print("Ok, trained by another process")
+            return
         print("Not present. Training the model...\nCheck if data are in database...")
-        if os.path.isfile(DATABASE_FILENAME) is False:
+        # Imported only when the model has to be trained: with a trained model the CLI and the web
+        # app start without loading the etl pipeline and the training modules
+        import src.classifier.train as train_classifier
+        import src.data_preparation.etl_pipeline as etl_pipeline
+
+        if os.path.isfile(database_filename) is False:
             etl_pipeline.process(
                 messages_filename=messages_filename,
                 categories_filename=categories_filename,
@@ -109,36 +257,154 @@ def load_pipeline(
             database_filename=database_filename,
             model_pickle_filename=model_pickle_filename,
         )
-    else:
-        print("Ok")
+    finally:
+        try:
+            os.remove(lock_filename)
+        except FileNotFoundError:
+            # Moved away for a moment by a waiter checking it (see _acquire_training_lock)
+            pass
+
 
-    print("Loading model...\n    Model: {}".format(model_pickle_filename))
-    model = train_classifier.load_model(model_pickle_filename)
+def load_pipeline(
+    categories_filename=CATEGORIES_FILENAME,
+    messages_filename=MESSAGES_FILENAME,
+    database_filename=DATABASE_FILENAME,
+    model_pickle_filename=MODEL_PICKLE_FILENAME,
+):
+    """
+    Return an istance of the model created. If the model pickle file is not present the model will
+    be trained and the file created (see prepare_model)
+
+    Args:
+        categories_filename (str): categories filename. Default value CATEGORIES_FILENAME
+        messages_filename (str): messages filename. Default value MESSAGES_FILENAME
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+
+    Returns:
+        model (pipeline.Pipeline): model loaded
+    """
+    with instrumentation.span("load_pipeline"):
+        with instrumentation.span("load_pipeline.prepare_model"):
+            prepare_model(
+                categories_filename, messages_filename, database_filename, model_pickle_filename
+            )
+        print("Loading model...\n    Model: {}".format(model_pickle_filename))
+        with instrumentation.span("load_pipeline.load_model"):
+            import src.classifier.train as train_classifier
+
+            model = train_classifier.load_model(model_pickle_filename)
     return model
 
 
+def start_background_training(
+    categories_filename=CATEGORIES_FILENAME,
+    messages_filename=MESSAGES_FILENAME,
+    database_filename=DATABASE_FILENAME,
+    model_pickle_filename=MODEL_PICKLE_FILENAME,
+):
+    """
+    Start prepare_model in a separate process (processing the data if the database is missing and
+    training the model), so that a server can start answering while the model is trained. The pickle file is written atomically, so a
+    registry.ModelRegistry watching it loads the model as soon as the training ends
+
+    Args:
+        categories_filename (str): categories filename. Default value CATEGORIES_FILENAME
+        messages_filename (str): messages filename. Default value MESSAGES_FILENAME
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+
+    Returns:
+        training_process (multiprocessing.Process): training process or None if the model pickle file is already present
+    """
+    if os.path.isfile(model_pickle_filename) is True:
+        return None
+    print("Model not present. Training it in the background...")
+    training_process = multiprocessing.Process(
+        target=prepare_model,
+        kwargs={
+            "categories_filename": categories_filename,
+            "messages_filename": messages_filename,
+            "database_filename": database_filename,
+            "model_pickle_filename": model_pickle_filename,
+        },
+        name="model-training",
+    )
+    training_process.start()
+    return training_process
+
+
 def parse_input_arguments():
     """
     Parse the command line arguments
 
     Returns:
         message (str): message to be classified
+        input_filename (str): CSV or JSONL file of messages to be classified. Default value None
+        output_filename (str): CSV, Parquet or SQLite file of the predictions. Default value None
+        chunk_size (int): number of messages classified at once in batch mode
     """
     parser = argparse.ArgumentParser(description="Disaster Response Pipeline")
     parser.add_argument(
         "--message", type=str, default=DEFAULT_TEST_MESSAGE, help="Message to classify"
     )
+    parser.add_argument(
+        "--input_filename",
+        type=str,
+        default=None,
+        help="CSV or JSONL file of messages to classify in batch mode",
+    )
+    parser.add_argument(
+        "--output_filename",
+        type=str,
+        default=None,
+        help="CSV, Parquet or SQLite file of the predictions in batch mode",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=batch.DEFAULT_CHUNK_SIZE,
+        help="Number of messages classified at once in batch mode",
+    )
     args = parser.parse_args()
     # print(args)
-    return args.message
+    if (args.input_filename is None) != (args.output_filename is None):
+        parser.error("--input_filename and --output_filename must be used together")
+    return args.message, args.input_filename, args.output_filename, args.chunk_size
 
 
 if __name__ == "__main__":
     print("Disaster Response Pipeline to classify input message")
-    message = parse_input_arguments()
+    message, input_filename, output_filename, chunk_size = parse_input_arguments()
     model = load_pipeline()
-    category_predicted = model.predict([message])[0]
-    print("Message to classify: {}\nCategories:".format(message))
-    print(get_predicted_category_names(category_predicted))
+    if input_filename is not None:
+        print(
+            "Classifying messages...\n    Input: {}\n    Output: {}".format(
+                input_filename, output_filename
+            )
+        )
+        batch.predict_file(
+            model,
+            input_filename,
+            output_filename,
+            get_category_names(),
+            chunk_size,
+            prediction_cache=prediction_cache,
+            model_version=cache.get_model_version(MODEL_PICKLE_FILENAME),
+        )
+    else:
+        category_predicted = predict_categories(model, [message])[0]
+        print("Message to classify: {}\nCategories:".format(message))
+        print(get_predicted_category_names(category_predicted))
+        stats = inference_metrics.get_stats()
+        print(
+            "Latency: {:.1f} ms\n".format(stats["requests"]["mean_ms"])
+            + "".join(
+                "    {}: {:.1f} ms\n".format(stage, stage_stats["mean_ms"])
+                for stage, stage_stats in stats["stages"].items()
+                if stage_stats["mean_ms"] is not None
+            ),
+            end="",
+        )
 else:
     pass
@@ -0,0 +1,583 @@
+# Export the trained model in a compact inference-only bundle of memory-mappable arrays
+#
+# python -m src.classifier.bundle --model_pickle_filename data/trained_classifier.pkl --bundle_dirname data/trained_classifier_bundle
+
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from src.config import BUNDLE_DIRNAME, DATABASE_FILENAME, MODEL_PICKLE_FILENAME
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+# File of the bundle directory naming its current version, replaced atomically by export_bundle
+CURRENT_FILENAME = "current.json"
+# Number of messages traversing the trees at the same time
+PREDICT_CHUNK_SIZE = 256
+TREE_LEAF = -1
+VECTORIZER_PARAMS = [
+    "input",
+    "encoding",
+    "decode_error",
+    "strip_accents",
+    "lowercase",
+    "token_pattern",
+    "stop_words",
+    "ngram_range",
+    "analyzer",
+    "binary",
+]
+
+
+def _get_qualified_name(function):
+    """
+    Return the name used to import the function again
+
+    Args:
+        function (callable): module level function
+
+    Returns:
+        qualified_name (str): "module:name" of the function
+    """
+    return "{}:{}".format(function.__module__, function.__qualname__)
+
+
+def _import_qualified_name(qualified_name):
+    """
+    Import the function from its qualified name
+
+    Args:
+        qualified_name (str): "module:name" of the function
+
+    Returns:
+        function (callable): the imported function
+    """
+    module_name, name = qualified_name.split(":")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _get_forests(clf):
+    """
+    Return the forests of a MultiOutputClassifier of forests, one for each category
+
+    Args:
+        clf (MultiOutputClassifier): fitted classifier
+
+    Returns:
+        forests (list): list of fitted forests
+    """
+    forests = getattr(clf, "estimators_", None)
+    if forests is None or not all(
+        hasattr(forest, "estimators_") and getattr(forest, "n_outputs_", None) == 1
+        for forest in forests
+    ):
+        raise ValueError("Only a MultiOutputClassifier of fitted forests can be exported")
+    return forests
+
+
+def _export_vectorizer(vect, tfidf):
+    """
+    Return the parameters and the arrays of the CountVectorizer and TfidfTransformer steps
+
+    Args:
+        vect (CountVectorizer): fitted vectorizer
+        tfidf (TfidfTransformer): fitted tf-idf transformer
+
+    Returns:
+        params (dict): parameters of the steps
+        arrays (dict): dictionary of numpy arrays (name, array)
+    """
+    if not isinstance(vect, CountVectorizer) or not hasattr(tfidf, "idf_"):
+        raise ValueError("Only a CountVectorizer with a tf-idf transformer can be exported")
+    if vect.preprocessor is not None or callable(vect.analyzer):
+        raise ValueError("Vectorizers with a custom preprocessor or analyzer cannot be exported")
+    terms = np.array([term.encode("utf-8") for term in vect.vocabulary_], dtype=bytes)
+    columns = np.fromiter(vect.vocabulary_.values(), dtype=np.int32, count=len(terms))
+    order = np.argsort(terms, kind="stable")
+    params = {
+        "vectorizer": {name: getattr(vect, name) for name in VECTORIZER_PARAMS},
+        "tokenizer": None if vect.tokenizer is None else _get_qualified_name(vect.tokenizer),
+        "n_features": len(terms),
+        "norm": tfidf.norm,
+        "use_idf": tfidf.use_idf,
+        "sublinear_tf": tfidf.sublinear_tf,
+    }
+    arrays = {"terms": terms[order], "term_columns": columns[order]}
+    if tfidf.use_idf:
+        arrays["idf"] = np.asarray(tfidf.idf_, dtype=np.float64)
+    return params, arrays
+
+
+def _export_forests(forests):
+    """
+    Return the nodes of all the trees of the forests concatenated in flat arrays
+
+    Args:
+        forests (list): list of fitted forests, one for each category
+
+    Returns:
+        params (dict): parameters of the forests
+        arrays (dict): dictionary of numpy arrays (name, array)
+    """
+    trees = [tree.tree_ for forest in forests for tree in forest.estimators_]
+    max_classes = max(len(forest.classes_) for forest in forests)
+    used_features = np.unique(
+        np.concatenate([tree.feature[tree.children_left != TREE_LEAF] for tree in trees])
+    ).astype(np.int32)
+
+    node_offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+    left = np.empty(node_offsets[-1], dtype=np.int32)
+    right = np.empty(node_offsets[-1], dtype=np.int32)
+    feature = np.zeros(node_offsets[-1], dtype=np.int32)
+    threshold = np.zeros(node_offsets[-1], dtype=np.float64)
+    value = np.zeros((node_offsets[-1], max_classes), dtype=np.float32)
+    for tree, start, end in zip(trees, node_offsets[:-1], node_offsets[1:], strict=True):
+        is_leaf = tree.children_left == TREE_LEAF
+        left[start:end] = np.where(is_leaf, TREE_LEAF, tree.children_left + start)
+        right[start:end] = np.where(is_leaf, TREE_LEAF, tree.children_right + start)
+        feature[start:end] = np.where(
+            is_leaf, 0, np.searchsorted(used_features, np.maximum(tree.feature, 0))
+        )
+        threshold[start:end] = tree.threshold
+        # Same normalization of DecisionTreeClassifier.predict_proba
+        tree_value = tree.value[:, 0, :]
+        normalizer = tree_value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        value[start:end, : tree_value.shape[1]] = tree_value / normalizer
+
+    classes = np.zeros((len(forests), max_classes), dtype=np.int64)
+    for i, forest in enumerate(forests):
+        classes[i, :] = forest.classes_[0]
+        classes[i, : len(forest.classes_)] = forest.classes_
+    params = {
+        "n_forests": len(forests),
+        "n_trees": len(trees),
+        "n_nodes": int(node_offsets[-1]),
+        "max_classes": max_classes,
+    }
+    arrays = {
+        "used_features": used_features,
+        "roots": node_offsets[:-1].astype(np.int64),
+        "forest_offsets": np.cumsum([0] + [len(forest.estimators_) for forest in forests]),
+        "left": left,
+        "right": right,
+        "feature": feature,
+        "threshold": threshold,
+        "value": value,
+        "classes": classes,
+    }
+    return params, arrays
+
+
+def _get_source_identity(source_filename):
+    """
+    Return the identity of the file the bundle is exported from
+
+    Args:
+        source_filename (str): source filename
+
+    Returns:
+        source_identity (list): [modification time in ns, size] of the file
+    """
+    stat = os.stat(source_filename)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def export_bundle(model, category_names, bundle_dirname=BUNDLE_DIRNAME, source_filename=None):
+    """
+    Export the model in a directory of numpy arrays that can be memory-mapped and a json manifest.
+    Only what is needed to predict is kept: in case of GridSearchCV only the best_estimator_.
+    The bundle is written in a new version directory of bundle_dirname and then made current
+
+    Args:
+        model (pipeline.Pipeline): fitted model (or fitted GridSearchCV)
+        category_names (list): list of the category names
+        bundle_dirname (str): destination directory. Default value BUNDLE_DIRNAME
+        source_filename (str): pickle file of the same model, used by is_bundle_current. Default value None
+
+    Returns:
+        None
+    """
+    model = getattr(model, "best_estimator_", model)
+    steps = getattr(model, "named_steps", {})
+    if set(steps) != {"vect", "tfidf", "clf"}:
+        raise ValueError("Only the vect, tfidf, clf pipeline built by build_model can be exported")
+    vectorizer_params, vectorizer_arrays = _export_vectorizer(steps["vect"], steps["tfidf"])
+    forest_params, forest_arrays = _export_forests(_get_forests(steps["clf"]))
+    if len(category_names) != forest_params["n_forests"]:
+        raise ValueError("The number of category names does not match the model outputs")
+
+    # Every export is written in a new version directory and published by replacing the pointer
+    # file, so readers (which may have the arrays of the previous version memory-mapped) never see
+    # a partial bundle and nothing they use is removed or overwritten
+    previous_version = get_current_version(bundle_dirname)
+    version = "{}-{}".format(time.time_ns(), os.getpid())
+    version_dirname = os.path.join(bundle_dirname, version)
+    os.makedirs(version_dirname)
+    for name, array in {**vectorizer_arrays, **forest_arrays}.items():
+        np.save(os.path.join(version_dirname, name + ".npy"), array)
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "kind": "multioutput_forest",
+        "source": None if source_filename is None else _get_source_identity(source_filename),
+        "category_names": list(category_names),
+        "vectorizer": vectorizer_params,
+        "classifier": forest_params,
+    }
+    with open(os.path.join(version_dirname, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    temporary_filename = os.path.join(bundle_dirname, "{}.{}.tmp".format(CURRENT_FILENAME, version))
+    with open(temporary_filename, "w") as f:
+        json.dump({"version": version}, f)
+    os.replace(temporary_filename, os.path.join(bundle_dirname, CURRENT_FILENAME))
+    _remove_old_versions(bundle_dirname, {version, previous_version})
+
+
+def _remove_old_versions(bundle_dirname, kept_versions):
+    """
+    Remove the version directories of the bundle that are not kept. The removal is best effort:
+    a version still memory-mapped can not be removed on Windows and is removed by a later export
+
+    Args:
+        bundle_dirname (str): bundle directory
+        kept_versions (set): versions not removed
+
+    Returns:
+        None
+    """
+    for name in os.listdir(bundle_dirname):
+        path = os.path.join(bundle_dirname, name)
+        if name not in kept_versions and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def get_current_version(bundle_dirname):
+    """
+    Return the current version of the bundle
+
+    Args:
+        bundle_dirname (str): bundle directory
+
+    Returns:
+        version (str): name of the version directory, None if no bundle has been exported
+    """
+    try:
+        with open(os.path.join(bundle_dirname, CURRENT_FILENAME)) as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_version_dirname(bundle_dirname):
+    """
+    Return the directory of the current version of the bundle
+
+    Args:
+        bundle_dirname (str): bundle directory
+
+    Returns:
+        version_dirname (str): directory of the arrays and of the manifest of the current version
+    """
+    version = get_current_version(bundle_dirname)
+    if version is None:
+        raise FileNotFoundError("No bundle exported in {}".format(bundle_dirname))
+    return os.path.join(bundle_dirname, version)
+
+
+def is_bundle_current(bundle_dirname, source_filename):
+    """
+    Return True if the bundle exists and has been exported from the current version of the file
+
+    Args:
+        bundle_dirname (str): bundle directory
+        source_filename (str): pickle file of the model
+
+    Returns:
+        is_current (bool): True if the bundle can be loaded instead of the pickle file
+    """
+    try:
+        with open(os.path.join(get_version_dirname(bundle_dirname), MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+        return manifest["format_version"] == BUNDLE_FORMAT_VERSION and manifest[
+            "source"
+        ] == _get_source_identity(source_filename)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+class BundleModel:
+    """
+    Inference-only model loaded from a bundle created with export_bundle. It predicts the same
+    categories of the exported pipeline
+    """
+
+    def __init__(self, bundle_dirname=BUNDLE_DIRNAME, mmap_mode="r"):
+        """
+        Args:
+            bundle_dirname (str): bundle directory. Default value BUNDLE_DIRNAME
+            mmap_mode (str): numpy memory-map mode of the arrays. Default value "r" (In case of None the arrays are read in memory)
+        """
+        # The version is resolved once: a later export does not change the arrays of this model
+        bundle_dirname = get_version_dirname(bundle_dirname)
+        with open(os.path.join(bundle_dirname, MANIFEST_FILENAME)) as f:
+            self.manifest = json.load(f)
+        if self.manifest["format_version"] != BUNDLE_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported bundle format version {}".format(self.manifest["format_version"])
+            )
+        self.bundle_dirname = bundle_dirname
+        self.category_names = self.manifest["category_names"]
+        self.arrays = {
+            filename[: -len(".npy")]: np.load(
+                os.path.join(bundle_dirname, filename), mmap_mode=mmap_mode
+            )
+            for filename in os.listdir(bundle_dirname)
+            if filename.endswith(".npy")
+        }
+        vectorizer_params = dict(self.manifest["vectorizer"]["vectorizer"])
+        vectorizer_params["ngram_range"] = tuple(vectorizer_params["ngram_range"])
+        tokenizer = self.manifest["vectorizer"]["tokenizer"]
+        if tokenizer is not None:
+            vectorizer_params["tokenizer"] = _import_qualified_name(tokenizer)
+            # Not used with a tokenizer, removed to avoid the warning of CountVectorizer
+            vectorizer_params["token_pattern"] = None
+        self._vectorizer = CountVectorizer(**vectorizer_params)
+        self._analyzer = self._vectorizer.build_analyzer()
+
+    def build_preprocessor(self):
+        """
+        Return the preprocessing applied to the messages before tokenizing them, as the one of the
+        exported vectorizer
+
+        Returns:
+            preprocessor (callable): preprocessor of the vectorizer
+        """
+        return self._vectorizer.build_preprocessor()
+
+    def build_analyzer(self):
+        """
+        Return the function splitting a message in the terms of the exported vectorizer
+
+        Returns:
+            analyzer (callable): analyzer of the vectorizer
+        """
+        return self._analyzer
+
+    def count(self, messages, analyzer=None):
+        """
+        Return the term counts of the messages, as CountVectorizer.transform
+
+        Args:
+            messages (list): list of messages
+            analyzer (callable): function from a message to its terms. Default value None (In case of None the analyzer of the exported vectorizer will be used)
+
+        Returns:
+            X (scipy.sparse.csr_matrix): term counts
+        """
+        analyzer = self._analyzer if analyzer is None else analyzer
+        terms = self.arrays["terms"]
+        rows = []
+        ngrams = []
+        for i, message in enumerate(messages):
+            message_ngrams = analyzer(message)
+            rows.extend([i] * len(message_ngrams))
+            ngrams.extend(ngram.encode("utf-8") for ngram in message_ngrams)
+        rows = np.array(rows, dtype=np.int64)
+        ngrams = np.array(ngrams, dtype=bytes)
+        positions = np.minimum(np.searchsorted(terms, ngrams), len(terms) - 1)
+        found = terms[positions] == ngrams if len(ngrams) > 0 else np.zeros(0, dtype=bool)
+        X = sp.csr_matrix(
+            (
+                np.ones(found.sum(), dtype=np.int64),
+                (rows[found], self.arrays["term_columns"][positions[found]]),
+            ),
+            shape=(len(messages), self.manifest["vectorizer"]["n_features"]),
+        )
+        X.sum_duplicates()
+        if self.manifest["vectorizer"]["vectorizer"]["binary"]:
+            X.data[:] = 1
+        return X
+
+    def transform(self, messages, analyzer=None):
+        """
+        Return the tf-idf features of the messages, as the vect and tfidf steps of the pipeline
+
+        Args:
+            messages (list): list of messages
+            analyzer (callable): function from a message to its terms. Default value None (In case of None the analyzer of the exported vectorizer will be used)
+
+        Returns:
+            X (scipy.sparse.csr_matrix): tf-idf features
+        """
+        X = self.count(messages, analyzer).astype(np.float64)
+        if self.manifest["vectorizer"]["sublinear_tf"]:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if self.manifest["vectorizer"]["use_idf"]:
+            X.data *= self.arrays["idf"][X.indices]
+        if self.manifest["vectorizer"]["norm"] is not None and X.shape[0] > 0:
+            X = normalize(X, norm=self.manifest["vectorizer"]["norm"], copy=False)
+        return X
+
+    def _predict_chunk(self, X):
+        """
+        Return the categories of a chunk of tf-idf features traversing all the trees together
+
+        Args:
+            X (scipy.sparse.csr_matrix): tf-idf features
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        """
+        arrays = self.arrays
+        n_samples = X.shape[0]
+        n_trees = len(arrays["roots"])
+        # Trees compare float32 features as DecisionTreeClassifier does
+        X_used = X[:, arrays["used_features"]].toarray().astype(np.float32)
+        samples = np.repeat(np.arange(n_samples), n_trees)
+        nodes = np.tile(np.asarray(arrays["roots"]), n_samples)
+        active = np.flatnonzero(arrays["left"][nodes] != TREE_LEAF)
+        while len(active) > 0:
+            active_nodes = nodes[active]
+            go_left = (
+                X_used[samples[active], arrays["feature"][active_nodes]]
+                <= arrays["threshold"][active_nodes]
+            )
+            active_nodes = np.where(
+                go_left, arrays["left"][active_nodes], arrays["right"][active_nodes]
+            )
+            nodes[active] = active_nodes
+            active = active[arrays["left"][active_nodes] != TREE_LEAF]
+        proba = np.asarray(arrays["value"][nodes], dtype=np.float64).reshape(n_samples, n_trees, -1)
+        proba = np.add.reduceat(proba, np.asarray(arrays["forest_offsets"][:-1]), axis=1)
+        best = np.argmax(proba, axis=2)
+        return np.asarray(arrays["classes"])[np.arange(best.shape[1]), best]
+
+    def predict_features(self, X):
+        """
+        Return the categories of the tf-idf features, as the clf step of the pipeline
+
+        Args:
+            X (scipy.sparse.csr_matrix): tf-idf features
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        """
+        X = sp.csr_matrix(X)
+        return np.vstack(
+            [
+                self._predict_chunk(X[start : start + PREDICT_CHUNK_SIZE])
+                for start in range(0, X.shape[0], PREDICT_CHUNK_SIZE)
+            ]
+            or [np.zeros((0, len(self.category_names)), dtype=np.int64)]
+        )
+
+    def predict(self, messages):
+        """
+        Return the categories of the messages
+
+        Args:
+            messages (list): list of messages
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        """
+        return self.predict_features(self.transform(list(messages)))
+
+
+def load_bundle(bundle_dirname=BUNDLE_DIRNAME, mmap_mode="r"):
+    """
+    Return the model stored in the bundle. The arrays are memory-mapped read-only by default
+
+    Args:
+        bundle_dirname (str): bundle directory. Default value BUNDLE_DIRNAME
+        mmap_mode (str): numpy memory-map mode of the arrays. Default value "r"
+
+    Returns:
+        model (BundleModel): model loaded
+    """
+    return BundleModel(bundle_dirname, mmap_mode)
+
+
+def get_bundle_size(bundle_dirname=BUNDLE_DIRNAME):
+    """
+    Return the size of the current version of the bundle on disk
+
+    Args:
+        bundle_dirname (str): bundle directory. Default value BUNDLE_DIRNAME
+
+    Returns:
+        size (int): size in bytes
+    """
+    bundle_dirname = get_version_dirname(bundle_dirname)
+    return sum(
+        os.path.getsize(os.path.join(bundle_dirname, filename))
+        for filename in os.listdir(bundle_dirname)
+    )
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+        bundle_dirname (str): bundle directory. Default value BUNDLE_DIRNAME
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Model Bundle")
+    parser.add_argument(
+        "--model_pickle_filename",
+        type=str,
+        default=MODEL_PICKLE_FILENAME,
+        help="Pickle filename of the model",
+    )
+    parser.add_argument(
+        "--bundle_dirname",
+        type=str,
+        default=BUNDLE_DIRNAME,
+        help="Directory of the exported bundle",
+    )
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data (used for the category names)",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.model_pickle_filename, args.bundle_dirname, args.database_filename
+
+
+if __name__ == "__main__":
+    from src.classifier import train
+    from src.data_preparation import metadata
+
+    print("Export the trained model in a compact inference-only bundle")
+    model_pickle_filename, bundle_dirname, database_filename = parse_input_arguments()
+    print("Loading model...\n    Model: {}".format(model_pickle_filename))
+    model = train.load_model(model_pickle_filename, use_bundle=False)
+    print("Exporting bundle...\n    Bundle: {}".format(bundle_dirname))
+    export_bundle(
+        model,
+        metadata.get_metadata(database_filename).category_names,
+        bundle_dirname,
+        source_filename=model_pickle_filename,
+    )
+    print(
+        "Bundle size: {:.1f} MB (pickle {:.1f} MB)".format(
+            get_bundle_size(bundle_dirname) / 2**20,
+            os.path.getsize(model_pickle_filename) / 2**20,
+        )
+    )
+else:
+    pass
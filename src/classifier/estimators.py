@@ -0,0 +1,371 @@
+# Classifiers predicting all the categories in a single pass
+#
+# python -m src.classifier.estimators
+
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, ClassifierMixin, TransformerMixin
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.preprocessing import normalize
+
+
+def subset_accuracy(Y_true, Y_pred):
+    """
+    Return the fraction of the messages with all the categories predicted correctly, the score of
+    MultiOutputClassifier. Unlike accuracy_score it supports categories with more than two classes
+
+    Args:
+        Y_true (numpy.ndarray): true categories (messages, categories)
+        Y_pred (numpy.ndarray): predicted categories (messages, categories)
+
+    Returns:
+        score (float): subset accuracy
+    """
+    return float(np.mean(np.all(np.asarray(Y_true) == np.asarray(Y_pred), axis=1)))
+
+
+class SubsetAccuracyMixin:
+    """
+    Score multi-output classifiers with subset_accuracy, as MultiOutputClassifier does, so that the
+    default scoring of the parameter searches works with every backend
+    """
+
+    def score(self, X, y, sample_weight=None):
+        """
+        Return the subset accuracy of the predictions
+
+        Args:
+            X: features
+            y (numpy.ndarray): true categories (messages, categories)
+            sample_weight: not used, kept for compatibility with the sklearn signature
+
+        Returns:
+            score (float): subset accuracy
+        """
+        return subset_accuracy(y, self.predict(X))
+
+
+class MultiLabelRandomForestClassifier(SubsetAccuracyMixin, RandomForestClassifier):
+    """
+    RandomForestClassifier fitted on all the categories at once: every tree predicts every category
+    """
+
+
+class MultiLabelExtraTreesClassifier(SubsetAccuracyMixin, ExtraTreesClassifier):
+    """
+    ExtraTreesClassifier fitted on all the categories at once: every tree predicts every category
+    """
+
+
+def _fit_binary(X, y, C, class_weight):
+    """
+    Fit a binary logistic regression and return its weights
+
+    Args:
+        X (scipy.sparse.csr_matrix): features
+        y (numpy.ndarray): binary target
+        C (float): inverse of the regularization strength
+        class_weight (str): class weight of LogisticRegression
+
+    Returns:
+        coef (numpy.ndarray): weights of the features
+        intercept (float): intercept
+    """
+    model = LogisticRegression(C=C, class_weight=class_weight, solver="liblinear")
+    model.fit(X, y)
+    return model.coef_[0], model.intercept_[0]
+
+
+class LinearMultiLabelClassifier(SubsetAccuracyMixin, ClassifierMixin, BaseEstimator):
+    """
+    One-vs-rest logistic regression for every category. The weights of all the categories are
+    stacked in a single matrix, so the prediction of all the categories is one sparse matrix
+    multiply. Categories with a single class are predicted as constants and categories with more
+    than two classes (e.g. related) get one score column per class
+    """
+
+    def __init__(self, C=1.0, class_weight=None, n_jobs=None):
+        """
+        Args:
+            C (float): inverse of the regularization strength. Default value 1.0
+            class_weight (str): class weight of LogisticRegression (None or "balanced"). Default value None
+            n_jobs (int): number of regressions fitted in parallel. Default value None
+        """
+        self.C = C
+        self.class_weight = class_weight
+        self.n_jobs = n_jobs
+
+    def fit(self, X, Y):
+        """
+        Fit one binary regression for every category with two classes and one for every class of
+        the categories with more than two classes
+
+        Args:
+            X (scipy.sparse.csr_matrix): features
+            Y (numpy.ndarray): categories (messages, categories)
+
+        Returns:
+            self (LinearMultiLabelClassifier): fitted classifier
+        """
+        Y = np.asarray(Y)
+        self.classes_ = [np.unique(Y[:, j]) for j in range(Y.shape[1])]
+        targets = []
+        self.score_slices_ = []
+        for j, classes in enumerate(self.classes_):
+            start = len(targets)
+            if len(classes) == 2:
+                targets.append(Y[:, j] == classes[1])
+            elif len(classes) > 2:
+                targets += [Y[:, j] == c for c in classes]
+            self.score_slices_.append((start, len(targets)))
+        weights = joblib.Parallel(n_jobs=self.n_jobs, prefer="threads")(
+            joblib.delayed(_fit_binary)(X, target, self.C, self.class_weight) for target in targets
+        )
+        self.coef_ = np.zeros((X.shape[1], len(targets)), dtype=np.float32)
+        self.intercept_ = np.zeros(len(targets), dtype=np.float32)
+        for i, (coef, intercept) in enumerate(weights):
+            self.coef_[:, i] = coef
+            self.intercept_[i] = intercept
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def decision_function(self, X):
+        """
+        Return the scores of all the categories with a single matrix multiply
+
+        Args:
+            X (scipy.sparse.csr_matrix): features
+
+        Returns:
+            scores (numpy.ndarray): scores (messages, score columns)
+        """
+        return np.asarray(X @ self.coef_) + self.intercept_
+
+    def predict(self, X):
+        """
+        Predict all the categories
+
+        Args:
+            X (scipy.sparse.csr_matrix): features
+
+        Returns:
+            Y_pred (numpy.ndarray): predicted categories (messages, categories)
+        """
+        scores = self.decision_function(X)
+        Y_pred = np.empty((scores.shape[0], len(self.classes_)), dtype=self.classes_[0].dtype)
+        for j, (classes, (start, stop)) in enumerate(
+            zip(self.classes_, self.score_slices_, strict=True)
+        ):
+            if stop == start:
+                Y_pred[:, j] = classes[0]
+            elif stop - start == 1:
+                Y_pred[:, j] = classes[(scores[:, start] > 0).astype(np.intp)]
+            else:
+                Y_pred[:, j] = classes[scores[:, start:stop].argmax(axis=1)]
+        return Y_pred
+
+
+def _partial_fit_binary(model, X, y, classes):
+    """
+    Update a linear classifier with a batch of messages
+
+    Args:
+        model (SGDClassifier): classifier
+        X (scipy.sparse.csr_matrix): features
+        y (numpy.ndarray): target
+        classes (numpy.ndarray): all the classes of the target
+
+    Returns:
+        model (SGDClassifier): updated classifier
+    """
+    return model.partial_fit(X, y, classes=classes)
+
+
+class SGDMultiLabelClassifier(LinearMultiLabelClassifier):
+    """
+    Linear classifier for every category trained by stochastic gradient descent, that can be
+    updated with partial_fit on new batches of messages. The classes of every category include 0
+    and 1 even if not seen in the first batch, so that a category becoming active later can still
+    be learned. As in LinearMultiLabelClassifier the weights of all the categories are stacked in
+    a single matrix
+    """
+
+    def __init__(self, loss="hinge", alpha=0.0001, max_iter=5, random_state=0, n_jobs=None):
+        """
+        Args:
+            loss (str): loss of SGDClassifier. Default value "hinge"
+            alpha (float): regularization strength. Default value 0.0001
+            max_iter (int): number of passes over the messages in fit. Default value 5
+            random_state (int): seed of the shuffling of the messages. Default value 0
+            n_jobs (int): number of categories updated in parallel. Default value None
+        """
+        self.loss = loss
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+
+    def fit(self, X, Y):
+        """
+        Fit the classifiers from scratch with max_iter passes over the messages
+
+        Args:
+            X (scipy.sparse.csr_matrix): features
+            Y (numpy.ndarray): categories (messages, categories)
+
+        Returns:
+            self (SGDMultiLabelClassifier): fitted classifier
+        """
+        if hasattr(self, "estimators_"):
+            del self.estimators_
+        for _ in range(self.max_iter):
+            self.partial_fit(X, Y)
+        return self
+
+    def partial_fit(self, X, Y, classes=None):
+        """
+        Update the classifiers with one pass over a batch of messages
+
+        Args:
+            X (scipy.sparse.csr_matrix): features
+            Y (numpy.ndarray): categories (messages, categories)
+            classes (list): list of the classes of every category, used only in the first call. Default value None (In case of None the classes of the first batch plus 0 and 1)
+
+        Returns:
+            self (SGDMultiLabelClassifier): updated classifier
+        """
+        Y = np.asarray(Y)
+        if not hasattr(self, "estimators_"):
+            if classes is None:
+                classes = [np.union1d(np.unique(Y[:, j]), [0, 1]) for j in range(Y.shape[1])]
+            self.classes_ = [np.asarray(c) for c in classes]
+            self.estimators_ = [
+                SGDClassifier(
+                    loss=self.loss, alpha=self.alpha, max_iter=1, random_state=self.random_state
+                )
+                for _ in self.classes_
+            ]
+            self.n_features_in_ = X.shape[1]
+        elif X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                "X has {} features, expected {}".format(X.shape[1], self.n_features_in_)
+            )
+        self.estimators_ = joblib.Parallel(n_jobs=self.n_jobs, prefer="threads")(
+            joblib.delayed(_partial_fit_binary)(model, X, Y[:, j], classes)
+            for j, (model, classes) in enumerate(zip(self.estimators_, self.classes_, strict=True))
+        )
+        self.coef_ = np.hstack([model.coef_.T for model in self.estimators_]).astype(np.float32)
+        self.intercept_ = np.concatenate([model.intercept_ for model in self.estimators_]).astype(
+            np.float32
+        )
+        self.score_slices_ = []
+        start = 0
+        for model in self.estimators_:
+            self.score_slices_.append((start, start + model.coef_.shape[0]))
+            start += model.coef_.shape[0]
+        return self
+
+
+class OnlineTfidfTransformer(TransformerMixin, BaseEstimator):
+    """
+    Tf-idf transformer with the same parameters and output of TfidfTransformer, whose document
+    frequencies can be updated with partial_fit on new batches of messages. Paired with a
+    HashingVectorizer the featurization uses constant memory: the only state is one document
+    frequency per hashed feature
+    """
+
+    def __init__(self, norm="l2", use_idf=True, smooth_idf=True, sublinear_tf=False):
+        """
+        Args:
+            norm (str): norm of the rows ("l1", "l2" or None). Default value "l2"
+            use_idf (bool): if True weight the terms with the inverse document frequency. Default value True
+            smooth_idf (bool): if True add one to the document frequencies, as if a document contained every term. Default value True
+            sublinear_tf (bool): if True replace the term frequency with 1 + log(tf). Default value False
+        """
+        self.norm = norm
+        self.use_idf = use_idf
+        self.smooth_idf = smooth_idf
+        self.sublinear_tf = sublinear_tf
+
+    def fit(self, X, y=None):
+        """
+        Count the document frequencies of the terms, forgetting the previous batches
+
+        Args:
+            X (scipy.sparse.csr_matrix): term counts (messages, features)
+            y: not used
+
+        Returns:
+            self (OnlineTfidfTransformer): fitted transformer
+        """
+        for name in ["n_samples_", "document_frequency_"]:
+            if hasattr(self, name):
+                delattr(self, name)
+        return self.partial_fit(X)
+
+    def partial_fit(self, X, y=None):
+        """
+        Add the document frequencies of the terms of a new batch of messages
+
+        Args:
+            X (scipy.sparse.csr_matrix): term counts (messages, features)
+            y: not used
+
+        Returns:
+            self (OnlineTfidfTransformer): updated transformer
+        """
+        X = sp.csr_matrix(X)
+        X.sum_duplicates()
+        if not hasattr(self, "document_frequency_"):
+            self.n_samples_ = 0
+            self.document_frequency_ = np.zeros(X.shape[1], dtype=np.int32)
+            self.n_features_in_ = X.shape[1]
+        elif X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                "X has {} features, expected {}".format(X.shape[1], self.n_features_in_)
+            )
+        self.n_samples_ += X.shape[0]
+        self.document_frequency_ += np.bincount(X.indices, minlength=X.shape[1]).astype(np.int32)
+        return self
+
+    @property
+    def idf_(self):
+        """
+        Inverse document frequencies computed as TfidfTransformer does
+        """
+        smooth = int(self.smooth_idf)
+        return np.log((self.n_samples_ + smooth) / (self.document_frequency_ + smooth)) + 1.0
+
+    def transform(self, X):
+        """
+        Return the tf-idf weights of the term counts
+
+        Args:
+            X (scipy.sparse.csr_matrix): term counts (messages, features)
+
+        Returns:
+            X (scipy.sparse.csr_matrix): tf-idf weights (messages, features)
+        """
+        X = sp.csr_matrix(X, dtype=np.float64, copy=True)
+        X.sum_duplicates()
+        if self.sublinear_tf is True:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if self.use_idf is True:
+            X.data *= self.idf_[X.indices]
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+
+if __name__ == "__main__":
+    print("Classifiers predicting all the categories in a single pass")
+    rng = np.random.default_rng(0)
+    X = rng.random((100, 5))
+    Y = np.stack([X[:, 0] > 0.5, X[:, 1] > 0.3, np.zeros(100)], axis=1).astype(int)
+    print("Subset accuracy: {}".format(LinearMultiLabelClassifier().fit(X, Y).score(X, Y)))
+else:
+    pass
@@ -0,0 +1,205 @@
+# Update the trained model with the messages added to the database since it was trained
+#
+# python -m src.classifier.online --database_filename data/db.sqlite3 --model_pickle_filename data/trained_classifier.pkl
+
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src.classifier import train
+from src.config import DATABASE_FILENAME, MODEL_PICKLE_FILENAME, TABLE_NAME
+from src.data_preparation import database
+
+# Number of messages read from the database and learned at once
+DEFAULT_BATCH_SIZE = 10000
+
+
+def get_updatable_pipeline(model):
+    """
+    Return the pipeline of the model that can be updated with new messages: the tf-idf step and the
+    classifier must support partial_fit and the vectorizer must not have a vocabulary fitted on the
+    training messages, i.e. a model trained with --vectorizer hashing --classifier sgd
+
+    Args:
+        model (pipeline.Pipeline): trained model (or parameter search with a best_estimator_)
+
+    Returns:
+        pipeline (pipeline.Pipeline): pipeline updated in place
+    """
+    pipeline = getattr(model, "best_estimator_", model)
+    steps = getattr(pipeline, "named_steps", {})
+    if (
+        not hasattr(steps.get("tfidf"), "partial_fit")
+        or not hasattr(steps.get("clf"), "partial_fit")
+        or hasattr(steps.get("vect"), "vocabulary_")
+    ):
+        raise ValueError(
+            "The model can not be updated: train it with --vectorizer hashing --classifier sgd"
+        )
+    return pipeline
+
+
+def read_new_messages(
+    database_filename=DATABASE_FILENAME,
+    learned_ids=(),
+    batch_size=DEFAULT_BATCH_SIZE,
+    table_name=TABLE_NAME,
+):
+    """
+    Read in batches, in insertion order, the messages whose id has not been learned. The ids are
+    compared instead of the rowids because the rowid is the insertion order in a table written by a
+    full etl run but the id itself in a table written by an incremental one
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        learned_ids (numpy.ndarray): ids already learned. Default value () (In case of an empty sequence all the messages are read)
+        batch_size (int): number of messages in each batch. Default value DEFAULT_BATCH_SIZE
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        batches (generator): generator of (messages, categories, ids)
+    """
+    category_names = database.get_category_column_names(database_filename, table_name)
+    query = (
+        'SELECT "id", "message", {} FROM "{}" '
+        "WHERE rowid IN (SELECT value FROM json_each(?)) ORDER BY rowid".format(
+            ", ".join('"{}"'.format(name) for name in category_names), table_name
+        )
+    )
+    with database.connect(database_filename) as connection:
+        rows = connection.execute(
+            'SELECT rowid, "id" FROM "{}" ORDER BY rowid'.format(table_name)
+        ).fetchall()
+    rows = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    new_rowids = rows[~np.isin(rows[:, 1], np.asarray(learned_ids, dtype=np.int64)), 0]
+    for start in range(0, len(new_rowids), batch_size):
+        batch_rowids = json.dumps(new_rowids[start : start + batch_size].tolist())
+        with database.connect(database_filename) as connection:
+            batch_rows = connection.execute(query, (batch_rowids,)).fetchall()
+        if len(batch_rows) == 0:
+            continue
+        columns = list(zip(*batch_rows, strict=True))
+        Y = np.array(columns[2:], dtype=np.uint8).T
+        yield list(columns[1]), Y, np.array(columns[0], dtype=np.int64)
+
+
+def partial_fit_pipeline(pipeline, messages, Y):
+    """
+    Update the document frequencies and the classifier of the pipeline with a batch of messages
+
+    Args:
+        pipeline (pipeline.Pipeline): pipeline returned by get_updatable_pipeline
+        messages (list): list of messages
+        Y (numpy.ndarray): categories (messages, categories)
+
+    Returns:
+        None
+    """
+    counts = pipeline.named_steps["vect"].transform(messages)
+    tfidf = pipeline.named_steps["tfidf"].partial_fit(counts)
+    pipeline.named_steps["clf"].partial_fit(tfidf.transform(counts), Y)
+
+
+def update_model(
+    database_filename=DATABASE_FILENAME,
+    model_pickle_filename=MODEL_PICKLE_FILENAME,
+    batch_size=DEFAULT_BATCH_SIZE,
+    table_name=TABLE_NAME,
+):
+    """
+    Update the model with the rows whose id it has not learned and publish it by atomically
+    replacing the pickle file, so that load_pipeline and the prediction cache pick up the new
+    version. Rows updated in place keep their id and are not learned again; a model trained before
+    the table was rebuilt by a full run of the etl pipeline is refused and must be trained again
+    with train.train
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+        batch_size (int): number of messages learned at once. Default value DEFAULT_BATCH_SIZE
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        stats (dict): number of messages learned (n_messages), number of learned ids (n_learned_ids) and elapsed seconds
+    """
+    start = time.perf_counter()
+    model = train.load_model(model_pickle_filename, use_bundle=False)
+    pipeline = get_updatable_pipeline(model)
+    learned_ids = getattr(model, "learned_ids_", None)
+    table_generation = getattr(model, "table_generation_", None)
+    if learned_ids is None or table_generation is None:
+        raise ValueError("The model has no learned ids: train it again with train.train")
+    with database.connect(database_filename) as connection:
+        current_generation = database.get_table_generation(connection, table_name)
+    if current_generation != table_generation:
+        raise ValueError(
+            "The table {} was rebuilt after the model was trained: train it again with "
+            "train.train".format(table_name)
+        )
+
+    n_messages = 0
+    new_ids = []
+    for messages, Y, ids in read_new_messages(
+        database_filename, learned_ids, batch_size, table_name
+    ):
+        partial_fit_pipeline(pipeline, messages, Y)
+        n_messages += len(messages)
+        new_ids.append(ids)
+    if n_messages > 0:
+        learned_ids = np.union1d(learned_ids, np.concatenate(new_ids))
+        model.learned_ids_ = learned_ids
+        train.save_model(model, model_pickle_filename)
+    return {
+        "n_messages": n_messages,
+        "n_learned_ids": len(learned_ids),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+        batch_size (int): number of messages learned at once. Default value DEFAULT_BATCH_SIZE
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Online Train")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename",
+    )
+    parser.add_argument(
+        "--model_pickle_filename",
+        type=str,
+        default=MODEL_PICKLE_FILENAME,
+        help="Pickle filename of the model to update",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Number of messages learned at once",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename, args.model_pickle_filename, args.batch_size
+
+
+if __name__ == "__main__":
+    print("Update the trained model with the new messages")
+    database_filename, model_pickle_filename, batch_size = parse_input_arguments()
+    stats = update_model(database_filename, model_pickle_filename, batch_size)
+    print(
+        "Messages learned: {}\nLearned ids: {}\nElapsed: {:.2f} s".format(
+            stats["n_messages"], stats["n_learned_ids"], stats["elapsed"]
+        )
+    )
+else:
+    pass
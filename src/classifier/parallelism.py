@@ -0,0 +1,180 @@
+# Split the cores between the grid search, the per-category estimators and the forest trees
+#
+# python -m src.classifier.parallelism --n_jobs -1 --n_search_tasks 1620
+
+
+import argparse
+import contextlib
+import numbers
+import os
+from collections import namedtuple
+
+import joblib
+from sklearn.model_selection import ParameterGrid
+
+ParallelismPlan = namedtuple("ParallelismPlan", ["search_n_jobs", "output_n_jobs", "forest_n_jobs"])
+
+SERIAL_PLAN = ParallelismPlan(1, 1, 1)
+# Number of categories predicted by the model
+DEFAULT_N_OUTPUTS = 36
+# Number of folds used by GridSearchCV when cv is None
+DEFAULT_CV_FOLDS = 5
+
+
+def get_n_cores(n_jobs=None):
+    """
+    Return the number of cores to be used
+
+    Args:
+        n_jobs (int): number of cores. Default value None (In case of None or -1 all the cores available to the process will be used)
+
+    Returns:
+        n_cores (int): number of cores
+    """
+    if n_jobs is None or n_jobs == -1:
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+    if n_jobs < 1:
+        raise ValueError("n_jobs must be a positive number or -1, got {}".format(n_jobs))
+    return n_jobs
+
+
+def get_n_search_tasks(model):
+    """
+    Return the number of fits performed by the grid search of the model
+
+    Args:
+        model (pipeline.Pipeline): model (or GridSearchCV or search.ParameterSearch of the model)
+
+    Returns:
+        n_search_tasks (int): number of candidates x number of folds, 1 without grid search
+    """
+    if hasattr(model, "n_search_tasks"):
+        return model.n_search_tasks
+    if not hasattr(model, "param_grid"):
+        return 1
+    n_folds = model.cv if isinstance(model.cv, numbers.Integral) else DEFAULT_CV_FOLDS
+    return len(ParameterGrid(model.param_grid)) * n_folds
+
+
+def make_parallelism_plan(
+    n_jobs=1,
+    n_search_tasks=1,
+    n_outputs=DEFAULT_N_OUTPUTS,
+    search_n_jobs=None,
+    output_n_jobs=None,
+    forest_n_jobs=None,
+):
+    """
+    Split the cores between the three nested levels of parallelism of the model: the fits of the
+    grid search (candidates x folds), the per-category estimators of MultiOutputClassifier and the
+    trees of each forest. The outer levels are filled first, since their tasks are larger and
+    independent, and the product of the three levels never exceeds the cores. The levels given
+    explicitly are kept and the others get the remaining cores
+
+    Args:
+        n_jobs (int): total number of cores. Default value 1 (In case of None or -1 all the cores will be used)
+        n_search_tasks (int): number of fits of the grid search, 1 without grid search. Default value 1
+        n_outputs (int): number of categories. Default value DEFAULT_N_OUTPUTS
+        search_n_jobs (int): n_jobs of GridSearchCV. Default value None (In case of None it is computed)
+        output_n_jobs (int): n_jobs of MultiOutputClassifier. Default value None (In case of None it is computed)
+        forest_n_jobs (int): n_jobs of RandomForestClassifier. Default value None (In case of None it is computed)
+
+    Returns:
+        plan (ParallelismPlan): n_jobs of each level
+    """
+    n_cores = get_n_cores(n_jobs)
+    if search_n_jobs is None:
+        search_n_jobs = max(
+            1, min(n_search_tasks, n_cores // (output_n_jobs or 1) // (forest_n_jobs or 1))
+        )
+    if output_n_jobs is None:
+        output_n_jobs = max(1, min(n_outputs, n_cores // search_n_jobs // (forest_n_jobs or 1)))
+    if forest_n_jobs is None:
+        forest_n_jobs = max(1, n_cores // search_n_jobs // output_n_jobs)
+    plan = ParallelismPlan(search_n_jobs, output_n_jobs, forest_n_jobs)
+    if search_n_jobs * output_n_jobs * forest_n_jobs > n_cores:
+        raise ValueError("The plan {} uses more than {} cores".format(plan, n_cores))
+    return plan
+
+
+def apply_parallelism_plan(model, plan):
+    """
+    Set the n_jobs of the model built by train.build_model according to the plan
+
+    Args:
+        model (pipeline.Pipeline): model (or GridSearchCV or search.ParameterSearch of the model)
+        plan (ParallelismPlan): n_jobs of each level
+
+    Returns:
+        model (pipeline.Pipeline): the same model
+    """
+    pipelines = [model]
+    if hasattr(model, "param_grid"):
+        model.n_jobs = plan.search_n_jobs
+        pipelines = [model.estimator]
+        if hasattr(model, "best_estimator_"):
+            pipelines.append(model.best_estimator_)
+    for pipeline in pipelines:
+        if "estimator" not in pipeline.named_steps["clf"].get_params(deep=False):
+            # A single classifier for all the categories has one level of parallelism
+            pipeline.set_params(clf__n_jobs=plan.output_n_jobs * plan.forest_n_jobs)
+            continue
+        pipeline.set_params(
+            clf__n_jobs=plan.output_n_jobs, clf__estimator__n_jobs=plan.forest_n_jobs
+        )
+        # The fitted forests keep their own copy of the parameters
+        for estimator in getattr(pipeline.named_steps["clf"], "estimators_", []):
+            estimator.set_params(n_jobs=plan.forest_n_jobs)
+    return model
+
+
+def search_backend(model, plan):
+    """
+    Return the context in which the model is fitted. The fits of the grid search run in threads:
+    they share the tokens of the corpus cache (see tokenizer.pretokenize), while worker processes
+    would start with an empty cache and tokenize every fold again with NLTK. The per-category
+    estimators and the forests release the GIL while fitting
+
+    Args:
+        model (pipeline.Pipeline): model (or GridSearchCV or search.ParameterSearch of the model)
+        plan (ParallelismPlan): n_jobs of each level
+
+    Returns:
+        context (contextlib.AbstractContextManager): joblib threading backend with a grid search run in parallel, a context doing nothing otherwise
+    """
+    if hasattr(model, "param_grid") and plan.search_n_jobs > 1:
+        return joblib.parallel_backend("threading", n_jobs=plan.search_n_jobs)
+    return contextlib.nullcontext()
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        n_jobs (int): total number of cores
+        n_search_tasks (int): number of fits of the grid search
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Parallelism Plan")
+    parser.add_argument(
+        "--n_jobs", type=int, default=-1, help="Total number of cores (-1 to use all the cores)"
+    )
+    parser.add_argument(
+        "--n_search_tasks",
+        type=int,
+        default=1,
+        help="Number of fits of the grid search (candidates x folds)",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.n_jobs, args.n_search_tasks
+
+
+if __name__ == "__main__":
+    print("Parallelism plan")
+    n_jobs, n_search_tasks = parse_input_arguments()
+    print(make_parallelism_plan(n_jobs, n_search_tasks))
+else:
+    pass
@@ -0,0 +1,393 @@
+# Random and successive halving search of the model parameters with time budget and checkpoints
+#
+# python -m src.classifier.search --checkpoint_filename data/search_checkpoint.json
+
+
+import argparse
+import json
+import math
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import KFold, ParameterSampler
+
+from src.config import SEARCH_CHECKPOINT_FILENAME
+
+SEARCH_MODES = ["random", "halving"]
+CHECKPOINT_FORMAT_VERSION = 1
+DEFAULT_N_CANDIDATES = 27
+DEFAULT_N_FOLDS = 3
+# Fraction of the candidates kept at every iteration of the successive halving and factor by which
+# the number of training messages grows
+DEFAULT_FACTOR = 3
+
+
+def _to_json(value):
+    """
+    Return the value with the tuples converted to lists, as json does
+
+    Args:
+        value: parameter value
+
+    Returns:
+        value: json compatible value
+    """
+    if isinstance(value, (tuple, list)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _fit_and_score(estimator, X, Y, train_index, test_index, scoring):
+    """
+    Fit the estimator on the train fold and return its score on the test fold
+
+    Args:
+        estimator (pipeline.Pipeline): unfitted estimator with the candidate parameters
+        X (numpy.ndarray): messages
+        Y (numpy.ndarray): categories
+        train_index (numpy.ndarray): indices of the train fold
+        test_index (numpy.ndarray): indices of the test fold
+        scoring (str): scoring name or None for the score method of the estimator
+
+    Returns:
+        score (float): score on the test fold
+    """
+    estimator.fit(X[train_index], Y[train_index])
+    return float(check_scoring(estimator, scoring)(estimator, X[test_index], Y[test_index]))
+
+
+class ParameterSearch:
+    """
+    Search of the parameters of the pipeline built by train.build_model, faster than the exhaustive
+    GridSearchCV:
+
+    - random: n_candidates sampled from the parameter grid, evaluated on all the messages
+    - halving: successive halving, all the candidates are evaluated on few messages and only the
+      best 1 / factor go on to the next iteration, with factor times more messages
+
+    The search stops when time_budget is exceeded and the best candidate so far is refitted. Every
+    fold score is saved in the checkpoint file, so an interrupted search started again with the
+    same settings and data continues where it stopped. With cache_dirname the fitted vectorizer and
+    tf-idf transformer are cached on disk (Pipeline memory) and reused by the candidates that share
+    their parameters on the same fold
+    """
+
+    def __init__(
+        self,
+        estimator,
+        param_grid,
+        mode="halving",
+        n_candidates=DEFAULT_N_CANDIDATES,
+        n_folds=DEFAULT_N_FOLDS,
+        factor=DEFAULT_FACTOR,
+        max_resources=None,
+        time_budget=None,
+        scoring=None,
+        checkpoint_filename=SEARCH_CHECKPOINT_FILENAME,
+        cache_dirname=None,
+        random_state=0,
+        n_jobs=1,
+    ):
+        """
+        Args:
+            estimator (pipeline.Pipeline): pipeline whose parameters are searched
+            param_grid (dict): dictionary of the parameter values (name, list of values)
+            mode (str): "random" or "halving". Default value "halving"
+            n_candidates (int): number of parameter combinations sampled. Default value DEFAULT_N_CANDIDATES
+            n_folds (int): number of cross validation folds. Default value DEFAULT_N_FOLDS
+            factor (int): halving factor. Default value DEFAULT_FACTOR
+            max_resources (int): maximum number of messages used by a candidate. Default value None (In case of None all the messages)
+            time_budget (float): seconds after which no new fit is started. Default value None (In case of None no limit)
+            scoring (str): sklearn scoring name. Default value None (In case of None the score method of the pipeline, as GridSearchCV)
+            checkpoint_filename (str): json file of the progress. Default value SEARCH_CHECKPOINT_FILENAME (In case of None the progress is not saved)
+            cache_dirname (str): directory of the transformer cache. Default value None (In case of None no cache)
+            random_state (int): seed of the candidates, of the folds and of the halving subsets. Default value 0
+            n_jobs (int): number of fits run in parallel. Default value 1
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError("Search mode must be one of {}, got {}".format(SEARCH_MODES, mode))
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.mode = mode
+        self.n_candidates = n_candidates
+        self.n_folds = n_folds
+        self.factor = factor
+        self.max_resources = max_resources
+        self.time_budget = time_budget
+        self.scoring = scoring
+        self.checkpoint_filename = checkpoint_filename
+        self.cache_dirname = cache_dirname
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+
+    @property
+    def n_search_tasks(self):
+        """
+        Number of fits of the first iteration, used to plan the parallelism
+        """
+        return self.n_candidates * self.n_folds
+
+    def _get_candidates(self):
+        """
+        Return the sampled parameter combinations, always the same for the same random_state
+
+        Returns:
+            candidates (list): list of the parameter dictionaries
+        """
+        return list(
+            ParameterSampler(self.param_grid, self.n_candidates, random_state=self.random_state)
+        )
+
+    def _get_resources(self, n_samples):
+        """
+        Return the number of messages used at every iteration
+
+        Args:
+            n_samples (int): number of messages available
+
+        Returns:
+            resources (list): list of the number of messages of each iteration
+        """
+        max_resources = min(self.max_resources or n_samples, n_samples)
+        if self.mode == "random":
+            return [max_resources]
+        n_iterations = 1
+        while self.factor**n_iterations <= self.n_candidates:
+            n_iterations += 1
+        return [
+            max(2 * self.n_folds, max_resources // self.factor ** (n_iterations - 1 - i))
+            for i in range(n_iterations)
+        ]
+
+    def _get_settings(self, X, Y):
+        """
+        Return the settings that must match to resume from a checkpoint
+
+        Args:
+            X (numpy.ndarray): messages
+            Y (numpy.ndarray): categories
+
+        Returns:
+            settings (dict): json compatible dictionary of the settings
+        """
+        return {
+            "format_version": CHECKPOINT_FORMAT_VERSION,
+            "mode": self.mode,
+            "param_grid": {
+                name: _to_json(list(values)) for name, values in self.param_grid.items()
+            },
+            "n_candidates": self.n_candidates,
+            "n_folds": self.n_folds,
+            "factor": self.factor,
+            "max_resources": self.max_resources,
+            "scoring": self.scoring,
+            "random_state": self.random_state,
+            "estimator": joblib.hash(
+                {
+                    name: value
+                    for name, value in self.estimator.get_params(deep=True).items()
+                    if name not in ("memory", "steps")
+                    and not name.endswith("n_jobs")
+                    and not hasattr(value, "get_params")
+                }
+            ),
+            "data": joblib.hash((X, Y)),
+        }
+
+    def _load_checkpoint(self, settings):
+        """
+        Return the fold scores saved by a previous run with the same settings
+
+        Args:
+            settings (dict): settings of the current search
+
+        Returns:
+            scores (dict): dictionary of the fold scores ("candidate:iteration:fold", score)
+        """
+        if self.checkpoint_filename is None:
+            return {}
+        try:
+            with open(self.checkpoint_filename) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if checkpoint.get("settings") != settings:
+            print("    Checkpoint of a different search, starting over")
+            return {}
+        print("    Resuming from checkpoint: {} fits done".format(len(checkpoint["scores"])))
+        return checkpoint["scores"]
+
+    def _save_checkpoint(self, settings, scores):
+        """
+        Save the fold scores. The file is written next to the checkpoint and then moved in place
+
+        Args:
+            settings (dict): settings of the current search
+            scores (dict): dictionary of the fold scores
+
+        Returns:
+            None
+        """
+        if self.checkpoint_filename is None:
+            return
+        temporary_filename = self.checkpoint_filename + ".tmp"
+        with open(temporary_filename, "w") as f:
+            json.dump({"settings": settings, "scores": scores}, f)
+        os.replace(temporary_filename, self.checkpoint_filename)
+
+    def fit(self, X, Y):
+        """
+        Search the parameters and refit the best candidate on all the messages
+
+        Args:
+            X (pandas.Series): messages
+            Y (pandas.DataFrame): categories
+
+        Returns:
+            self (ParameterSearch): fitted search
+        """
+        start = time.perf_counter()
+        X = np.asarray(X, dtype=object)
+        Y = np.asarray(Y)
+        settings = self._get_settings(X, Y)
+        scores = self._load_checkpoint(settings)
+        candidates = self._get_candidates()
+        resources = self._get_resources(len(X))
+        order = np.random.default_rng(self.random_state).permutation(len(X))
+        estimator = clone(self.estimator).set_params(memory=self.cache_dirname)
+
+        self.cv_results_ = []
+        survivors = list(range(len(candidates)))
+        out_of_time = False
+        for iteration, n_resources in enumerate(resources):
+            subset = np.sort(order[:n_resources])
+            folds = list(
+                KFold(self.n_folds, shuffle=True, random_state=self.random_state).split(subset)
+            )
+            tasks = [
+                (candidate, fold)
+                for candidate in survivors
+                for fold in range(self.n_folds)
+                if "{}:{}:{}".format(candidate, iteration, fold) not in scores
+            ]
+            print(
+                "    Iteration {}: {} candidates, {} messages, {} fits to do".format(
+                    iteration, len(survivors), n_resources, len(tasks)
+                )
+            )
+            results = joblib.Parallel(n_jobs=self.n_jobs, return_as="generator")(
+                joblib.delayed(_fit_and_score)(
+                    clone(estimator).set_params(**candidates[candidate]),
+                    X,
+                    Y,
+                    subset[folds[fold][0]],
+                    subset[folds[fold][1]],
+                    self.scoring,
+                )
+                for candidate, fold in tasks
+            )
+            for (candidate, fold), score in zip(tasks, results, strict=False):
+                scores["{}:{}:{}".format(candidate, iteration, fold)] = score
+                self._save_checkpoint(settings, scores)
+                if self.time_budget is not None and time.perf_counter() - start > self.time_budget:
+                    out_of_time = True
+                    break
+            if out_of_time is True:
+                results.close()
+            mean_scores = {}
+            for candidate in survivors:
+                fold_scores = [
+                    scores.get("{}:{}:{}".format(candidate, iteration, fold))
+                    for fold in range(self.n_folds)
+                ]
+                if None not in fold_scores:
+                    mean_scores[candidate] = float(np.mean(fold_scores))
+                    self.cv_results_.append(
+                        {
+                            "params": candidates[candidate],
+                            "iteration": iteration,
+                            "n_resources": n_resources,
+                            "mean_test_score": mean_scores[candidate],
+                        }
+                    )
+            if out_of_time is True or len(mean_scores) == 0:
+                if out_of_time is True:
+                    print("    Time budget exceeded, stopping the search")
+                break
+            n_survivors = max(1, math.ceil(len(survivors) / self.factor))
+            survivors = sorted(mean_scores, key=mean_scores.get, reverse=True)[:n_survivors]
+
+        if len(self.cv_results_) == 0:
+            raise RuntimeError("No candidate completed all its folds within the time budget")
+        best = max(self.cv_results_, key=lambda r: (r["iteration"], r["mean_test_score"]))
+        self.best_params_ = best["params"]
+        self.best_score_ = best["mean_test_score"]
+        print(
+            "    Best parameters: {}\n    Best score: {}".format(
+                self.best_params_, self.best_score_
+            )
+        )
+        self.best_estimator_ = clone(estimator).set_params(**self.best_params_).fit(X, Y)
+        self.best_estimator_.set_params(memory=None)
+        return self
+
+    def predict(self, X):
+        """
+        Predict the categories with the best estimator
+
+        Args:
+            X (iterable): messages
+
+        Returns:
+            Y_pred (numpy.ndarray): predicted categories
+        """
+        return self.best_estimator_.predict(X)
+
+    def score(self, X, Y):
+        """
+        Score the best estimator
+
+        Args:
+            X (iterable): messages
+            Y (pandas.DataFrame): categories
+
+        Returns:
+            score (float): score of the best estimator
+        """
+        return check_scoring(self.best_estimator_, self.scoring)(self.best_estimator_, X, Y)
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        checkpoint_filename (str): checkpoint filename. Default value SEARCH_CHECKPOINT_FILENAME
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Parameter Search")
+    parser.add_argument(
+        "--checkpoint_filename",
+        type=str,
+        default=SEARCH_CHECKPOINT_FILENAME,
+        help="Checkpoint filename of the parameter search",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.checkpoint_filename
+
+
+if __name__ == "__main__":
+    print("Parameter search checkpoint")
+    checkpoint_filename = parse_input_arguments()
+    with open(checkpoint_filename) as f:
+        checkpoint = json.load(f)
+    print("Settings: {}".format(checkpoint["settings"]))
+    print("Fits done: {}".format(len(checkpoint["scores"])))
+else:
+    pass
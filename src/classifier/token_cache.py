@@ -0,0 +1,175 @@
+# Store the tokenized messages in the database so that training can skip NLTK
+#
+# python -m src.classifier.token_cache --database_filename data/db.sqlite3 --n_jobs 4
+
+
+import argparse
+import hashlib
+import json
+
+from src.classifier import tokenizer
+from src.config import DATABASE_FILENAME, TABLE_NAME, TOKEN_TABLE_NAME
+from src.data_preparation import database
+
+
+def get_message_hash(message):
+    """
+    Return a short hash of the message used to detect messages changed since they were tokenized
+
+    Args:
+        message (str): message
+
+    Returns:
+        message_hash (str): hexadecimal hash of the message
+    """
+    return hashlib.blake2b(message.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _create_token_table(connection):
+    """
+    Create the token table if it does not exist
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+
+    Returns:
+        None
+    """
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS "{}" ('
+        "id INTEGER NOT NULL, "
+        "tokenizer_version INTEGER NOT NULL, "
+        "message_hash TEXT NOT NULL, "
+        "tokens TEXT NOT NULL, "
+        "PRIMARY KEY (id, tokenizer_version, message_hash))".format(TOKEN_TABLE_NAME)
+    )
+
+
+def load_token_cache(database_filename=DATABASE_FILENAME):
+    """
+    Return the tokens stored for the messages of the database that have not changed since they
+    were tokenized with the current TOKENIZER_VERSION
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+
+    Returns:
+        corpus_tokens (dict): dictionary of tokens (message, tokens of the preprocessed message)
+        missing_messages (list): list of (id, message) not tokenized yet
+    """
+    corpus_tokens = {}
+    missing_messages = []
+    with database.connect(database_filename) as connection:
+        _create_token_table(connection)
+        stored_tokens = {
+            (message_id, message_hash): tokens
+            for message_id, message_hash, tokens in connection.execute(
+                'SELECT id, message_hash, tokens FROM "{}" WHERE tokenizer_version = ?'.format(
+                    TOKEN_TABLE_NAME
+                ),
+                (tokenizer.TOKENIZER_VERSION,),
+            )
+        }
+        for message_id, message in connection.execute(
+            'SELECT id, message FROM "{}"'.format(TABLE_NAME)
+        ):
+            message = "" if message is None else message
+            tokens = stored_tokens.get((message_id, get_message_hash(message)))
+            if tokens is None:
+                missing_messages.append((message_id, message))
+            else:
+                corpus_tokens[message] = json.loads(tokens)
+    return corpus_tokens, missing_messages
+
+
+def save_token_cache(database_filename, messages, corpus_tokens):
+    """
+    Store the tokens of the messages and drop the ones of the previous tokenizer versions
+
+    Args:
+        database_filename (str): database filename
+        messages (list): list of (id, message)
+        corpus_tokens (list): tokens of each message
+
+    Returns:
+        None
+    """
+    with database.connect(database_filename) as connection:
+        _create_token_table(connection)
+        connection.execute(
+            'DELETE FROM "{}" WHERE tokenizer_version <> ?'.format(TOKEN_TABLE_NAME),
+            (tokenizer.TOKENIZER_VERSION,),
+        )
+        connection.executemany(
+            'INSERT OR REPLACE INTO "{}" (id, tokenizer_version, message_hash, tokens) '
+            "VALUES (?, ?, ?, ?)".format(TOKEN_TABLE_NAME),
+            (
+                (
+                    message_id,
+                    tokenizer.TOKENIZER_VERSION,
+                    get_message_hash(message),
+                    json.dumps(tokens, ensure_ascii=False, separators=(",", ":")),
+                )
+                for (message_id, message), tokens in zip(messages, corpus_tokens, strict=True)
+            ),
+        )
+
+
+def update_token_cache(database_filename=DATABASE_FILENAME, n_jobs=1):
+    """
+    Tokenize only the messages of the database not already in the token cache, store them and make
+    all the cached tokens available to the tokenizer as pre-tokenized texts
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        n_jobs (int): number of processes used to tokenize the messages. Default value 1 (In case of None all the cores will be used)
+
+    Returns:
+        n_cached (int): number of messages read from the cache
+        n_tokenized (int): number of messages tokenized
+    """
+    # Checked even when every message is cached: the model tokenizes the messages it predicts
+    tokenizer.download_nltk_data()
+    corpus_tokens, missing_messages = load_token_cache(database_filename)
+    tokenizer.add_corpus_tokens(corpus_tokens)
+    if len(missing_messages) > 0:
+        new_tokens = tokenizer.pretokenize(
+            [message for _, message in missing_messages], n_jobs=n_jobs
+        )
+        save_token_cache(database_filename, missing_messages, new_tokens)
+    return len(corpus_tokens), len(missing_messages)
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        n_jobs (int): number of processes used to tokenize the messages
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Token Cache")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data",
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to tokenize the messages (-1 to use all the cores)",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename, None if args.n_jobs == -1 else args.n_jobs
+
+
+if __name__ == "__main__":
+    print("Store the tokenized messages in the database")
+    database_filename, n_jobs = parse_input_arguments()
+    n_cached, n_tokenized = update_token_cache(database_filename, n_jobs)
+    print("Messages read from the cache: {}\nMessages tokenized: {}".format(n_cached, n_tokenized))
+else:
+    pass
@@ -0,0 +1,302 @@
+# Tokenizer used by the classifier
+#
+# python -m src.classifier.tokenizer --message "Storm at sacred heart of Jesus"
+
+
+import argparse
+import functools
+import multiprocessing
+import os
+import re
+
+from src.config import DEFAULT_TEST_MESSAGE, NLTK_DATA_FOLDER
+
+URL_REGEX = re.compile(
+    r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+)
+URL_PLACEHOLDER = "urlplaceholder"
+# Increase it every time the tokens produced for a given text change
+TOKENIZER_VERSION = 2
+LEMMA_CACHE_SIZE = 2**17
+PRETOKENIZE_CHUNK_SIZE = 1000
+NLTK_RESOURCES = ["punkt", "punkt_tab", "wordnet"]
+# Path of each resource inside an NLTK data folder
+NLTK_RESOURCE_PATHS = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "wordnet": "corpora/wordnet",
+}
+
+
+def _import_nltk():
+    """
+    Import NLTK the first time it is needed, so that importing the tokenizer (e.g. to load a model
+    or to start the web app) does not pay for it
+
+    Returns:
+        nltk (module): NLTK module
+    """
+    import nltk
+
+    # The resources downloaded by download_nltk_data are looked up in the project data folder too
+    if NLTK_DATA_FOLDER not in nltk.data.path:
+        nltk.data.path.append(NLTK_DATA_FOLDER)
+    return nltk
+
+
+def word_tokenize(text):
+    """
+    Split the text in tokens with the NLTK word tokenizer
+
+    Args:
+        text (str): input text
+
+    Returns:
+        tokens (list): tokens of the text
+    """
+    return _import_nltk().word_tokenize(text)
+
+
+class LazyWordNetLemmatizer:
+    """
+    WordNet lemmatizer created at the first lemmatization
+    """
+
+    def __init__(self):
+        self._lemmatizer = None
+
+    def lemmatize(self, word):
+        """
+        Return the lemma of the word
+
+        Args:
+            word (str): input word
+
+        Returns:
+            lemma (str): lemma of the word
+        """
+        if self._lemmatizer is None:
+            self._lemmatizer = _import_nltk().stem.WordNetLemmatizer()
+        return self._lemmatizer.lemmatize(word)
+
+
+_lemmatizer = LazyWordNetLemmatizer()
+# Tokens of the texts pre-tokenized with pretokenize (preprocessed text, tokens)
+_corpus_tokens = {}
+
+
+def get_missing_nltk_resources():
+    """
+    Return the NLTK resources used by the tokenizer that are not in any local NLTK data folder.
+    Only the local folders are checked, without any network access
+
+    Returns:
+        missing_resources (list): list of the missing resource names
+    """
+    nltk = _import_nltk()
+    missing_resources = []
+    for name in NLTK_RESOURCES:
+        try:
+            nltk.data.find(NLTK_RESOURCE_PATHS[name])
+        except LookupError:
+            missing_resources.append(name)
+    return missing_resources
+
+
+def download_nltk_data(download=True):
+    """
+    Make the NLTK resources used by the tokenizer available. The resources already in a local NLTK
+    data folder are used as they are and only the missing ones are downloaded, in NLTK_DATA_FOLDER,
+    so that once they are there no network access is needed
+
+    Args:
+        download (bool): if False raise an error instead of downloading the missing resources. Default value True
+
+    Returns:
+        None
+    """
+    missing_resources = get_missing_nltk_resources()
+    if len(missing_resources) == 0:
+        return
+    if download is False:
+        raise LookupError("NLTK resources not found locally: {}".format(missing_resources))
+    if (
+        _import_nltk().download(missing_resources, download_dir=NLTK_DATA_FOLDER, quiet=True)
+        is False
+    ):
+        raise LookupError("NLTK resources could not be downloaded: {}".format(missing_resources))
+
+
+def replace_urls(text):
+    """
+    Replace the urls in the text with URL_PLACEHOLDER
+
+    Args:
+        text (str): input text
+
+    Returns:
+        text (str): text with the urls replaced
+    """
+    for url in URL_REGEX.findall(text):
+        text = text.replace(url, URL_PLACEHOLDER)
+    return text
+
+
+@functools.lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def clean_token(token):
+    """
+    Lemmatize, lowercase and strip a token. The results are kept in a bounded LRU cache
+
+    Args:
+        token (str): input token
+
+    Returns:
+        clean_token (str): cleaned token
+    """
+    return _lemmatizer.lemmatize(token).lower().strip()
+
+
+def _tokenize(text):
+    """
+    Clean and tokenize the text in input without looking at the pre-tokenized texts
+
+    Args:
+        text (str): input text
+
+    Returns:
+        clean_tokens (list): tokens obtained from the input text
+    """
+    return [clean_token(token) for token in word_tokenize(replace_urls(text))]
+
+
+def preprocess(text):
+    """
+    Return the text as the vectorizers of the model pass it to the tokenizer: CountVectorizer and
+    HashingVectorizer lowercase it before calling my_tokenizer. The pre-tokenized texts are stored
+    preprocessed, so that the calls of the vectorizers find them
+
+    Args:
+        text (str): input text
+
+    Returns:
+        preprocessed_text (str): lowercased text
+    """
+    return text.lower()
+
+
+def tokenize(text):
+    """
+    Clean and tokenize the text in input. If the text has been pre-tokenized the stored tokens
+    are returned
+
+    Args:
+        text (str): input text
+
+    Returns:
+        clean_tokens (list): tokens obtained from the input text
+    """
+    clean_tokens = _corpus_tokens.get(text)
+    if clean_tokens is None:
+        clean_tokens = _tokenize(text)
+    return clean_tokens
+
+
+def pretokenize(texts, n_jobs=1):
+    """
+    Tokenize a corpus once, using a pool of processes, and keep the tokens so that the following
+    calls of the vectorizers to tokenize for the same texts (e.g. in every cross validation fold or
+    refit) are lookups. The texts are preprocessed as the vectorizers do (see preprocess)
+
+    Args:
+        texts (iterable): corpus of texts
+        n_jobs (int): number of processes. Default value 1 (In case of None all the cores will be used)
+
+    Returns:
+        corpus_tokens (list): tokens of each preprocessed text of the corpus
+    """
+    texts = [preprocess(text) for text in texts]
+    new_texts = [text for text in dict.fromkeys(texts) if text not in _corpus_tokens]
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs > 1 and len(new_texts) > PRETOKENIZE_CHUNK_SIZE:
+        with multiprocessing.Pool(n_jobs) as pool:
+            new_tokens = pool.map(_tokenize, new_texts, chunksize=PRETOKENIZE_CHUNK_SIZE)
+    else:
+        new_tokens = [_tokenize(text) for text in new_texts]
+    _corpus_tokens.update(zip(new_texts, new_tokens, strict=True))
+    return [_corpus_tokens[text] for text in texts]
+
+
+def add_corpus_tokens(corpus_tokens):
+    """
+    Store tokens computed elsewhere (e.g. read from a cache) as pre-tokenized texts
+
+    Args:
+        corpus_tokens (dict): dictionary of tokens (text, tokens of the preprocessed text as returned by pretokenize)
+
+    Returns:
+        None
+    """
+    _corpus_tokens.update((preprocess(text), tokens) for text, tokens in corpus_tokens.items())
+
+
+def get_untokenized_texts(texts):
+    """
+    Return the distinct texts that have not been pre-tokenized
+
+    Args:
+        texts (iterable): texts
+
+    Returns:
+        untokenized_texts (list): list of the texts without stored tokens
+    """
+    return [text for text in dict.fromkeys(texts) if preprocess(text) not in _corpus_tokens]
+
+
+def forget_corpus_tokens(texts):
+    """
+    Forget the pre-tokenized texts given, e.g. tokenized only for a single prediction
+
+    Args:
+        texts (iterable): texts
+
+    Returns:
+        None
+    """
+    for text in texts:
+        _corpus_tokens.pop(preprocess(text), None)
+
+
+def clear_corpus_cache():
+    """
+    Forget all the pre-tokenized texts
+
+    Returns:
+        None
+    """
+    _corpus_tokens.clear()
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        message (str): message to be tokenized
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Tokenizer")
+    parser.add_argument(
+        "--message", type=str, default=DEFAULT_TEST_MESSAGE, help="Message to tokenize"
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.message
+
+
+if __name__ == "__main__":
+    print("Tokenizer used by the classifier")
+    message = parse_input_arguments()
+    download_nltk_data()
+    print("Message: {}\nTokens: {}".format(message, tokenize(message)))
+else:
+    pass
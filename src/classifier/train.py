@@ -3,29 +3,35 @@
 # python -m src.classifier.train --database_filename data/db.sqlite3 --model_pickle_filename data/trained_classifier.pkl --grid_search_cv
 
 
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, accuracy_score
-import re
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
 from sklearn.model_selection import GridSearchCV
+import os
 import pickle
 import argparse
 
 
-from src.config import DATABASE_FILENAME, TABLE_NAME, MODEL_PICKLE_FILENAME
+from src.config import (
+    DATABASE_FILENAME,
+    TABLE_NAME,
+    MODEL_PICKLE_FILENAME,
+    SEARCH_CHECKPOINT_FILENAME,
+    SEARCH_CACHE_DIRNAME,
+)
+from src import instrumentation
+from src.classifier import bundle, estimators, parallelism, search, token_cache, tokenizer
+from src.data_preparation import database, snapshot
 
 
 def get_df_from_database(database_filename=DATABASE_FILENAME):
     """
-    Return dataframe from the database
+    Return dataframe from the database. The categories are read as uint8
 
     Args:
         database_filename (str): database filename. Default value DATABASE_FILENAME
@@ -33,25 +39,33 @@ def get_df_from_database(database_filename=DATABASE_FILENAME):
     Returns:
         df (pandas.DataFrame): dataframe containing the data
     """
-    engine = create_engine("sqlite:///" + database_filename)
-    return pd.read_sql_table(TABLE_NAME, engine)
+    return database.read_messages(database_filename, TABLE_NAME)
 
 
 def load_data(database_filename):
     """
-    Load the data from the database
+    Load the data from the database or from a training snapshot directory (see
+    src.data_preparation.snapshot), that is much faster to load
 
     Args:
-        database_filename (str): database filename. Default value DATABASE_FILENAME
+        database_filename (str): database filename or training snapshot directory. Default value DATABASE_FILENAME
 
     Returns:
-        X (pandas.Series): dataset
-        Y (pandas.DataFrame): dataframe containing the categories
+        X (pandas.Series): dataset indexed by the message ids
+        Y (pandas.DataFrame): dataframe containing the categories indexed by the message ids
         category_names (list): list containing the categories name
     """
+    if snapshot.is_snapshot(database_filename):
+        training_snapshot = snapshot.load_snapshot(database_filename)
+        category_names = training_snapshot.category_names
+        index = pd.Index(np.asarray(training_snapshot.ids, dtype=np.int64), name="id")
+        X = pd.Series(training_snapshot.messages, index=index, name="message")
+        Y = pd.DataFrame(training_snapshot.labels, index=index, columns=category_names, copy=False)
+        return X, Y, category_names
     df = get_df_from_database(database_filename)
-    X = df["message"]
-    Y = df.iloc[:, 4:]
+    index = pd.Index(df["id"].to_numpy(dtype=np.int64), name="id")
+    X = df["message"].set_axis(index)
+    Y = df.iloc[:, 4:].set_axis(index)
     category_names = list(df.columns[4:])
     return X, Y, category_names
 
@@ -66,53 +80,159 @@ def my_tokenizer(text):
     Returns:
         clean_tokens (list): tokens obtained from the input text
     """
-    url_regex = "http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"  # type: ignore
-    detected_urls = re.findall(url_regex, text)
-    for url in detected_urls:
-        text = text.replace(url, "urlplaceholder")
+    return tokenizer.tokenize(text)
+
+
+CLASSIFIERS = ["multioutput_forest", "forest", "extra_trees", "linear", "sgd"]
+DEFAULT_CLASSIFIER = "multioutput_forest"
+VECTORIZERS = ["count", "hashing"]
+DEFAULT_VECTORIZER = "count"
+# Number of columns of the hashing vectorizer
+DEFAULT_N_FEATURES = 2**18
+VECTORIZER_PARAMETER_GRIDS = {
+    "count": {
+        "vect__ngram_range": ((1, 1), (1, 2)),
+        "vect__max_df": (0.5, 0.75, 1.0),
+        "tfidf__use_idf": (True, False),
+    },
+    "hashing": {
+        "vect__ngram_range": ((1, 1), (1, 2)),
+        "vect__n_features": (2**18, 2**20),
+        "tfidf__use_idf": (True, False),
+    },
+}
+CLASSIFIER_PARAMETER_GRIDS = {
+    "multioutput_forest": {
+        "clf__estimator__n_estimators": [50, 100, 200],
+        "clf__estimator__min_samples_split": [2, 3, 4],
+    },
+    "forest": {
+        "clf__n_estimators": [50, 100, 200],
+        "clf__min_samples_split": [2, 3, 4],
+    },
+    "extra_trees": {
+        "clf__n_estimators": [50, 100, 200],
+        "clf__min_samples_split": [2, 3, 4],
+    },
+    "linear": {
+        "clf__C": [0.1, 1.0, 10.0],
+        "clf__class_weight": [None, "balanced"],
+    },
+    "sgd": {
+        "clf__loss": ["hinge", "log_loss"],
+        "clf__alpha": [0.00001, 0.0001, 0.001],
+    },
+}
+
+
+def get_parameter_grid(classifier=DEFAULT_CLASSIFIER, vectorizer=DEFAULT_VECTORIZER):
+    """
+    Return the parameter values searched for the model
 
-    tokens = word_tokenize(text)
-    lemmatizer = WordNetLemmatizer()
+    Args:
+        classifier (str): classifier backend, one of CLASSIFIERS. Default value DEFAULT_CLASSIFIER
+        vectorizer (str): vectorizer, one of VECTORIZERS. Default value DEFAULT_VECTORIZER
 
-    clean_tokens = []
-    for tok in tokens:
-        clean_tok = lemmatizer.lemmatize(tok).lower().strip()
-        clean_tokens.append(clean_tok)
+    Returns:
+        parameter_grid (dict): dictionary of the parameter values (name, values)
+    """
+    return {**VECTORIZER_PARAMETER_GRIDS[vectorizer], **CLASSIFIER_PARAMETER_GRIDS[classifier]}
 
-    return clean_tokens
 
+def build_vectorizer(vectorizer=DEFAULT_VECTORIZER):
+    """
+    Build the featurization steps of the model
 
-def build_model(grid_search_cv=False):
+    Args:
+        vectorizer (str): one of VECTORIZERS. Default value DEFAULT_VECTORIZER
+            - count: CountVectorizer and TfidfTransformer, with a vocabulary growing with the corpus
+            - hashing: HashingVectorizer with DEFAULT_N_FEATURES columns and OnlineTfidfTransformer,
+              using constant memory and updatable with partial_fit on new messages
+
+    Returns:
+        steps (list): list of the (name, transformer) steps vect and tfidf
+    """
+    if vectorizer == "count":
+        return [
+            ("vect", CountVectorizer(tokenizer=my_tokenizer, token_pattern="")),
+            ("tfidf", TfidfTransformer()),
+        ]
+    if vectorizer == "hashing":
+        return [
+            (
+                "vect",
+                HashingVectorizer(
+                    tokenizer=my_tokenizer,
+                    token_pattern=None,
+                    n_features=DEFAULT_N_FEATURES,
+                    alternate_sign=False,
+                    norm=None,
+                ),
+            ),
+            ("tfidf", estimators.OnlineTfidfTransformer()),
+        ]
+    raise ValueError("Vectorizer must be one of {}, got {}".format(VECTORIZERS, vectorizer))
+
+
+def build_classifier(classifier=DEFAULT_CLASSIFIER):
+    """
+    Build the last step of the model
+
+    Args:
+        classifier (str): one of CLASSIFIERS. Default value DEFAULT_CLASSIFIER
+            - multioutput_forest: one RandomForestClassifier for each category
+            - forest: one RandomForestClassifier predicting all the categories
+            - extra_trees: one ExtraTreesClassifier predicting all the categories
+            - linear: one-vs-rest logistic regressions predicted with a single matrix multiply
+            - sgd: linear classifiers trained by stochastic gradient descent, that with the hashing
+              vectorizer can be updated on new messages (see src.classifier.online)
+
+    Returns:
+        clf (sklearn estimator): classifier
+    """
+    if classifier == "multioutput_forest":
+        return MultiOutputClassifier(RandomForestClassifier())
+    if classifier == "forest":
+        return estimators.MultiLabelRandomForestClassifier()
+    if classifier == "extra_trees":
+        return estimators.MultiLabelExtraTreesClassifier()
+    if classifier == "linear":
+        return estimators.LinearMultiLabelClassifier()
+    if classifier == "sgd":
+        return estimators.SGDMultiLabelClassifier()
+    raise ValueError("Classifier must be one of {}, got {}".format(CLASSIFIERS, classifier))
+
+
+def build_model(
+    grid_search_cv=False,
+    search_params=None,
+    classifier=DEFAULT_CLASSIFIER,
+    vectorizer=DEFAULT_VECTORIZER,
+):
     """
     Build the model
 
     Args:
         grid_search_cv (bool): if True after building the pipeline it will be performed an exhaustive search over specified parameter values ti find the best ones
+        search_params (dict): arguments of search.ParameterSearch (mode, n_candidates, time_budget, ...). Default value None (In case of None no random or halving search)
+        classifier (str): classifier backend, one of CLASSIFIERS (see build_classifier). Default value DEFAULT_CLASSIFIER
+        vectorizer (str): vectorizer, one of VECTORIZERS (see build_vectorizer). Default value DEFAULT_VECTORIZER
 
     Returns:
         pipeline (pipeline.Pipeline): model
     """
-    pipeline = Pipeline(
-        [
-            ("vect", CountVectorizer(tokenizer=my_tokenizer, token_pattern="")),
-            ("tfidf", TfidfTransformer()),
-            ("clf", MultiOutputClassifier(RandomForestClassifier())),
-        ]
-    )
+    pipeline = Pipeline(build_vectorizer(vectorizer) + [("clf", build_classifier(classifier))])
 
     # pipeline.get_params()
 
     if grid_search_cv is True:
         print("Searching for best parameters...")
-        parameters = {
-            "vect__ngram_range": ((1, 1), (1, 2)),
-            "vect__max_df": (0.5, 0.75, 1.0),
-            "tfidf__use_idf": (True, False),
-            "clf__estimator__n_estimators": [50, 100, 200],
-            "clf__estimator__min_samples_split": [2, 3, 4],
-        }
-
-        pipeline = GridSearchCV(pipeline, param_grid=parameters)
+        pipeline = GridSearchCV(pipeline, param_grid=get_parameter_grid(classifier, vectorizer))
+    elif search_params is not None:
+        print("Searching for best parameters ({} search)...".format(search_params["mode"]))
+        pipeline = search.ParameterSearch(
+            pipeline, get_parameter_grid(classifier, vectorizer), **search_params
+        )
 
     return pipeline
 
@@ -138,31 +258,100 @@ def evaluate_model(model, X_test, Y_test, category_names):
         print("Accuracy {}\n\n".format(accuracy_score(Y_test.iloc[:, i].values, Y_pred[:, i])))
 
 
-def save_model(model, model_filename):
+def get_table_generation(database_filename=DATABASE_FILENAME, table_name=TABLE_NAME):
+    """
+    Return the generation of the table the model is trained on. It is saved in the model
+    (table_generation_) so that src.classifier.online refuses a table rebuilt after the training
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        table_generation (str): generation of the table (see database.get_table_generation)
+    """
+    with database.connect(database_filename) as connection:
+        return database.get_table_generation(connection, table_name)
+
+
+def get_learned_ids(X_train):
+    """
+    Return the ids of the messages the model is fitted on. They are saved in the model
+    (learned_ids_) so that src.classifier.online learns only the other ids, the test split included
+
+    Args:
+        X_train (pandas.Series): messages the model is fitted on, indexed by their ids (see load_data)
+
+    Returns:
+        learned_ids (numpy.ndarray): sorted int64 array of the ids
+    """
+    return np.unique(np.asarray(X_train.index, dtype=np.int64))
+
+
+def get_bundle_dirname(model_pickle_filename):
+    """
+    Return the directory of the memory-mappable bundle stored next to the pickle file
+
+    Args:
+        model_pickle_filename (str): pickle filename
+
+    Returns:
+        bundle_dirname (str): bundle directory
+    """
+    return os.path.splitext(model_pickle_filename)[0] + "_bundle"
+
+
+def save_model(model, model_filename, category_names=None):
     """
-    Save in a pickle file the model
+    Save in a pickle file the model. If the category names are given the model is also exported in a
+    memory-mappable bundle next to the pickle file
 
     Args:
         model (pipeline.Pipeline): model to be saved
         model_pickle_filename (str): destination pickle filename
+        category_names (list): list of the category names. Default value None (In case of None the bundle is not exported)
 
     Returns:
         None
     """
-    pickle.dump(model, open(model_filename, "wb"))
-
-
-def load_model(model_pickle_filename):
+    # The pickle is written next to the destination and renamed, so readers never see a partial file
+    temporary_filename = "{}.{}.tmp".format(model_filename, os.getpid())
+    with open(temporary_filename, "wb") as f:
+        pickle.dump(model, f)
+    if category_names is not None:
+        # The bundle is published before the pickle file: the renaming keeps the modification time
+        # and the size, so a reader seeing the new pickle file already finds its bundle current
+        try:
+            bundle.export_bundle(
+                model,
+                category_names,
+                get_bundle_dirname(model_filename),
+                source_filename=temporary_filename,
+            )
+        except (ValueError, OSError) as e:
+            # The pickle file is saved anyway, the model is loaded from it
+            print("Bundle not exported: {}".format(e))
+    os.replace(temporary_filename, model_filename)
+
+
+def load_model(model_pickle_filename, use_bundle=True):
     """
-    Return model from pickle file
+    Return model from pickle file. If a bundle exported from the same pickle file is available it is
+    loaded instead: its arrays are memory-mapped read-only, so the processes loading the same
+    model share them through the OS page cache
 
     Args:
         model_pickle_filename (str): source pickle filename
+        use_bundle (bool): if True load the bundle when available. Default value True
 
     Returns:
-        model (pipeline.Pipeline): model readed from pickle file
+        model (pipeline.Pipeline): model readed from pickle file (or bundle.BundleModel)
     """
-    return pickle.load(open(model_pickle_filename, "rb"))
+    bundle_dirname = get_bundle_dirname(model_pickle_filename)
+    if use_bundle is True and bundle.is_bundle_current(bundle_dirname, model_pickle_filename):
+        return bundle.load_bundle(bundle_dirname)
+    with open(model_pickle_filename, "rb") as f:
+        return pickle.load(f)
 
 
 def parse_input_arguments():
@@ -176,6 +365,12 @@ def parse_input_arguments():
         database_filename (str): database filename. Default value DATABASE_FILENAME
         model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
         grid_search_cv (bool): If True perform grid search of the parameters
+        tokenizer_n_jobs (int): number of processes used to tokenize the messages
+        snapshot_dirname (str): training snapshot directory or None to load the data from the database
+        parallelism_params (dict): arguments of parallelism.make_parallelism_plan
+        search_params (dict): arguments of search.ParameterSearch or None without random or halving search
+        classifier (str): classifier backend
+        vectorizer (str): vectorizer
     """
     parser = argparse.ArgumentParser(description="Disaster Response Pipeline Train Classifier")
     parser.add_argument(
@@ -196,12 +391,136 @@ def parse_input_arguments():
         default=False,
         help="Perform grid search of the parameters",
     )
+    parser.add_argument(
+        "--tokenizer_n_jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to tokenize the messages (-1 to use all the cores)",
+    )
+    parser.add_argument(
+        "--snapshot_dirname",
+        type=str,
+        default=None,
+        help="Training snapshot directory exported by the etl pipeline (faster to load than the database)",
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=1,
+        help="Total number of cores used to train the model (-1 to use all the cores)",
+    )
+    parser.add_argument(
+        "--search_n_jobs",
+        type=int,
+        default=None,
+        help="Parallel fits of the grid search (by default computed from --n_jobs)",
+    )
+    parser.add_argument(
+        "--output_n_jobs",
+        type=int,
+        default=None,
+        help="Categories trained in parallel (by default computed from --n_jobs)",
+    )
+    parser.add_argument(
+        "--forest_n_jobs",
+        type=int,
+        default=None,
+        help="Trees of each forest trained in parallel (by default computed from --n_jobs)",
+    )
+    parser.add_argument(
+        "--classifier",
+        type=str,
+        choices=CLASSIFIERS,
+        default=DEFAULT_CLASSIFIER,
+        help="Classifier backend: one forest per category, a single multi-output forest or extra trees, linear one-vs-rest or sgd (updatable with src.classifier.online)",
+    )
+    parser.add_argument(
+        "--vectorizer",
+        type=str,
+        choices=VECTORIZERS,
+        default=DEFAULT_VECTORIZER,
+        help="Vectorizer: count (growing vocabulary) or hashing (fixed number of features and online idf)",
+    )
+    parser.add_argument(
+        "--search_mode",
+        type=str,
+        choices=search.SEARCH_MODES,
+        default=None,
+        help="Random or successive halving search of the parameters, faster than --grid_search_cv",
+    )
+    parser.add_argument(
+        "--n_candidates",
+        type=int,
+        default=search.DEFAULT_N_CANDIDATES,
+        help="Number of parameter combinations sampled by the search",
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        default=None,
+        help="Seconds after which the search stops and refits the best candidate so far",
+    )
+    parser.add_argument(
+        "--max_resources",
+        type=int,
+        default=None,
+        help="Maximum number of messages used to evaluate a candidate (default all)",
+    )
+    parser.add_argument(
+        "--checkpoint_filename",
+        type=str,
+        default=SEARCH_CHECKPOINT_FILENAME,
+        help="Checkpoint file used to resume an interrupted search (empty string to disable it)",
+    )
+    parser.add_argument(
+        "--cache_dirname",
+        type=str,
+        default=SEARCH_CACHE_DIRNAME,
+        help="Directory caching the vectorizer outputs shared by the candidates (empty string to disable it)",
+    )
     args = parser.parse_args()
     # print(args)
-    return args.database_filename, args.model_pickle_filename, args.grid_search_cv
+    if args.grid_search_cv is True and args.search_mode is not None:
+        parser.error("--grid_search_cv and --search_mode can not be used together")
+    search_params = None
+    if args.search_mode is not None:
+        search_params = {
+            "mode": args.search_mode,
+            "n_candidates": args.n_candidates,
+            "time_budget": args.time_budget,
+            "max_resources": args.max_resources,
+            "checkpoint_filename": args.checkpoint_filename or None,
+            "cache_dirname": args.cache_dirname or None,
+        }
+    return (
+        args.database_filename,
+        args.model_pickle_filename,
+        args.grid_search_cv,
+        None if args.tokenizer_n_jobs == -1 else args.tokenizer_n_jobs,
+        args.snapshot_dirname,
+        {
+            "n_jobs": args.n_jobs,
+            "search_n_jobs": args.search_n_jobs,
+            "output_n_jobs": args.output_n_jobs,
+            "forest_n_jobs": args.forest_n_jobs,
+        },
+        search_params,
+        args.classifier,
+        args.vectorizer,
+    )
 
 
-def train(database_filename, model_pickle_filename, grid_search_cv=False):
+def train(
+    database_filename,
+    model_pickle_filename,
+    grid_search_cv=False,
+    tokenizer_n_jobs=1,
+    snapshot_dirname=None,
+    parallelism_params=None,
+    search_params=None,
+    classifier=DEFAULT_CLASSIFIER,
+    vectorizer=DEFAULT_VECTORIZER,
+):
     """
     Train the model and save it in a pickle file
 
@@ -209,6 +528,12 @@ def train(database_filename, model_pickle_filename, grid_search_cv=False):
         database_filename (str): database filename
         model_pickle_filename (str): pickle filename
         grid_search_cv (bool): if True after building the pipeline it will be performed an exhaustive search over specified parameter values ti find the best ones
+        tokenizer_n_jobs (int): number of processes used to tokenize the messages. Default value 1 (In case of None all the cores will be used)
+        snapshot_dirname (str): training snapshot directory exported by the etl pipeline. Default value None (In case of None the data is loaded from the database)
+        parallelism_params (dict): arguments of parallelism.make_parallelism_plan (n_jobs, search_n_jobs, output_n_jobs, forest_n_jobs). Default value None (In case of None the model is trained on one core)
+        search_params (dict): arguments of search.ParameterSearch. Default value None (In case of None no random or halving search)
+        classifier (str): classifier backend, one of CLASSIFIERS. Default value DEFAULT_CLASSIFIER
+        vectorizer (str): vectorizer, one of VECTORIZERS. Default value DEFAULT_VECTORIZER
 
     Returns:
         None
@@ -218,31 +543,86 @@ def train(database_filename, model_pickle_filename, grid_search_cv=False):
     # print(grid_search_cv)
     # print(os.getcwd())
 
-    print("Download nltk componets if needed...")
-    nltk.download(["punkt", "punkt_tab", "wordnet"])
-
-    print("Loading data...\n    Database: {}".format(database_filename))
-    X, Y, category_names = load_data(database_filename)
-    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2)
-
-    print("Building model...")
-    model = build_model(grid_search_cv)
-
-    print("Training model...")
-    model.fit(X_train, Y_train)
-
-    print("Evaluating model...")
-    evaluate_model(model, X_test, Y_test, category_names)
-
-    print("Saving model...\n    Model: {}".format(model_pickle_filename))
-    save_model(model, model_pickle_filename)
+    with instrumentation.span("train", classifier=classifier, vectorizer=vectorizer) as train_span:
+        # Read before the data, so that a table rebuilt meanwhile is refused by src.classifier.online
+        table_generation = get_table_generation(database_filename)
+        with instrumentation.span("train.load_data") as stage:
+            if snapshot_dirname is None:
+                print("Loading data...\n    Database: {}".format(database_filename))
+                X, Y, category_names = load_data(database_filename)
+            else:
+                print("Loading data...\n    Snapshot: {}".format(snapshot_dirname))
+                X, Y, category_names = load_data(snapshot_dirname)
+            stage.set_rows(len(X))
+        train_span.set_rows(len(X))
+        X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2)
+
+        print("Tokenizing messages...")
+        with instrumentation.span("train.tokenize") as stage:
+            n_cached, n_tokenized = token_cache.update_token_cache(
+                database_filename, tokenizer_n_jobs
+            )
+            stage.set_rows(n_cached + n_tokenized)
+            stage.set(cached=n_cached, tokenized=n_tokenized)
+        print("    Read from cache: {}\n    Tokenized: {}".format(n_cached, n_tokenized))
+
+        print("Building model...")
+        model = build_model(grid_search_cv, search_params, classifier, vectorizer)
+        plan = parallelism.make_parallelism_plan(
+            n_search_tasks=parallelism.get_n_search_tasks(model), **(parallelism_params or {})
+        )
+        print(
+            "    Grid search jobs: {}\n    Category jobs: {}\n    Forest jobs: {}".format(
+                plan.search_n_jobs, plan.output_n_jobs, plan.forest_n_jobs
+            )
+        )
+        parallelism.apply_parallelism_plan(model, plan)
+
+        print("Training model...")
+        with instrumentation.span("train.fit", rows=len(X_train)):
+            with parallelism.search_backend(model, plan):
+                model.fit(X_train, Y_train)
+
+        print("Evaluating model...")
+        with instrumentation.span("train.evaluate", rows=len(X_test)):
+            evaluate_model(model, X_test, Y_test, category_names)
+
+        # The saved model predicts on one core, as the web app classifies one message at a time
+        parallelism.apply_parallelism_plan(model, parallelism.SERIAL_PLAN)
+        model.table_generation_ = table_generation
+        # The test split and the rows with other ids are learned when the model is updated online
+        model.learned_ids_ = get_learned_ids(X_train)
+        print("Saving model...\n    Model: {}".format(model_pickle_filename))
+        with instrumentation.span("train.save_model"):
+            save_model(model, model_pickle_filename, category_names)
+        tokenizer.clear_corpus_cache()
 
     print("Trained model saved!")
 
 
 if __name__ == "__main__":
     print("Train the model and save it in a pickle file")
-    database_filename, model_pickle_filename, grid_search_cv = parse_input_arguments()
-    train(database_filename, model_pickle_filename, grid_search_cv)
+    (
+        database_filename,
+        model_pickle_filename,
+        grid_search_cv,
+        tokenizer_n_jobs,
+        snapshot_dirname,
+        parallelism_params,
+        search_params,
+        classifier,
+        vectorizer,
+    ) = parse_input_arguments()
+    train(
+        database_filename,
+        model_pickle_filename,
+        grid_search_cv,
+        tokenizer_n_jobs,
+        snapshot_dirname,
+        parallelism_params,
+        search_params,
+        classifier,
+        vectorizer,
+    )
 else:
     pass
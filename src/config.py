@@ -9,7 +9,20 @@ CATEGORIES_FILENAME = DATA_FOLDER + "disaster_categories.csv"
 MESSAGES_FILENAME = DATA_FOLDER + "disaster_messages.csv"
 DATABASE_FILENAME = DATA_FOLDER + "db.sqlite3"
 TABLE_NAME = "disaster_message"
+PREDICTION_TABLE_NAME = "disaster_message_prediction"
+TOKEN_TABLE_NAME = "disaster_message_token"
+ROW_HASH_TABLE_NAME = "disaster_message_row_hash"
+ETL_STATE_TABLE_NAME = "etl_state"
+TABLE_GENERATION_TABLE_NAME = "table_generation"
+GENRE_COUNT_TABLE_NAME = "disaster_message_genre_count"
+CATEGORY_COUNT_TABLE_NAME = "disaster_message_category_count"
+CATEGORY_COOCCURRENCE_TABLE_NAME = "disaster_message_category_cooccurrence"
 MODEL_PICKLE_FILENAME = DATA_FOLDER + "trained_classifier.pkl"
+BUNDLE_DIRNAME = DATA_FOLDER + "trained_classifier_bundle"
+SNAPSHOT_DIRNAME = DATA_FOLDER + "training_snapshot"
+SEARCH_CHECKPOINT_FILENAME = DATA_FOLDER + "search_checkpoint.json"
+SEARCH_CACHE_DIRNAME = DATA_FOLDER + "search_cache"
+NLTK_DATA_FOLDER = DATA_FOLDER + "nltk_data"
 DEFAULT_TEST_MESSAGE = "Storm at sacred heart of Jesus"
 
 
@@ -21,7 +34,20 @@ if __name__ == "__main__":
     print(f"{MESSAGES_FILENAME = }")
     print(f"{DATABASE_FILENAME = }")
     print(f"{TABLE_NAME = }")
+    print(f"{PREDICTION_TABLE_NAME = }")
+    print(f"{TOKEN_TABLE_NAME = }")
+    print(f"{ROW_HASH_TABLE_NAME = }")
+    print(f"{ETL_STATE_TABLE_NAME = }")
+    print(f"{TABLE_GENERATION_TABLE_NAME = }")
+    print(f"{GENRE_COUNT_TABLE_NAME = }")
+    print(f"{CATEGORY_COUNT_TABLE_NAME = }")
+    print(f"{CATEGORY_COOCCURRENCE_TABLE_NAME = }")
     print(f"{MODEL_PICKLE_FILENAME = }")
+    print(f"{BUNDLE_DIRNAME = }")
+    print(f"{SNAPSHOT_DIRNAME = }")
+    print(f"{SEARCH_CHECKPOINT_FILENAME = }")
+    print(f"{SEARCH_CACHE_DIRNAME = }")
+    print(f"{NLTK_DATA_FOLDER = }")
     print(f"{DEFAULT_TEST_MESSAGE = }")
 else:
     pass
@@ -0,0 +1,393 @@
+# Database helpers shared by the pipeline stages
+#
+# python -m src.data_preparation.database --database_filename data/db.sqlite3
+
+
+import argparse
+import contextlib
+import hashlib
+import os
+import sqlite3
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from src.config import DATABASE_FILENAME, TABLE_GENERATION_TABLE_NAME, TABLE_NAME
+
+# Number of leading columns of TABLE_NAME that are not categories (id, message, original, genre)
+N_MESSAGE_COLUMNS = 4
+CHECKSUM_BLOCK_SIZE = 2**20
+# Pragmas used when writing TABLE_NAME (journal_mode and page_size persist in the database file,
+# page_size takes effect only on a new database). A value of None leaves the pragma unchanged
+DEFAULT_PRAGMAS = {"journal_mode": None, "synchronous": "NORMAL", "page_size": None}
+
+
+def get_file_identity(filename):
+    """
+    Return the identity of a file, used to detect when it has been rewritten. For a SQLite database
+    in WAL mode the write-ahead log is part of the identity, since the changes are written there first
+
+    Args:
+        filename (str): filename
+
+    Returns:
+        identity (tuple): (absolute path, modification time in ns, size) or None if the file does not exist
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    identity = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+    try:
+        wal_stat = os.stat(filename + "-wal")
+    except FileNotFoundError:
+        return identity
+    return identity + (wal_stat.st_mtime_ns, wal_stat.st_size)
+
+
+def get_file_checksum(filename):
+    """
+    Return the checksum of the content of a file, read in blocks
+
+    Args:
+        filename (str): filename
+
+    Returns:
+        checksum (str): hexadecimal blake2b digest of the file
+    """
+    checksum = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+@contextlib.contextmanager
+def connect(database_filename=DATABASE_FILENAME):
+    """
+    Context manager returning a sqlite3 connection to the database. The transaction is committed
+    on exit (rolled back in case of error) and the connection closed
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+
+    Returns:
+        connection (sqlite3.Connection): connection to the database
+    """
+    connection = sqlite3.connect(database_filename)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def get_column_names(database_filename=DATABASE_FILENAME, table_name=TABLE_NAME):
+    """
+    Return the column names of a table reading only its schema
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        column_names (list): list of the column names in table order
+    """
+    with connect(database_filename) as connection:
+        rows = connection.execute('PRAGMA table_info("{}")'.format(table_name)).fetchall()
+    if len(rows) == 0:
+        raise ValueError("Table {} not found in {}".format(table_name, database_filename))
+    return [row[1] for row in rows]
+
+
+def table_exists(connection, table_name=TABLE_NAME):
+    """
+    Return True if the table exists
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        exists (bool): True if the table exists
+    """
+    return (
+        connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone()
+        is not None
+    )
+
+
+def apply_pragmas(connection, pragmas=None):
+    """
+    Set the pragmas of the connection
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        pragmas (dict): dictionary of the pragmas (name, value). Default value None (In case of None
+            DEFAULT_PRAGMAS will be used). The pragmas with value None are left unchanged
+
+    Returns:
+        None
+    """
+    if pragmas is None:
+        pragmas = DEFAULT_PRAGMAS
+    # page_size can not be changed once the database is in WAL mode, so it is set first
+    for name, value in sorted(pragmas.items(), key=lambda item: item[0] != "page_size"):
+        if value is not None:
+            connection.execute("PRAGMA {} = {}".format(name, value))
+
+
+def create_message_table(
+    connection, column_names, table_name=TABLE_NAME, primary_key=True, indexes=True
+):
+    """
+    Create the messages table with an explicit schema. The columns after the first
+    N_MESSAGE_COLUMNS are the categories, stored as small integers (SQLite stores 0 and 1 in the
+    record header only, without any payload byte)
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        column_names (list): list of the column names (id, message, original, genre, categories...)
+        table_name (str): table name. Default value TABLE_NAME
+        primary_key (bool): if True id is the primary key, otherwise the same id can appear in more
+            rows (as in the original dataset). Default value True
+        indexes (bool): if True create the indexes (see create_message_indexes). Default value True
+
+    Returns:
+        None
+    """
+    columns = [
+        '"id" INTEGER PRIMARY KEY' if primary_key is True else '"id" INTEGER NOT NULL',
+        '"message" TEXT',
+        '"original" TEXT',
+        '"genre" TEXT',
+    ]
+    columns += ['"{}" INTEGER NOT NULL'.format(name) for name in column_names[N_MESSAGE_COLUMNS:]]
+    connection.execute('CREATE TABLE "{}" ({})'.format(table_name, ", ".join(columns)))
+    set_table_generation(connection, table_name)
+    if indexes is True:
+        create_message_indexes(connection, table_name, primary_key)
+
+
+def set_table_generation(connection, table_name=TABLE_NAME, generation=None):
+    """
+    Record a new generation of a table, identifying its content since it was created: models
+    updated incrementally compare it with the one they were trained on to detect a rebuilt table
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        table_name (str): table name. Default value TABLE_NAME
+        generation (str): generation recorded. Default value None (In case of None a new random generation will be used)
+
+    Returns:
+        generation (str): generation recorded
+    """
+    if generation is None:
+        generation = uuid.uuid4().hex
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS "{}" (table_name TEXT PRIMARY KEY, generation TEXT)'.format(
+            TABLE_GENERATION_TABLE_NAME
+        )
+    )
+    connection.execute(
+        'INSERT OR REPLACE INTO "{}" (table_name, generation) VALUES (?, ?)'.format(
+            TABLE_GENERATION_TABLE_NAME
+        ),
+        (table_name, generation),
+    )
+    return generation
+
+
+def get_table_generation(connection, table_name=TABLE_NAME):
+    """
+    Return the generation of a table recorded when it was created (see set_table_generation)
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        generation (str): generation of the table or None if it was not recorded
+    """
+    if not table_exists(connection, TABLE_GENERATION_TABLE_NAME):
+        return None
+    row = connection.execute(
+        'SELECT generation FROM "{}" WHERE table_name = ?'.format(TABLE_GENERATION_TABLE_NAME),
+        (table_name,),
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+def create_message_indexes(connection, table_name=TABLE_NAME, primary_key=True):
+    """
+    Create the index on genre and, when id is not the primary key, the index on id. Creating them
+    after a bulk insert is faster than updating them row by row
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        table_name (str): table name. Default value TABLE_NAME
+        primary_key (bool): True if id is the primary key of the table. Default value True
+
+    Returns:
+        None
+    """
+    connection.execute(
+        'CREATE INDEX IF NOT EXISTS "{0}_genre" ON "{0}" ("genre")'.format(table_name)
+    )
+    if primary_key is False:
+        connection.execute('CREATE INDEX IF NOT EXISTS "{0}_id" ON "{0}" ("id")'.format(table_name))
+
+
+def get_records(df):
+    """
+    Return the rows of the messages dataframe as tuples of Python values, ready for executemany.
+    The columns are converted at once instead of row by row
+
+    Args:
+        df (pandas.DataFrame): dataframe containing the messages (id, message, original, genre, categories...)
+
+    Returns:
+        records (iterator): iterator of the rows as tuples
+    """
+    columns = [df["id"].astype("int64").tolist()]
+    for name in df.columns[1:N_MESSAGE_COLUMNS]:
+        column = df[name].astype(object)
+        columns.append(column.where(column.notna(), None).tolist())
+    columns += df.iloc[:, N_MESSAGE_COLUMNS:].to_numpy(dtype=np.int64).T.tolist()
+    return zip(*columns, strict=True)
+
+
+def insert_messages(connection, df, table_name=TABLE_NAME):
+    """
+    Insert the rows of the messages dataframe with a single executemany
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        df (pandas.DataFrame): dataframe containing the messages
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        None
+    """
+    connection.executemany(
+        'INSERT INTO "{}" VALUES ({})'.format(table_name, ", ".join(["?"] * len(df.columns))),
+        get_records(df),
+    )
+
+
+def write_messages(database_filename, df, table_name=TABLE_NAME, pragmas=None):
+    """
+    Replace the messages table with the rows of the dataframe in a single transaction. The table is
+    created with an explicit schema (see create_message_table) and the indexes are built at the end
+
+    Args:
+        database_filename (str): database filename
+        df (pandas.DataFrame): dataframe containing the messages (id, message, original, genre, categories...)
+        table_name (str): table name. Default value TABLE_NAME
+        pragmas (dict): dictionary of the pragmas (name, value). Default value None (In case of None
+            DEFAULT_PRAGMAS will be used)
+
+    Returns:
+        None
+    """
+    with connect(database_filename) as connection:
+        apply_pragmas(connection, pragmas)
+        connection.execute('DROP TABLE IF EXISTS "{}"'.format(table_name))
+        create_message_table(
+            connection, list(df.columns), table_name, primary_key=False, indexes=False
+        )
+        insert_messages(connection, df, table_name)
+        create_message_indexes(connection, table_name, primary_key=False)
+
+
+def read_messages(database_filename=DATABASE_FILENAME, table_name=TABLE_NAME):
+    """
+    Read the messages table. The categories are decoded straight into a uint8 matrix
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        df (pandas.DataFrame): dataframe containing the messages with the columns in table order
+    """
+    column_names = get_column_names(database_filename, table_name)
+    message_column_names = column_names[:N_MESSAGE_COLUMNS]
+    category_names = column_names[N_MESSAGE_COLUMNS:]
+    with connect(database_filename) as connection:
+        rows = connection.execute(
+            'SELECT {} FROM "{}" ORDER BY rowid'.format(
+                ", ".join('"{}"'.format(name) for name in column_names), table_name
+            )
+        ).fetchall()
+    columns = list(zip(*rows, strict=True)) if len(rows) > 0 else [()] * len(column_names)
+    df = pd.DataFrame(
+        {
+            name: pd.Series(column, dtype="int64" if name == "id" else None)
+            for name, column in zip(message_column_names, columns[:N_MESSAGE_COLUMNS], strict=True)
+        }
+    )
+    categories = np.array(columns[N_MESSAGE_COLUMNS:], dtype=np.uint8).reshape(
+        len(category_names), len(rows)
+    )
+    return pd.concat([df, pd.DataFrame(categories.T, columns=category_names)], axis=1)
+
+
+def has_primary_key(connection, table_name=TABLE_NAME):
+    """
+    Return True if the table has a primary key
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        has_primary_key (bool): True if any column of the table is part of the primary key
+    """
+    rows = connection.execute('PRAGMA table_info("{}")'.format(table_name)).fetchall()
+    return any(row[5] > 0 for row in rows)
+
+
+def get_category_column_names(database_filename=DATABASE_FILENAME, table_name=TABLE_NAME):
+    """
+    Return the category column names of a table reading only its schema
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        table_name (str): table name. Default value TABLE_NAME
+
+    Returns:
+        category_names (list): list of the category names
+    """
+    return get_column_names(database_filename, table_name)[N_MESSAGE_COLUMNS:]
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Database")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename
+
+
+if __name__ == "__main__":
+    print("Database")
+    database_filename = parse_input_arguments()
+    print("Identity: {}".format(get_file_identity(database_filename)))
+    print("Columns: {}".format(get_column_names(database_filename)))
+else:
+    pass
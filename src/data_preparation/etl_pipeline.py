@@ -3,9 +3,11 @@
 # python -m src.data_preparation.etl_pipeline --messages_filename data/disaster_messages.csv --categories_filename data/disaster_categories.csv --database_filename data/db.sqlite3
 
 
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
 import argparse
+import os
+import time
 
 
 from src.config import (
@@ -13,7 +15,15 @@ from src.config import (
     TABLE_NAME,
     MESSAGES_FILENAME,
     CATEGORIES_FILENAME,
+    ROW_HASH_TABLE_NAME,
+    ETL_STATE_TABLE_NAME,
+    SNAPSHOT_DIRNAME,
 )
+from src import instrumentation
+from src.data_preparation import database, metadata, snapshot
+from src.memory_usage import get_peak_rss_mb
+
+DEFAULT_CHUNK_SIZE = 50000
 
 
 def load_data(messages_filename, categories_filename):
@@ -36,6 +46,65 @@ def load_data(messages_filename, categories_filename):
     return df
 
 
+def _decode_categories_by_name(categories, category_names):
+    """
+    Decode the categories row by row matching the values by name. Used when the rows do not all
+    share the layout of the first one (different order or values longer than one character)
+
+    Args:
+        categories (list): list of "name-value;name-value;..." strings
+        category_names (list): list of the category names of the first row
+
+    Returns:
+        values (numpy.ndarray): uint8 matrix of the category values (rows, categories)
+    """
+    values = np.empty((len(categories), len(category_names)), dtype=np.uint8)
+    for i, row in enumerate(categories):
+        row_values = dict(item.rsplit("-", 1) for item in row.split(";"))
+        if len(row_values) != len(category_names) or set(row_values) != set(category_names):
+            raise ValueError(
+                "Row {} has categories {} instead of {}".format(
+                    i, sorted(row_values), sorted(category_names)
+                )
+            )
+        values[i] = [int(row_values[name][-1]) for name in category_names]
+    return values
+
+
+def decode_categories(categories):
+    """
+    Decode the categories column ("name-value;name-value;...") into the category names and a compact
+    matrix of values. When every row has the layout of the first one (the common case) the whole
+    column is decoded at once as a matrix of bytes, checking that the names match in every row
+
+    Args:
+        categories (pandas.Series): categories column
+
+    Returns:
+        category_names (list): list of the category names
+        values (numpy.ndarray): uint8 matrix of the category values (rows, categories)
+    """
+    categories = categories.tolist()
+    if len(categories) == 0:
+        return [], np.empty((0, 0), dtype=np.uint8)
+    category_names = [item.rsplit("-", 1)[0] for item in categories[0].split(";")]
+    template = categories[0].encode("ascii", errors="replace")
+    # Position of the value character of each category in the row
+    value_positions = np.cumsum([len(name) + 3 for name in category_names]) - 2
+    try:
+        buffer = "".join(categories).encode("ascii")
+    except UnicodeEncodeError:
+        buffer = b""
+    if len(buffer) == len(template) * len(categories):
+        rows = np.frombuffer(buffer, dtype=np.uint8).reshape(len(categories), len(template))
+        names = np.delete(rows, value_positions, axis=1)
+        expected_names = np.delete(np.frombuffer(template, dtype=np.uint8), value_positions)
+        values = rows[:, value_positions] - ord("0")
+        if (names == expected_names).all() and (values <= 9).all():
+            return category_names, values
+    return category_names, _decode_categories_by_name(categories, category_names)
+
+
 def clean_data(df):
     """
     Clean the data
@@ -46,16 +115,8 @@ def clean_data(df):
     Returns:
         df (pandas.DataFrame): dataframe containing the cleaned dataset
     """
-    categories = df.categories.str.split(pat=";", expand=True)
-    # categories.head()
-    row = categories.iloc[0, :]
-    category_colnames = row.apply(lambda x: x[:-2])
-    # print(category_colnames)
-    categories.columns = category_colnames
-    # categories.head()
-    for column in categories:
-        categories[column] = categories[column].str[-1]
-        categories[column] = categories[column].astype(int)
+    category_names, values = decode_categories(df["categories"])
+    categories = pd.DataFrame(values, columns=category_names, index=df.index)
     # categories.head()
     df = df.drop("categories", axis=1)
     # df.head()
@@ -66,16 +127,361 @@ def clean_data(df):
     return df
 
 
-def save_data(df, database_filename):
+def save_data(df, database_filename, pragmas=None):
     """
     Save the data into the database. The destination table name is TABLE_NAME
 
     Args:
         df (pandas.DataFrame): dataframe containing the dataset
         database_filename (str): database filename
+        pragmas (dict): dictionary of the SQLite pragmas used to write. Default value None (In case of None database.DEFAULT_PRAGMAS will be used)
     """
-    engine = create_engine("sqlite:///" + database_filename)
-    df.to_sql(TABLE_NAME, engine, index=False, if_exists="replace")
+    database.write_messages(database_filename, df, pragmas=pragmas)
+    reset_incremental_state(database_filename)
+    metadata.write_aggregates(database_filename)
+
+
+def reset_incremental_state(database_filename):
+    """
+    Drop the state of the incremental mode (row hashes and input checksums). Called whenever
+    TABLE_NAME is rewritten from scratch, so that the next incremental run starts over
+
+    Args:
+        database_filename (str): database filename
+
+    Returns:
+        None
+    """
+    with database.connect(database_filename) as connection:
+        connection.execute('DROP TABLE IF EXISTS "{}"'.format(ROW_HASH_TABLE_NAME))
+        connection.execute('DROP TABLE IF EXISTS "{}"'.format(ETL_STATE_TABLE_NAME))
+
+
+def _create_staging_database(staging_filename, categories_filename, chunk_size):
+    """
+    Create the staging database holding the categories indexed by id and the hashes of the rows
+    already saved, so that neither needs to stay in memory
+
+    Args:
+        staging_filename (str): staging database filename
+        categories_filename (str): categories filename
+        chunk_size (int): number of rows read at once
+
+    Returns:
+        None
+    """
+    if os.path.exists(staging_filename):
+        os.remove(staging_filename)
+    with database.connect(staging_filename) as connection:
+        connection.execute("CREATE TABLE categories (id INTEGER, categories TEXT)")
+        connection.execute("CREATE TABLE row_hash (hash INTEGER PRIMARY KEY)")
+        connection.execute("CREATE TABLE chunk_id (id INTEGER PRIMARY KEY)")
+        connection.execute("CREATE TABLE chunk_hash (hash INTEGER PRIMARY KEY)")
+        for chunk in pd.read_csv(categories_filename, chunksize=chunk_size):
+            connection.executemany(
+                "INSERT INTO categories (id, categories) VALUES (?, ?)",
+                chunk[["id", "categories"]].itertuples(index=False, name=None),
+            )
+        connection.execute("CREATE INDEX categories_id ON categories (id)")
+
+
+def _merge_chunk(connection, messages):
+    """
+    Merge a chunk of messages with their categories read from the staging database. The result is
+    the same rows, in the same order, of the merge of the whole files restricted to the chunk
+
+    Args:
+        connection (sqlite3.Connection): connection to the staging database
+        messages (pandas.DataFrame): chunk of the messages
+
+    Returns:
+        df (pandas.DataFrame): dataframe containing the uncleaned chunk
+    """
+    connection.execute("DELETE FROM chunk_id")
+    connection.executemany(
+        "INSERT OR IGNORE INTO chunk_id (id) VALUES (?)",
+        ((int(message_id),) for message_id in messages["id"]),
+    )
+    categories = pd.read_sql(
+        "SELECT c.id, c.categories FROM categories c JOIN chunk_id USING (id) ORDER BY c.rowid",
+        connection,
+    )
+    return pd.merge(messages, categories, on="id")
+
+
+def _drop_saved_duplicates(connection, df):
+    """
+    Drop the rows of the chunk that are duplicated in the chunk or already saved from a previous
+    chunk. The hashes of the saved rows are kept in the staging database
+
+    Args:
+        connection (sqlite3.Connection): connection to the staging database
+        df (pandas.DataFrame): dataframe containing the cleaned chunk
+
+    Returns:
+        df (pandas.DataFrame): dataframe without the duplicated rows
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy().view("int64")
+    is_new = ~pd.Series(hashes).duplicated().to_numpy()
+    connection.execute("DELETE FROM chunk_hash")
+    connection.executemany(
+        "INSERT INTO chunk_hash (hash) VALUES (?)", ((int(h),) for h in hashes[is_new])
+    )
+    saved_hashes = [
+        h for (h,) in connection.execute("SELECT hash FROM chunk_hash JOIN row_hash USING (hash)")
+    ]
+    connection.execute("INSERT OR IGNORE INTO row_hash (hash) SELECT hash FROM chunk_hash")
+    is_new &= ~np.isin(hashes, np.array(saved_hashes, dtype=np.int64))
+    return df[is_new]
+
+
+def process_streaming(
+    messages_filename,
+    categories_filename,
+    database_filename,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    pragmas=None,
+):
+    """
+    Process the data in chunks and save it in a database. The categories are staged in a temporary
+    database indexed by id, then the messages are read, merged, cleaned, deduplicated and appended
+    to TABLE_NAME chunk by chunk, each in its own transaction, so the memory used does not depend on
+    the size of the input files
+
+    Args:
+        messages_filename (str): messages filename
+        categories_filename (str): categories filename
+        database_filename (str): database filename
+        chunk_size (int): number of messages processed at once. Default value DEFAULT_CHUNK_SIZE
+        pragmas (dict): dictionary of the SQLite pragmas used to write. Default value None (In case of None database.DEFAULT_PRAGMAS will be used)
+
+    Returns:
+        stats (dict): rows read, rows saved, duplicates dropped, elapsed seconds and peak memory (MB)
+
+    Raises:
+        ValueError: if no message of the input files has categories
+    """
+    start = time.perf_counter()
+    staging_filename = database_filename + ".staging"
+    stats = {"rows_read": 0, "rows_saved": 0, "duplicates": 0}
+    try:
+        print("Staging categories...\n    Categories: {}".format(categories_filename))
+        _create_staging_database(staging_filename, categories_filename, chunk_size)
+        with (
+            database.connect(staging_filename) as staging_connection,
+            database.connect(database_filename) as connection,
+        ):
+            for messages in pd.read_csv(messages_filename, chunksize=chunk_size):
+                stats["rows_read"] += len(messages)
+                df = _merge_chunk(staging_connection, messages)
+                if len(df) == 0:
+                    continue
+                n_rows = len(df)
+                df = clean_data(df)
+                df = _drop_saved_duplicates(staging_connection, df)
+                staging_connection.commit()
+                if stats["rows_saved"] == 0:
+                    database.apply_pragmas(connection, pragmas)
+                    connection.execute('DROP TABLE IF EXISTS "{}"'.format(TABLE_NAME))
+                    database.create_message_table(
+                        connection, list(df.columns), primary_key=False, indexes=False
+                    )
+                database.insert_messages(connection, df)
+                connection.commit()
+                stats["rows_saved"] += len(df)
+                stats["duplicates"] += n_rows - len(df)
+                print(
+                    "    Messages read: {} Rows saved: {}".format(
+                        stats["rows_read"], stats["rows_saved"]
+                    )
+                )
+            if stats["rows_saved"] == 0:
+                # The table is written with the first chunk: the database is left unchanged
+                raise ValueError(
+                    "No message of {} has categories in {}".format(
+                        messages_filename, categories_filename
+                    )
+                )
+            database.create_message_indexes(connection, primary_key=False)
+    finally:
+        if os.path.exists(staging_filename):
+            os.remove(staging_filename)
+    reset_incremental_state(database_filename)
+    metadata.write_aggregates(database_filename)
+    stats["elapsed"] = time.perf_counter() - start
+    stats["peak_rss_mb"] = get_peak_rss_mb()
+    return stats
+
+
+def _read_input_state(connection, input_filenames):
+    """
+    Return the state of the input files and whether their content changed since the last
+    incremental run. The checksum is computed only when the size or the modification time changed
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        input_filenames (dict): dictionary of the input filenames (input name, filename)
+
+    Returns:
+        state (dict): dictionary of the input states (input name, (size, mtime in ns, checksum))
+        changed (bool): True if the content of any input file changed
+    """
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS "{}" '
+        "(input TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, checksum TEXT)".format(
+            ETL_STATE_TABLE_NAME
+        )
+    )
+    saved_state = {
+        row[0]: row[1:]
+        for row in connection.execute(
+            'SELECT input, size, mtime_ns, checksum FROM "{}"'.format(ETL_STATE_TABLE_NAME)
+        )
+    }
+    state = {}
+    changed = False
+    for input_name, filename in input_filenames.items():
+        stat = os.stat(filename)
+        saved = saved_state.get(input_name)
+        if saved is not None and saved[:2] == (stat.st_size, stat.st_mtime_ns):
+            checksum = saved[2]
+        else:
+            checksum = database.get_file_checksum(filename)
+        state[input_name] = (stat.st_size, stat.st_mtime_ns, checksum)
+        changed |= saved is None or saved[2] != checksum
+    return state, changed
+
+
+def _prepare_message_table(connection, column_names):
+    """
+    Make sure TABLE_NAME exists with id as primary key. A table written by a full run is rebuilt
+    with the primary key, keeping the last row of every id
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        column_names (list): list of the column names of the cleaned dataset
+
+    Returns:
+        None
+    """
+    if not database.table_exists(connection, TABLE_NAME):
+        database.create_message_table(connection, column_names)
+        return
+    saved_column_names = [
+        row[1] for row in connection.execute('PRAGMA table_info("{}")'.format(TABLE_NAME))
+    ]
+    if saved_column_names != column_names:
+        raise ValueError(
+            "The columns of {} do not match the input files, run a full process instead".format(
+                TABLE_NAME
+            )
+        )
+    if not database.has_primary_key(connection, TABLE_NAME):
+        old_table_name = TABLE_NAME + "_old"
+        # The rows and their ids are kept, so models trained on the table can still be updated
+        generation = database.get_table_generation(connection)
+        connection.execute('ALTER TABLE "{}" RENAME TO "{}"'.format(TABLE_NAME, old_table_name))
+        database.create_message_table(connection, column_names)
+        if generation is not None:
+            database.set_table_generation(connection, TABLE_NAME, generation)
+        connection.execute(
+            'INSERT OR REPLACE INTO "{}" SELECT * FROM "{}" ORDER BY rowid'.format(
+                TABLE_NAME, old_table_name
+            )
+        )
+        connection.execute('DROP TABLE "{}"'.format(old_table_name))
+        # The indexes moved with the renamed table and have been dropped with it
+        database.create_message_indexes(connection)
+
+
+def _upsert_rows(connection, df):
+    """
+    Insert the new rows and update the changed ones. A row is changed when the hash of its values
+    differs from the one saved by the previous run
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        df (pandas.DataFrame): dataframe containing the cleaned dataset, one row per id
+
+    Returns:
+        stats (dict): number of rows inserted, updated and skipped
+    """
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS "{}" (id INTEGER PRIMARY KEY, hash INTEGER)'.format(
+            ROW_HASH_TABLE_NAME
+        )
+    )
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy().view("int64")
+    saved = pd.read_sql('SELECT id, hash FROM "{}"'.format(ROW_HASH_TABLE_NAME), connection)
+    saved_hashes = saved.set_index("id")["hash"].astype("Int64").reindex(df["id"])
+    is_new = saved_hashes.isna().to_numpy()
+    is_changed = ~is_new & (saved_hashes.to_numpy(dtype=np.int64, na_value=0) != hashes)
+    is_upserted = is_new | is_changed
+
+    column_names = ", ".join('"{}"'.format(name) for name in df.columns)
+    updates = ", ".join('"{0}" = excluded."{0}"'.format(name) for name in df.columns[1:])
+    connection.executemany(
+        'INSERT INTO "{}" ({}) VALUES ({}) ON CONFLICT (id) DO UPDATE SET {}'.format(
+            TABLE_NAME, column_names, ", ".join(["?"] * len(df.columns)), updates
+        ),
+        database.get_records(df[is_upserted]),
+    )
+    connection.executemany(
+        'INSERT INTO "{}" (id, hash) VALUES (?, ?) '
+        "ON CONFLICT (id) DO UPDATE SET hash = excluded.hash".format(ROW_HASH_TABLE_NAME),
+        zip(df["id"][is_upserted].tolist(), hashes[is_upserted].tolist(), strict=True),
+    )
+    return {
+        "inserted": int(is_new.sum()),
+        "updated": int(is_changed.sum()),
+        "skipped": int((~is_upserted).sum()),
+    }
+
+
+def process_incremental(messages_filename, categories_filename, database_filename, pragmas=None):
+    """
+    Process the data and upsert it by id into TABLE_NAME. When the input files did not change since
+    the last incremental run nothing is read, otherwise only the new or changed rows are written.
+    TABLE_NAME keeps one row per id (the last one of the input files) and the rows missing from the
+    input files are kept
+
+    Args:
+        messages_filename (str): messages filename
+        categories_filename (str): categories filename
+        database_filename (str): database filename
+        pragmas (dict): dictionary of the SQLite pragmas used to write. Default value None (In case of None database.DEFAULT_PRAGMAS will be used)
+
+    Returns:
+        stats (dict): rows inserted, updated and skipped, if the input files changed and elapsed seconds
+    """
+    start = time.perf_counter()
+    stats = {"inserted": 0, "updated": 0, "skipped": 0}
+    with database.connect(database_filename) as connection:
+        database.apply_pragmas(connection, pragmas)
+        state, changed = _read_input_state(
+            connection, {"messages": messages_filename, "categories": categories_filename}
+        )
+        changed |= not database.table_exists(connection, ROW_HASH_TABLE_NAME)
+        if changed is True:
+            df = clean_data(load_data(messages_filename, categories_filename))
+            df = df.drop_duplicates("id", keep="last")
+            _prepare_message_table(connection, list(df.columns))
+            stats = _upsert_rows(connection, df)
+        else:
+            stats["skipped"] = connection.execute(
+                'SELECT COUNT(*) FROM "{}"'.format(ROW_HASH_TABLE_NAME)
+            ).fetchone()[0]
+        connection.executemany(
+            'INSERT OR REPLACE INTO "{}" (input, size, mtime_ns, checksum) VALUES (?, ?, ?, ?)'.format(
+                ETL_STATE_TABLE_NAME
+            ),
+            [(input_name,) + input_state for input_name, input_state in state.items()],
+        )
+    if changed is True:
+        metadata.write_aggregates(database_filename)
+    stats["changed"] = changed
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
 
 
 def parse_input_arguments():
@@ -86,6 +492,11 @@ def parse_input_arguments():
         categories_filename (str): categories filename. Default value CATEGORIES_FILENAME
         messages_filename (str): messages filename. Default value MESSAGES_FILENAME
         database_filename (str): database filename. Default value DATABASE_FILENAME
+        streaming (bool): if True process the data in chunks
+        chunk_size (int): number of messages processed at once in streaming mode
+        incremental (bool): if True upsert only the new or changed messages
+        pragmas (dict): dictionary of the SQLite pragmas used to write
+        snapshot_dirname (str): directory of the training snapshot or None to skip it
     """
     parser = argparse.ArgumentParser(description="Disaster Response Pipeline Process Data")
     parser.add_argument(
@@ -106,12 +517,78 @@ def parse_input_arguments():
         default=DATABASE_FILENAME,
         help="Database filename to save cleaned data",
     )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        default=False,
+        help="Process the data in chunks to bound the memory used",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Number of messages processed at once in streaming mode",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="Upsert only the new or changed messages into the existing database",
+    )
+    parser.add_argument(
+        "--journal_mode",
+        type=str,
+        default=database.DEFAULT_PRAGMAS["journal_mode"],
+        help="SQLite journal mode (e.g. WAL), by default unchanged",
+    )
+    parser.add_argument(
+        "--synchronous",
+        type=str,
+        default=database.DEFAULT_PRAGMAS["synchronous"],
+        help="SQLite synchronous setting used while writing (OFF, NORMAL or FULL)",
+    )
+    parser.add_argument(
+        "--page_size",
+        type=int,
+        default=database.DEFAULT_PRAGMAS["page_size"],
+        help="SQLite page size in bytes, applied only to a new database",
+    )
+    parser.add_argument(
+        "--snapshot_dirname",
+        type=str,
+        default=SNAPSHOT_DIRNAME,
+        help="Directory of the columnar training snapshot (empty string to skip it)",
+    )
     args = parser.parse_args()
     # print(args)
-    return args.messages_filename, args.categories_filename, args.database_filename
+    if args.streaming is True and args.incremental is True:
+        parser.error("--streaming and --incremental can not be used together")
+    return (
+        args.messages_filename,
+        args.categories_filename,
+        args.database_filename,
+        args.streaming,
+        args.chunk_size,
+        args.incremental,
+        {
+            "journal_mode": args.journal_mode,
+            "synchronous": args.synchronous,
+            "page_size": args.page_size,
+        },
+        args.snapshot_dirname or None,
+    )
 
 
-def process(messages_filename, categories_filename, database_filename):
+def process(
+    messages_filename,
+    categories_filename,
+    database_filename,
+    streaming=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    incremental=False,
+    pragmas=None,
+    snapshot_dirname=None,
+):
     """
     Process the data and save it in a database
 
@@ -119,31 +596,94 @@ def process(messages_filename, categories_filename, database_filename):
         categories_filename (str): categories filename
         messages_filename (str): messages filename
         database_filename (str): database filename
+        streaming (bool): if True process the data in chunks (see process_streaming). Default value False
+        chunk_size (int): number of messages processed at once in streaming mode. Default value DEFAULT_CHUNK_SIZE
+        incremental (bool): if True upsert only the new or changed messages (see process_incremental). Default value False
+        pragmas (dict): dictionary of the SQLite pragmas used to write. Default value None (In case of None database.DEFAULT_PRAGMAS will be used)
+        snapshot_dirname (str): directory of the columnar training snapshot exported after saving the data. Default value None (In case of None the snapshot is not exported)
     """
     # print(messages_filename)
     # print(categories_filename)
     # print(database_filename)
     # print(os.getcwd())
 
-    print(
-        "Loading data...\n    Messages: {}\n    Categories: {}".format(
-            messages_filename, categories_filename
-        )
-    )
-    df = load_data(messages_filename, categories_filename)
+    changed = True
+    with instrumentation.span("etl.process", mode="full") as process_span:
+        if incremental is True:
+            process_span.set(mode="incremental")
+            stats = process_incremental(
+                messages_filename, categories_filename, database_filename, pragmas
+            )
+            process_span.set_rows(stats["inserted"] + stats["updated"] + stats["skipped"])
+            changed = stats["changed"]
+            if changed is False:
+                print("Input files unchanged, nothing to do")
+            print(
+                "Cleaned data saved to database!\n    Inserted: {}\n    Updated: {}\n"
+                "    Skipped: {}\n    Elapsed: {:.1f}s".format(
+                    stats["inserted"], stats["updated"], stats["skipped"], stats["elapsed"]
+                )
+            )
+        elif streaming is True:
+            process_span.set(mode="streaming")
+            stats = process_streaming(
+                messages_filename, categories_filename, database_filename, chunk_size, pragmas
+            )
+            process_span.set_rows(stats["rows_saved"])
+            print(
+                "Cleaned data saved to database!\n    Rows saved: {}\n    Duplicates dropped: {}\n"
+                "    Elapsed: {:.1f}s\n    Peak memory: {} MB".format(
+                    stats["rows_saved"], stats["duplicates"], stats["elapsed"], stats["peak_rss_mb"]
+                )
+            )
+        else:
+            print(
+                "Loading data...\n    Messages: {}\n    Categories: {}".format(
+                    messages_filename, categories_filename
+                )
+            )
+            with instrumentation.span("etl.load_data") as stage:
+                df = load_data(messages_filename, categories_filename)
+                stage.set_rows(len(df))
 
-    print("Cleaning data...")
-    df = clean_data(df)
+            print("Cleaning data...")
+            with instrumentation.span("etl.clean_data", rows=len(df)):
+                df = clean_data(df)
 
-    print("Saving data...\n    Database: {}".format(database_filename))
-    save_data(df, database_filename)
+            print("Saving data...\n    Database: {}".format(database_filename))
+            with instrumentation.span("etl.save_data", rows=len(df)):
+                save_data(df, database_filename, pragmas)
+            process_span.set_rows(len(df))
 
-    print("Cleaned data saved to database!")
+            print("Cleaned data saved to database!")
+
+        if snapshot_dirname and (changed is True or not snapshot.is_snapshot(snapshot_dirname)):
+            print("Exporting training snapshot...\n    Snapshot: {}".format(snapshot_dirname))
+            with instrumentation.span("etl.export_snapshot"):
+                snapshot.export_snapshot(database_filename, snapshot_dirname, chunk_size)
 
 
 if __name__ == "__main__":
     print("Process the data and save it in a database")
-    messages_filename, categories_filename, database_filename = parse_input_arguments()
-    process(messages_filename, categories_filename, database_filename)
+    (
+        messages_filename,
+        categories_filename,
+        database_filename,
+        streaming,
+        chunk_size,
+        incremental,
+        pragmas,
+        snapshot_dirname,
+    ) = parse_input_arguments()
+    process(
+        messages_filename,
+        categories_filename,
+        database_filename,
+        streaming,
+        chunk_size,
+        incremental,
+        pragmas,
+        snapshot_dirname,
+    )
 else:
     pass
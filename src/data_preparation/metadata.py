@@ -0,0 +1,270 @@
+# Cache of the dataset metadata (category names, genre distribution, category totals, co-occurrence)
+#
+# python -m src.data_preparation.metadata --database_filename data/db.sqlite3
+
+
+import argparse
+import os
+import threading
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from src.config import (
+    CATEGORY_COOCCURRENCE_TABLE_NAME,
+    CATEGORY_COUNT_TABLE_NAME,
+    DATABASE_FILENAME,
+    GENRE_COUNT_TABLE_NAME,
+    TABLE_NAME,
+)
+from src.data_preparation import database
+
+# Number of rows read at once when computing the aggregates
+AGGREGATE_CHUNK_SIZE = 50000
+
+DatasetMetadata = namedtuple(
+    "DatasetMetadata",
+    [
+        "identity",
+        "category_names",
+        "genre_distribution",
+        "category_totals",
+        "category_cooccurrence",
+    ],
+)
+
+_metadata_cache = {}
+_metadata_lock = threading.Lock()
+
+
+def compute_aggregates(connection, category_names, chunk_size=AGGREGATE_CHUNK_SIZE):
+    """
+    Compute the aggregates of TABLE_NAME reading it in chunks
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        category_names (list): list of the category names
+        chunk_size (int): number of rows read at once. Default value AGGREGATE_CHUNK_SIZE
+
+    Returns:
+        genre_distribution (dict): dictionary of the number of messages of each genre (genre, count)
+        category_totals (dict): dictionary of the sum of each category (category, total)
+        category_cooccurrence (numpy.ndarray): number of messages of each pair of categories (categories, categories)
+    """
+    genre_counts = Counter()
+    totals = np.zeros(len(category_names), dtype=np.int64)
+    cooccurrence = np.zeros((len(category_names), len(category_names)), dtype=np.int64)
+    cursor = connection.execute(
+        'SELECT CASE WHEN "message" IS NULL THEN NULL ELSE "genre" END, {} FROM "{}"'.format(
+            ", ".join('"{}"'.format(name) for name in category_names), TABLE_NAME
+        )
+    )
+    while len(rows := cursor.fetchmany(chunk_size)) > 0:
+        columns = list(zip(*rows, strict=True))
+        genre_counts.update(genre for genre in columns[0] if genre is not None)
+        Y = np.array(columns[1:], dtype=np.int64).reshape(len(category_names), len(rows))
+        totals += Y.sum(axis=1)
+        # float32 products are exact up to 2**24 messages per chunk
+        flags = (Y > 0).astype(np.float32)
+        cooccurrence += (flags @ flags.T).astype(np.int64)
+    genre_distribution = {genre: genre_counts[genre] for genre in sorted(genre_counts)}
+    category_totals = dict(zip(category_names, totals.tolist(), strict=True))
+    return genre_distribution, category_totals, cooccurrence
+
+
+def write_aggregates(database_filename=DATABASE_FILENAME):
+    """
+    Compute the aggregates of TABLE_NAME and store them in the aggregate tables (genre counts,
+    category totals and category co-occurrence), so that reading the metadata costs
+    O(categories) instead of a scan of the messages. Called by the etl pipeline after writing
+    TABLE_NAME; the cached metadata is dropped
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+
+    Returns:
+        None
+    """
+    category_names = database.get_category_column_names(database_filename)
+    with database.connect(database_filename) as connection:
+        genre_distribution, category_totals, cooccurrence = compute_aggregates(
+            connection, category_names
+        )
+        for table_name in [
+            GENRE_COUNT_TABLE_NAME,
+            CATEGORY_COUNT_TABLE_NAME,
+            CATEGORY_COOCCURRENCE_TABLE_NAME,
+        ]:
+            connection.execute('DROP TABLE IF EXISTS "{}"'.format(table_name))
+        connection.execute(
+            'CREATE TABLE "{}" (genre TEXT PRIMARY KEY, count INTEGER NOT NULL)'.format(
+                GENRE_COUNT_TABLE_NAME
+            )
+        )
+        connection.executemany(
+            'INSERT INTO "{}" VALUES (?, ?)'.format(GENRE_COUNT_TABLE_NAME),
+            genre_distribution.items(),
+        )
+        connection.execute(
+            'CREATE TABLE "{}" (category TEXT PRIMARY KEY, total INTEGER NOT NULL)'.format(
+                CATEGORY_COUNT_TABLE_NAME
+            )
+        )
+        connection.executemany(
+            'INSERT INTO "{}" VALUES (?, ?)'.format(CATEGORY_COUNT_TABLE_NAME),
+            category_totals.items(),
+        )
+        connection.execute(
+            'CREATE TABLE "{}" (category_a TEXT NOT NULL, category_b TEXT NOT NULL, '
+            "count INTEGER NOT NULL, PRIMARY KEY (category_a, category_b))".format(
+                CATEGORY_COOCCURRENCE_TABLE_NAME
+            )
+        )
+        connection.executemany(
+            'INSERT INTO "{}" VALUES (?, ?, ?)'.format(CATEGORY_COOCCURRENCE_TABLE_NAME),
+            (
+                (name_a, name_b, count)
+                for name_a, row in zip(category_names, cooccurrence.tolist(), strict=True)
+                for name_b, count in zip(category_names, row, strict=True)
+            ),
+        )
+    refresh_metadata(database_filename)
+
+
+def _read_aggregates(connection, category_names):
+    """
+    Read the aggregate tables written by write_aggregates
+
+    Args:
+        connection (sqlite3.Connection): connection to the database
+        category_names (list): list of the category names
+
+    Returns:
+        aggregates (tuple): (genre_distribution, category_totals, category_cooccurrence) as returned
+            by compute_aggregates or None if the aggregate tables are missing or do not match the categories
+    """
+    if not all(
+        database.table_exists(connection, table_name)
+        for table_name in [
+            GENRE_COUNT_TABLE_NAME,
+            CATEGORY_COUNT_TABLE_NAME,
+            CATEGORY_COOCCURRENCE_TABLE_NAME,
+        ]
+    ):
+        return None
+    totals = dict(
+        connection.execute('SELECT category, total FROM "{}"'.format(CATEGORY_COUNT_TABLE_NAME))
+    )
+    if sorted(totals) != sorted(category_names):
+        return None
+    genre_distribution = dict(
+        connection.execute(
+            'SELECT genre, count FROM "{}" ORDER BY genre'.format(GENRE_COUNT_TABLE_NAME)
+        )
+    )
+    positions = {name: i for i, name in enumerate(category_names)}
+    cooccurrence = np.zeros((len(category_names), len(category_names)), dtype=np.int64)
+    for name_a, name_b, count in connection.execute(
+        'SELECT category_a, category_b, count FROM "{}"'.format(CATEGORY_COOCCURRENCE_TABLE_NAME)
+    ):
+        cooccurrence[positions[name_a], positions[name_b]] = count
+    category_totals = {name: totals[name] for name in category_names}
+    return genre_distribution, category_totals, cooccurrence
+
+
+def _read_metadata(database_filename, identity):
+    """
+    Read the metadata from the aggregate tables or, for a database written without them, computing
+    the aggregates from TABLE_NAME
+
+    Args:
+        database_filename (str): database filename
+        identity (tuple): identity of the database file when the read starts
+
+    Returns:
+        metadata (DatasetMetadata): metadata of the dataset
+    """
+    category_names = database.get_category_column_names(database_filename)
+    with database.connect(database_filename) as connection:
+        aggregates = _read_aggregates(connection, category_names)
+        if aggregates is None:
+            aggregates = compute_aggregates(connection, category_names)
+    genre_distribution, category_totals, cooccurrence = aggregates
+    cooccurrence.setflags(write=False)
+    return DatasetMetadata(
+        identity, category_names, genre_distribution, category_totals, cooccurrence
+    )
+
+
+def get_metadata(database_filename=DATABASE_FILENAME):
+    """
+    Return the metadata of the dataset. The values are cached and read again only when the
+    database file changes (path, modification time or size)
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+
+    Returns:
+        metadata (DatasetMetadata): metadata of the dataset
+    """
+    identity = database.get_file_identity(database_filename)
+    if identity is None:
+        raise FileNotFoundError("Database {} not found".format(database_filename))
+    metadata = _metadata_cache.get(identity[0])
+    if metadata is not None and metadata.identity == identity:
+        return metadata
+    with _metadata_lock:
+        metadata = _metadata_cache.get(identity[0])
+        if metadata is None or metadata.identity != identity:
+            metadata = _read_metadata(database_filename, identity)
+            _metadata_cache[identity[0]] = metadata
+    return metadata
+
+
+def refresh_metadata(database_filename=None):
+    """
+    Drop the cached metadata. The next call to get_metadata will read it again from the database
+
+    Args:
+        database_filename (str): database filename. Default value None (In case of None the
+            cache of every database will be dropped)
+
+    Returns:
+        None
+    """
+    with _metadata_lock:
+        if database_filename is None:
+            _metadata_cache.clear()
+        else:
+            _metadata_cache.pop(os.path.abspath(database_filename), None)
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Dataset Metadata")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename
+
+
+if __name__ == "__main__":
+    print("Dataset metadata")
+    database_filename = parse_input_arguments()
+    metadata = get_metadata(database_filename)
+    print("Categories: {}".format(metadata.category_names))
+    print("Genre distribution: {}".format(metadata.genre_distribution))
+    print("Category totals: {}".format(metadata.category_totals))
+    print("Category co-occurrence:\n{}".format(metadata.category_cooccurrence))
+else:
+    pass
@@ -0,0 +1,186 @@
+# Columnar training snapshot of the cleaned dataset (ids, messages and labels as numpy arrays)
+#
+# python -m src.data_preparation.snapshot --database_filename data/db.sqlite3 --snapshot_dirname data/training_snapshot
+
+
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from src.config import DATABASE_FILENAME, SNAPSHOT_DIRNAME, TABLE_NAME
+from src.data_preparation import database
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+MESSAGES_FILENAME = "message.bin"
+# Number of rows read from the database at once
+EXPORT_CHUNK_SIZE = 50000
+
+TrainingSnapshot = namedtuple("TrainingSnapshot", ["ids", "messages", "labels", "category_names"])
+
+
+def export_snapshot(
+    database_filename=DATABASE_FILENAME,
+    snapshot_dirname=SNAPSHOT_DIRNAME,
+    chunk_size=EXPORT_CHUNK_SIZE,
+):
+    """
+    Export TABLE_NAME in a directory of columnar files: id.npy (int64), label.npy (uint8 matrix of
+    rows x categories), the messages as a single UTF-8 blob with message_offset.npy (byte offsets,
+    rows + 1) and a json manifest. The rows are read in chunks and written straight to the files, so
+    the memory used does not depend on the size of the table. The snapshot is written in a temporary
+    directory and then moved in place
+
+    Args:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        snapshot_dirname (str): destination directory. Default value SNAPSHOT_DIRNAME
+        chunk_size (int): number of rows read at once. Default value EXPORT_CHUNK_SIZE
+
+    Returns:
+        n_rows (int): number of rows exported
+    """
+    category_names = database.get_category_column_names(database_filename)
+    temporary_dirname = snapshot_dirname.rstrip("/\\") + ".tmp"
+    shutil.rmtree(temporary_dirname, ignore_errors=True)
+    os.makedirs(temporary_dirname)
+    with database.connect(database_filename) as connection:
+        n_rows = connection.execute('SELECT COUNT(*) FROM "{}"'.format(TABLE_NAME)).fetchone()[0]
+        ids = np.lib.format.open_memmap(
+            os.path.join(temporary_dirname, "id.npy"), mode="w+", dtype=np.int64, shape=(n_rows,)
+        )
+        labels = np.lib.format.open_memmap(
+            os.path.join(temporary_dirname, "label.npy"),
+            mode="w+",
+            dtype=np.uint8,
+            shape=(n_rows, len(category_names)),
+        )
+        offsets = np.lib.format.open_memmap(
+            os.path.join(temporary_dirname, "message_offset.npy"),
+            mode="w+",
+            dtype=np.int64,
+            shape=(n_rows + 1,),
+        )
+        offsets[0] = 0
+        cursor = connection.execute(
+            'SELECT id, message, {} FROM "{}" ORDER BY rowid'.format(
+                ", ".join('"{}"'.format(name) for name in category_names), TABLE_NAME
+            )
+        )
+        start = 0
+        with open(os.path.join(temporary_dirname, MESSAGES_FILENAME), "wb") as f:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if len(rows) == 0:
+                    break
+                end = start + len(rows)
+                columns = list(zip(*rows, strict=True))
+                ids[start:end] = columns[0]
+                labels[start:end] = np.array(columns[2:], dtype=np.uint8).T
+                encoded = [(message or "").encode("utf-8") for message in columns[1]]
+                offsets[start + 1 : end + 1] = offsets[start] + np.cumsum(
+                    [len(message) for message in encoded]
+                )
+                f.write(b"".join(encoded))
+                start = end
+        del ids, labels, offsets
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "n_rows": n_rows,
+        "category_names": category_names,
+    }
+    with open(os.path.join(temporary_dirname, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(snapshot_dirname, ignore_errors=True)
+    os.replace(temporary_dirname, snapshot_dirname)
+    return n_rows
+
+
+def is_snapshot(dirname):
+    """
+    Return True if the directory contains a training snapshot
+
+    Args:
+        dirname (str): directory
+
+    Returns:
+        is_snapshot (bool): True if the directory contains a snapshot manifest
+    """
+    return os.path.isfile(os.path.join(dirname, MANIFEST_FILENAME))
+
+
+def load_snapshot(snapshot_dirname=SNAPSHOT_DIRNAME, mmap_mode="r"):
+    """
+    Load a training snapshot created with export_snapshot. The ids and the labels are memory-mapped
+
+    Args:
+        snapshot_dirname (str): snapshot directory. Default value SNAPSHOT_DIRNAME
+        mmap_mode (str): mode used by numpy.load. Default value "r" (In case of None the arrays are
+            read in memory)
+
+    Returns:
+        snapshot (TrainingSnapshot): ids, messages (list), labels and category names
+    """
+    with open(os.path.join(snapshot_dirname, MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)
+    if manifest["format_version"] != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            "Snapshot format {} is not supported, export it again".format(
+                manifest["format_version"]
+            )
+        )
+    ids = np.load(os.path.join(snapshot_dirname, "id.npy"), mmap_mode=mmap_mode)
+    labels = np.load(os.path.join(snapshot_dirname, "label.npy"), mmap_mode=mmap_mode)
+    offsets = np.load(os.path.join(snapshot_dirname, "message_offset.npy")).tolist()
+    with open(os.path.join(snapshot_dirname, MESSAGES_FILENAME), "rb") as f:
+        blob = f.read()
+    messages = [
+        blob[start:end].decode("utf-8")
+        for start, end in zip(offsets[:-1], offsets[1:], strict=True)
+    ]
+    return TrainingSnapshot(ids, messages, labels, manifest["category_names"])
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        snapshot_dirname (str): snapshot directory. Default value SNAPSHOT_DIRNAME
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Training Snapshot")
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data",
+    )
+    parser.add_argument(
+        "--snapshot_dirname",
+        type=str,
+        default=SNAPSHOT_DIRNAME,
+        help="Directory of the training snapshot",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.database_filename, args.snapshot_dirname
+
+
+if __name__ == "__main__":
+    print("Export the training snapshot")
+    database_filename, snapshot_dirname = parse_input_arguments()
+    start = time.perf_counter()
+    n_rows = export_snapshot(database_filename, snapshot_dirname)
+    print("Exported {} rows in {:.2f}s".format(n_rows, time.perf_counter() - start))
+    start = time.perf_counter()
+    training_snapshot = load_snapshot(snapshot_dirname)
+    print(
+        "Loaded {} rows in {:.2f}s".format(len(training_snapshot.ids), time.perf_counter() - start)
+    )
+else:
+    pass
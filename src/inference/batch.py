@@ -0,0 +1,359 @@
+# Classify large message files in fixed-size chunks
+#
+# python -m src.inference.batch --input_filename data/disaster_messages.csv --output_filename data/predictions.csv
+
+
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config import DATABASE_FILENAME, MODEL_PICKLE_FILENAME, PREDICTION_TABLE_NAME
+from src.data_preparation import metadata
+
+DEFAULT_CHUNK_SIZE = 10000
+INPUT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl"}
+OUTPUT_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".sqlite3": "sqlite",
+    ".sqlite": "sqlite",
+    ".db": "sqlite",
+}
+
+
+def _get_format(filename, formats):
+    """
+    Return the file format from the filename extension
+
+    Args:
+        filename (str): filename
+        formats (dict): dictionary of the supported formats (extension, format)
+
+    Returns:
+        file_format (str): file format
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in formats:
+        raise ValueError(
+            "Unsupported file extension {} for {}. Supported: {}".format(
+                extension, filename, ", ".join(formats)
+            )
+        )
+    return formats[extension]
+
+
+def read_messages(input_filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read the input file in chunks of at most chunk_size rows
+
+    Args:
+        input_filename (str): CSV or JSONL input filename
+        chunk_size (int): number of rows of each chunk. Default value DEFAULT_CHUNK_SIZE
+
+    Returns:
+        chunks (iterator): iterator of pandas.DataFrame
+    """
+    input_format = _get_format(input_filename, INPUT_FORMATS)
+    if input_format == "csv":
+        reader = pd.read_csv(input_filename, chunksize=chunk_size)
+    else:
+        reader = pd.read_json(input_filename, lines=True, chunksize=chunk_size)
+    with reader:
+        yield from reader
+
+
+def _get_parquet_schema(pa, table):
+    """
+    Return the schema of every chunk of a Parquet output, fixed from the first chunk. The types that
+    a later chunk could infer differently are fixed: a column without values (null type) is written
+    as string, the id as int64 also when missing values made it floating point
+
+    Args:
+        pa (module): pyarrow module
+        table (pyarrow.Table): first chunk of predictions
+
+    Returns:
+        schema (pyarrow.Schema): schema of the output file
+    """
+    fields = []
+    for field in table.schema:
+        if field.name == "id" and (
+            pa.types.is_null(field.type) or pa.types.is_floating(field.type)
+        ):
+            field = pa.field(field.name, pa.int64())
+        elif pa.types.is_null(field.type):
+            field = pa.field(field.name, pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _conform_to_schema(pa, df, schema):
+    """
+    Return the chunk with the id and string columns converted to the types of the schema, whatever
+    types pandas inferred for them (e.g. floating point ids or a message column without values)
+
+    Args:
+        pa (module): pyarrow module
+        df (pandas.DataFrame): chunk of predictions
+        schema (pyarrow.Schema): schema of the output file
+
+    Returns:
+        df (pandas.DataFrame): converted chunk
+    """
+    df = df.copy(deep=False)
+    for field in schema:
+        column = df[field.name]
+        if field.name == "id" and pa.types.is_integer(field.type):
+            df[field.name] = pd.to_numeric(column).astype("Int64")
+        elif pa.types.is_string(field.type):
+            df[field.name] = pd.Series(
+                [None if pd.isna(value) else str(value) for value in column],
+                index=df.index,
+                dtype=object,
+            )
+    return df
+
+
+class PredictionWriter:
+    """
+    Append chunks of predictions to a CSV, Parquet or SQLite output file
+    """
+
+    def __init__(self, output_filename, table_name=PREDICTION_TABLE_NAME):
+        """
+        Args:
+            output_filename (str): output filename. The format is given by the extension
+            table_name (str): destination table name for SQLite output. Default value PREDICTION_TABLE_NAME
+        """
+        self.output_filename = output_filename
+        self.output_format = _get_format(output_filename, OUTPUT_FORMATS)
+        self.table_name = table_name
+        self._writer = None
+        self._schema = None
+        self._n_chunks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, df):
+        """
+        Append a chunk of predictions
+
+        Args:
+            df (pandas.DataFrame): chunk of predictions
+
+        Returns:
+            None
+        """
+        if self.output_format == "csv":
+            df.to_csv(
+                self.output_filename,
+                mode="w" if self._n_chunks == 0 else "a",
+                header=self._n_chunks == 0,
+                index=False,
+            )
+        elif self.output_format == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Parquet output requires the pyarrow package") from e
+            if self._schema is None:
+                self._schema = _get_parquet_schema(
+                    pa, pa.Table.from_pandas(df, preserve_index=False)
+                )
+            # Every chunk is converted to the schema of the file, whatever types its values infer
+            table = pa.Table.from_pandas(
+                _conform_to_schema(pa, df, self._schema), schema=self._schema, preserve_index=False
+            )
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.output_filename, self._schema)
+            self._writer.write_table(table)
+        else:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.output_filename)
+            with self._writer:
+                df.to_sql(
+                    self.table_name,
+                    self._writer,
+                    index=False,
+                    if_exists="replace" if self._n_chunks == 0 else "append",
+                )
+        self._n_chunks += 1
+
+    def close(self):
+        """
+        Close the output file
+
+        Returns:
+            None
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def predict_chunk(
+    model,
+    chunk,
+    category_names,
+    message_column="message",
+    prediction_cache=None,
+    model_version=None,
+):
+    """
+    Classify a chunk of messages with a single call to model.predict
+
+    Args:
+        model (pipeline.Pipeline): model used to classify the messages
+        chunk (pandas.DataFrame): chunk of the input file
+        category_names (list): list of the category names
+        message_column (str): name of the column containing the messages. Default value "message"
+        prediction_cache (cache.PredictionCache): cache of the predictions. Default value None (In case of None every message is classified)
+        model_version (str): version of the model used by the cache. Default value None
+
+    Returns:
+        predictions (pandas.DataFrame): id (if present) and message columns followed by a column for each category
+    """
+    messages = chunk[message_column].fillna("").astype(str)
+    if prediction_cache is None:
+        category_predicted = model.predict(messages.tolist())
+    else:
+        category_predicted = prediction_cache.predict(model, messages.tolist(), model_version)
+    category_predicted = np.asarray(category_predicted, dtype=np.uint8).reshape(
+        len(messages), len(category_names)
+    )
+    predictions = pd.DataFrame(category_predicted, columns=category_names, index=chunk.index)
+    key_columns = [column for column in ("id", message_column) if column in chunk.columns]
+    return pd.concat([chunk[key_columns], predictions], axis=1)
+
+
+def predict_file(
+    model,
+    input_filename,
+    output_filename,
+    category_names,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    message_column="message",
+    prediction_cache=None,
+    model_version=None,
+):
+    """
+    Classify all the messages of the input file and write the predictions to the output file.
+    Only one chunk at a time is kept in memory
+
+    Args:
+        model (pipeline.Pipeline): model used to classify the messages
+        input_filename (str): CSV or JSONL input filename
+        output_filename (str): CSV, Parquet or SQLite output filename
+        category_names (list): list of the category names
+        chunk_size (int): number of messages classified with each call to model.predict. Default value DEFAULT_CHUNK_SIZE
+        message_column (str): name of the column containing the messages. Default value "message"
+        prediction_cache (cache.PredictionCache): cache of the predictions. Default value None (In case of None every message is classified)
+        model_version (str): version of the model used by the cache. Default value None
+
+    Returns:
+        n_rows (int): number of messages classified
+    """
+    n_rows = 0
+    start = time.perf_counter()
+    with PredictionWriter(output_filename) as writer:
+        for chunk in read_messages(input_filename, chunk_size):
+            writer.write(
+                predict_chunk(
+                    model, chunk, category_names, message_column, prediction_cache, model_version
+                )
+            )
+            n_rows += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(
+                "    Classified {} messages ({:.1f} rows/s)".format(
+                    n_rows, n_rows / elapsed if elapsed > 0 else 0.0
+                )
+            )
+    elapsed = time.perf_counter() - start
+    if prediction_cache is not None:
+        print("Prediction cache: {}".format(prediction_cache.get_stats()))
+    print(
+        "Classified {} messages in {:.1f}s ({:.1f} rows/s)".format(
+            n_rows, elapsed, n_rows / elapsed if elapsed > 0 else 0.0
+        )
+    )
+    return n_rows
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        input_filename (str): CSV or JSONL input filename
+        output_filename (str): CSV, Parquet or SQLite output filename
+        chunk_size (int): number of messages classified with each call to model.predict
+        database_filename (str): database filename. Default value DATABASE_FILENAME
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Batch Prediction")
+    parser.add_argument(
+        "--input_filename", type=str, required=True, help="CSV or JSONL file of messages"
+    )
+    parser.add_argument(
+        "--output_filename",
+        type=str,
+        required=True,
+        help="CSV, Parquet or SQLite file of the predictions",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Number of messages classified at once",
+    )
+    parser.add_argument(
+        "--database_filename",
+        type=str,
+        default=DATABASE_FILENAME,
+        help="Database filename of the cleaned data",
+    )
+    parser.add_argument(
+        "--model_pickle_filename",
+        type=str,
+        default=MODEL_PICKLE_FILENAME,
+        help="Pickle filename of the model",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return (
+        args.input_filename,
+        args.output_filename,
+        args.chunk_size,
+        args.database_filename,
+        args.model_pickle_filename,
+    )
+
+
+if __name__ == "__main__":
+    import disaster_response_pipeline
+
+    print("Classify large message files in fixed-size chunks")
+    (
+        input_filename,
+        output_filename,
+        chunk_size,
+        database_filename,
+        model_pickle_filename,
+    ) = parse_input_arguments()
+    model = disaster_response_pipeline.load_pipeline(
+        database_filename=database_filename, model_pickle_filename=model_pickle_filename
+    )
+    category_names = metadata.get_metadata(database_filename).category_names
+    predict_file(model, input_filename, output_filename, category_names, chunk_size)
+else:
+    pass
@@ -0,0 +1,241 @@
+# Cache of the predictions of repeated and near-duplicate messages
+#
+# python -m src.inference.cache --message "Storm at sacred heart of Jesus"
+
+
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.classifier import tokenizer
+from src.config import DEFAULT_TEST_MESSAGE, MODEL_PICKLE_FILENAME
+from src.data_preparation import database
+
+DEFAULT_CACHE_SIZE = 100000
+DEFAULT_TTL = None
+
+
+def get_preprocessor(model):
+    """
+    Return the preprocessing the vectorizer of the model applies to a message before tokenizing it
+    (e.g. the lowercasing of CountVectorizer), so that the cache keys follow the model
+
+    Args:
+        model: model with a predict method (pipeline.Pipeline, search with a best_estimator_, bundle.BundleModel or a wrapper with a model attribute)
+
+    Returns:
+        preprocessor (callable): preprocessor of the vectorizer or None if the model has no known vectorizer
+    """
+    model = getattr(model, "model", model)
+    model = getattr(model, "best_estimator_", model)
+    if hasattr(model, "build_preprocessor"):
+        return model.build_preprocessor()
+    vectorizer = getattr(model, "named_steps", {}).get("vect")
+    if vectorizer is None or not hasattr(vectorizer, "build_preprocessor"):
+        return None
+    return vectorizer.build_preprocessor()
+
+
+def normalize_message(message, preprocessor=None):
+    """
+    Return the normalized form of the message used as cache key: preprocessed as the vectorizer of
+    the model does before calling my_tokenizer, urls replaced with the placeholder of my_tokenizer
+    and whitespace collapsed. Messages with the same normalized form get the same tokens
+
+    Args:
+        message (str): message
+        preprocessor (callable): preprocessor of the vectorizer of the model (see get_preprocessor). Default value None (In case of None the message is not preprocessed)
+
+    Returns:
+        normalized_message (str): normalized message
+    """
+    if preprocessor is not None:
+        message = preprocessor(message)
+    return " ".join(tokenizer.replace_urls(message).split())
+
+
+def get_model_version(model_pickle_filename=MODEL_PICKLE_FILENAME):
+    """
+    Return an identifier of the model artifact that changes every time the file is rewritten
+
+    Args:
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+
+    Returns:
+        model_version (str): version identifier or None if the file does not exist
+    """
+    identity = database.get_file_identity(model_pickle_filename)
+    if identity is None:
+        return None
+    return "{:x}-{:x}".format(identity[1], identity[2])
+
+
+class PredictionCache:
+    """
+    Thread safe LRU cache, with optional TTL, of the predictions keyed on the normalized message.
+    All the entries are dropped when the model version changes
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_TTL):
+        """
+        Args:
+            maxsize (int): maximum number of cached predictions. Default value DEFAULT_CACHE_SIZE
+            ttl (float): seconds a prediction stays valid. Default value DEFAULT_TTL (In case of None predictions do not expire)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """
+        Drop all the cached predictions
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _check_model_version(self, model_version):
+        """
+        Drop all the cached predictions if the model version changed. Must hold the lock
+
+        Args:
+            model_version (str): current model version
+
+        Returns:
+            None
+        """
+        if model_version != self.model_version:
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, message, model_version=None, preprocessor=None):
+        """
+        Return the cached prediction of the message
+
+        Args:
+            message (str): message
+            model_version (str): current model version. Default value None
+            preprocessor (callable): preprocessor of the model (see get_preprocessor). Default value None
+
+        Returns:
+            category_predicted (numpy.ndarray): cached prediction or None
+        """
+        key = normalize_message(message, preprocessor)
+        with self._lock:
+            self._check_model_version(model_version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() > entry[1]:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, message, category_predicted, model_version=None, preprocessor=None):
+        """
+        Store the prediction of the message
+
+        Args:
+            message (str): message
+            category_predicted (numpy.ndarray): prediction of the message
+            model_version (str): version of the model that made the prediction. Default value None
+            preprocessor (callable): preprocessor of the model (see get_preprocessor). Default value None
+
+        Returns:
+            None
+        """
+        key = normalize_message(message, preprocessor)
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._check_model_version(model_version)
+            self._entries[key] = (category_predicted, expiry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def predict(self, model, messages, model_version=None):
+        """
+        Return the predictions of the messages calling model.predict only once for the messages not in the cache
+
+        Args:
+            model (pipeline.Pipeline): model used to classify the messages
+            messages (list): list of messages
+            model_version (str): current model version. Default value None
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        """
+        messages = list(messages)
+        preprocessor = get_preprocessor(model)
+        rows = [self.get(message, model_version, preprocessor) for message in messages]
+        missing = {}
+        for i, row in enumerate(rows):
+            if row is None:
+                missing.setdefault(normalize_message(messages[i], preprocessor), []).append(i)
+        if len(missing) > 0:
+            new_rows = model.predict([messages[indexes[0]] for indexes in missing.values()])
+            for indexes, row in zip(missing.values(), new_rows, strict=True):
+                self.put(messages[indexes[0]], row, model_version, preprocessor)
+                for i in indexes:
+                    rows[i] = row
+        if len(rows) == 0:
+            return np.zeros((0, 0), dtype=np.int64)
+        return np.vstack(rows)
+
+    def get_stats(self):
+        """
+        Return the statistics of the cache
+
+        Returns:
+            stats (dict): hits, misses, hit rate, size and model version
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+                "size": len(self._entries),
+                "model_version": self.model_version,
+            }
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        message (str): message to be normalized
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Prediction Cache")
+    parser.add_argument(
+        "--message", type=str, default=DEFAULT_TEST_MESSAGE, help="Message to normalize"
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.message
+
+
+if __name__ == "__main__":
+    print("Cache of the predictions of repeated and near-duplicate messages")
+    message = parse_input_arguments()
+    print(
+        "Message: {}\nCache key: {}".format(
+            message, normalize_message(message, tokenizer.preprocess)
+        )
+    )
+    print("Model version: {}".format(get_model_version()))
+else:
+    pass
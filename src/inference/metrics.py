@@ -0,0 +1,485 @@
+# Latency and throughput counters of the inference path
+#
+# python -m src.inference.metrics
+
+
+import bisect
+import copy
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Number of most recent latencies used to compute the percentiles
+LATENCY_WINDOW = 10000
+# Stages of a prediction timed by predict_with_stages
+INFERENCE_STAGES = ["tokenize", "vectorize", "classify"]
+# Upper bounds of the histogram buckets (Prometheus le labels)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024)
+METRIC_PREFIX = "disaster_response"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LatencyRecorder:
+    """
+    Thread safe recorder of latencies and counters. Percentiles are computed on the most recent
+    LATENCY_WINDOW latencies, throughput since the creation (or the last reset)
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        """
+        Args:
+            window (int): number of most recent latencies kept. Default value LATENCY_WINDOW
+        """
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Reset latencies and counters
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._latencies.clear()
+            self._start = time.perf_counter()
+            self.count = 0
+            self.items = 0
+
+    def record(self, seconds, items=1):
+        """
+        Record the latency of an event
+
+        Args:
+            seconds (float): latency in seconds
+            items (int): number of items (e.g. messages) processed by the event. Default value 1
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._latencies.append(seconds)
+            self.count += 1
+            self.items += items
+
+    def get_stats(self):
+        """
+        Return the statistics of the recorded events
+
+        Returns:
+            stats (dict): count, items, throughput (events/s), items throughput (items/s), mean, p50 and p99 latency (ms)
+        """
+        with self._lock:
+            latencies = np.array(self._latencies, dtype=np.float64) * 1000
+            elapsed = time.perf_counter() - self._start
+            count, items = self.count, self.items
+        stats = {
+            "count": count,
+            "items": items,
+            "throughput": count / elapsed if elapsed > 0 else 0.0,
+            "items_throughput": items / elapsed if elapsed > 0 else 0.0,
+            "mean_ms": None,
+            "p50_ms": None,
+            "p99_ms": None,
+        }
+        if len(latencies) > 0:
+            stats["mean_ms"] = float(latencies.mean())
+            stats["p50_ms"], stats["p99_ms"] = (
+                float(value) for value in np.percentile(latencies, [50, 99])
+            )
+        return stats
+
+
+class Histogram:
+    """
+    Thread safe histogram with fixed buckets, as a Prometheus histogram
+    """
+
+    def __init__(self, buckets):
+        """
+        Args:
+            buckets (tuple): increasing upper bounds of the buckets
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the counts
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Count a value
+
+        Args:
+            value (float): observed value
+
+        Returns:
+            None
+        """
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def to_prometheus(self, name, labels=None):
+        """
+        Return the lines of the histogram in the Prometheus text format (without HELP and TYPE)
+
+        Args:
+            name (str): metric name
+            labels (dict): labels of the series. Default value None
+
+        Returns:
+            lines (list): list of lines (cumulative buckets, sum and count)
+        """
+        with self._lock:
+            counts, count, total = list(self._counts), self.count, self.sum
+        labels = dict(labels or {})
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts, strict=True):
+            cumulative += bucket_count
+            lines.append(
+                "{}_bucket{} {}".format(name, _format_labels({**labels, "le": bound}), cumulative)
+            )
+        lines.append("{}_sum{} {}".format(name, _format_labels(labels), total))
+        lines.append("{}_count{} {}".format(name, _format_labels(labels), count))
+        return lines
+
+
+def _format_labels(labels):
+    """
+    Return the labels of a Prometheus series
+
+    Args:
+        labels (dict): labels (name, value)
+
+    Returns:
+        labels (str): labels between braces, empty string without labels
+    """
+    if len(labels) == 0:
+        return ""
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(
+                name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            )
+            for name, value in labels.items()
+        )
+    )
+
+
+def _analyzed(doc):
+    """
+    Analyzer of the documents already analyzed: returns the terms unchanged
+
+    Args:
+        doc (list): terms of a message
+
+    Returns:
+        terms (list): the same terms
+    """
+    return doc
+
+
+def _get_stages(model):
+    """
+    Return the analyze, vectorize and classify functions of a model, to time them separately. The
+    messages are analyzed (preprocessed, tokenized and split in n-grams) by the analyzer of the
+    vectorizer and the terms of the request are passed to the vectorizer, without using the
+    pre-tokenized texts of the tokenizer shared by the process
+
+    Args:
+        model: model with a predict method (pipeline.Pipeline, search with a best_estimator_ or bundle.BundleModel)
+
+    Returns:
+        analyze (callable): function from a message to its terms, None if the model can not be split
+        vectorize (callable): function from the terms of the messages to the features, None if the model can not be split
+        classify (callable): function from the features to the categories, model.predict if the model can not be split
+    """
+    if hasattr(model, "build_analyzer") and hasattr(model, "predict_features"):
+        return (
+            model.build_analyzer(),
+            lambda docs: model.transform(docs, analyzer=_analyzed),
+            model.predict_features,
+        )
+    pipeline = getattr(model, "best_estimator_", model)
+    steps = getattr(pipeline, "steps", None)
+    if steps is None or len(steps) < 2 or not hasattr(steps[0][1], "build_analyzer"):
+        return None, None, model.predict
+    # A shallow copy shares the fitted vocabulary: the served vectorizer is not modified
+    vectorizer = copy.copy(steps[0][1])
+    vectorizer.analyzer = _analyzed
+
+    def vectorize(docs):
+        X = vectorizer.transform(docs)
+        for _, transformer in steps[1:-1]:
+            X = transformer.transform(X)
+        return X
+
+    return steps[0][1].build_analyzer(), vectorize, steps[-1][1].predict
+
+
+def predict_with_stages(model, messages):
+    """
+    Return the predictions of the messages and the seconds spent in each stage: the messages are
+    tokenized first by the analyzer of the vectorizer, then their terms are vectorized and
+    classified. A model that is not a pipeline (or bundle) is timed as a whole in the classify stage
+
+    Args:
+        model: model used to classify the messages
+        messages (list): list of messages
+
+    Returns:
+        category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        stage_seconds (dict): seconds of each of INFERENCE_STAGES (None if the stage was not timed)
+    """
+    stage_seconds = dict.fromkeys(INFERENCE_STAGES)
+    analyze, vectorize, classify = _get_stages(model)
+    messages = list(messages)
+    if vectorize is None:
+        start = time.perf_counter()
+        category_predicted = classify(messages)
+        stage_seconds["classify"] = time.perf_counter() - start
+        return category_predicted, stage_seconds
+    start = time.perf_counter()
+    docs = [analyze(message) for message in messages]
+    stage_seconds["tokenize"] = time.perf_counter() - start
+    start = time.perf_counter()
+    X = vectorize(docs)
+    stage_seconds["vectorize"] = time.perf_counter() - start
+    start = time.perf_counter()
+    category_predicted = classify(X)
+    stage_seconds["classify"] = time.perf_counter() - start
+    return category_predicted, stage_seconds
+
+
+class InferenceMetrics:
+    """
+    Metrics of the prediction path: requests, messages, latency of the requests and of each stage
+    of the model (see predict_with_stages), batch sizes and, when rendered, the prediction cache.
+    Percentiles are returned by get_stats, histograms by to_prometheus
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        """
+        Args:
+            window (int): number of most recent latencies kept for the percentiles. Default value LATENCY_WINDOW
+        """
+        self.request_latency = LatencyRecorder(window)
+        self.stage_latency = {stage: LatencyRecorder(window) for stage in INFERENCE_STAGES}
+        self.request_histogram = Histogram(LATENCY_BUCKETS)
+        self.stage_histograms = {stage: Histogram(LATENCY_BUCKETS) for stage in INFERENCE_STAGES}
+        self.batch_size_histogram = Histogram(BATCH_SIZE_BUCKETS)
+
+    def reset(self):
+        """
+        Reset all the metrics
+
+        Returns:
+            None
+        """
+        self.request_latency.reset()
+        self.request_histogram.reset()
+        self.batch_size_histogram.reset()
+        for stage in INFERENCE_STAGES:
+            self.stage_latency[stage].reset()
+            self.stage_histograms[stage].reset()
+
+    def record_request(self, seconds, n_messages=1):
+        """
+        Record a classification request, cached predictions included
+
+        Args:
+            seconds (float): latency of the request
+            n_messages (int): number of messages of the request. Default value 1
+
+        Returns:
+            None
+        """
+        self.request_latency.record(seconds, n_messages)
+        self.request_histogram.observe(seconds)
+
+    def record_batch(self, stage_seconds, batch_size):
+        """
+        Record a call of the model
+
+        Args:
+            stage_seconds (dict): seconds of each stage, as returned by predict_with_stages
+            batch_size (int): number of messages classified by the model
+
+        Returns:
+            None
+        """
+        self.batch_size_histogram.observe(batch_size)
+        for stage, seconds in stage_seconds.items():
+            if seconds is not None:
+                self.stage_latency[stage].record(seconds, batch_size)
+                self.stage_histograms[stage].observe(seconds)
+
+    def predict(self, model, messages):
+        """
+        Classify the messages with model recording the stage latencies and the batch size
+
+        Args:
+            model: model used to classify the messages
+            messages (list): list of messages
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        """
+        messages = list(messages)
+        category_predicted, stage_seconds = predict_with_stages(model, messages)
+        self.record_batch(stage_seconds, len(messages))
+        return category_predicted
+
+    def get_stats(self, prediction_cache=None):
+        """
+        Return the statistics of the prediction path
+
+        Args:
+            prediction_cache (cache.PredictionCache): cache whose statistics are included. Default value None
+
+        Returns:
+            stats (dict): requests and stages statistics (see LatencyRecorder.get_stats), batches and prediction cache
+        """
+        stats = {
+            "requests": self.request_latency.get_stats(),
+            "stages": {stage: self.stage_latency[stage].get_stats() for stage in INFERENCE_STAGES},
+            "batches": {
+                "count": self.batch_size_histogram.count,
+                "messages": int(self.batch_size_histogram.sum),
+            },
+        }
+        if prediction_cache is not None:
+            stats["prediction_cache"] = prediction_cache.get_stats()
+        return stats
+
+    def to_prometheus(self, prediction_cache=None, model_version=None):
+        """
+        Return the metrics in the Prometheus text exposition format
+
+        Args:
+            prediction_cache (cache.PredictionCache): cache whose hits and misses are included. Default value None
+            model_version (str): version of the served model, exposed as a label of model_info. Default value None
+
+        Returns:
+            text (str): metrics in the Prometheus text format
+        """
+        lines = []
+
+        def add(name, metric_type, description, samples):
+            name = "{}_{}".format(METRIC_PREFIX, name)
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            lines.extend(samples(name))
+
+        add(
+            "requests_total",
+            "counter",
+            "Classification requests",
+            lambda name: ["{} {}".format(name, self.request_latency.count)],
+        )
+        add(
+            "messages_total",
+            "counter",
+            "Messages of the classification requests",
+            lambda name: ["{} {}".format(name, self.request_latency.items)],
+        )
+        add(
+            "request_seconds",
+            "histogram",
+            "Latency of the classification requests",
+            self.request_histogram.to_prometheus,
+        )
+        add(
+            "stage_seconds",
+            "histogram",
+            "Latency of the stages of the model calls",
+            lambda name: [
+                line
+                for stage in INFERENCE_STAGES
+                for line in self.stage_histograms[stage].to_prometheus(name, {"stage": stage})
+            ],
+        )
+        add(
+            "batch_size",
+            "histogram",
+            "Messages classified by each model call",
+            self.batch_size_histogram.to_prometheus,
+        )
+        if prediction_cache is not None:
+            cache_stats = prediction_cache.get_stats()
+            add(
+                "prediction_cache_hits_total",
+                "counter",
+                "Predictions served from the cache",
+                lambda name: ["{} {}".format(name, cache_stats["hits"])],
+            )
+            add(
+                "prediction_cache_misses_total",
+                "counter",
+                "Predictions not found in the cache",
+                lambda name: ["{} {}".format(name, cache_stats["misses"])],
+            )
+        if model_version is not None:
+            add(
+                "model_info",
+                "gauge",
+                "Version of the served model",
+                lambda name: ["{}{} 1".format(name, _format_labels({"version": model_version}))],
+            )
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedModel:
+    """
+    Model wrapper recording the stages of every call to predict in an InferenceMetrics, e.g. for
+    cache.PredictionCache.predict that calls the model only for the messages not in the cache
+    """
+
+    def __init__(self, model, inference_metrics):
+        """
+        Args:
+            model: model used to classify the messages
+            inference_metrics (InferenceMetrics): metrics recording the calls
+        """
+        self.model = model
+        self.inference_metrics = inference_metrics
+
+    def predict(self, messages):
+        """
+        Return the categories of the messages
+
+        Args:
+            messages (list): list of messages
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        """
+        return self.inference_metrics.predict(self.model, messages)
+
+
+if __name__ == "__main__":
+    print("Latency and throughput counters")
+    recorder = LatencyRecorder()
+    for i in range(100):
+        recorder.record(i / 1000)
+    print(recorder.get_stats())
+else:
+    pass
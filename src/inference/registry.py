@@ -0,0 +1,259 @@
+# Registry of the served model, reloaded in the background when the model artifact changes
+#
+# python -m src.inference.registry --model_pickle_filename data/trained_classifier.pkl --poll_interval 2
+
+
+import argparse
+import collections
+import pickle
+import threading
+import time
+
+from src.config import DEFAULT_TEST_MESSAGE, MODEL_PICKLE_FILENAME
+from src.inference import cache
+
+# Seconds between two checks of the model artifact
+DEFAULT_POLL_INTERVAL = 5.0
+
+# Errors of an artifact that can not be served: unreadable, truncated or corrupted pickle file, or
+# smoke prediction with the wrong shape. Any other error is a bug and is raised
+LOAD_ERRORS = (OSError, EOFError, pickle.UnpicklingError, ValueError)
+
+# Model served together with the version of the artifact it was loaded from
+ModelVersion = collections.namedtuple("ModelVersion", ["model", "version"])
+
+
+class ModelRegistry:
+    """
+    Hold the served model and replace it when the model artifact is rewritten. The new version is
+    loaded and validated with a smoke prediction in a background thread, then swapped in with a
+    single assignment: callers take the current ModelVersion with get() and keep using it until
+    they finish, so in-flight predictions complete on the old model and none waits for the load
+    """
+
+    def __init__(
+        self,
+        model_pickle_filename=MODEL_PICKLE_FILENAME,
+        loader=None,
+        smoke_messages=(DEFAULT_TEST_MESSAGE,),
+        poll_interval=DEFAULT_POLL_INTERVAL,
+    ):
+        """
+        Args:
+            model_pickle_filename (str): pickle filename of the model artifact. Default value MODEL_PICKLE_FILENAME
+            loader (callable): function returning the model from the pickle filename. Default value None (In case of None train.load_model will be used)
+            smoke_messages (tuple): messages classified to validate a new version before swapping it in. Default value (DEFAULT_TEST_MESSAGE,)
+            poll_interval (float): seconds between two checks of the artifact. Default value DEFAULT_POLL_INTERVAL
+        """
+        self.model_pickle_filename = model_pickle_filename
+        if loader is None:
+            # Imported here so that the services importing the registry do not load sklearn until needed
+            from src.classifier import train
+
+            loader = train.load_model
+        self.loader = loader
+        self.smoke_messages = list(smoke_messages)
+        self.poll_interval = poll_interval
+        self.n_reloads = 0
+        self.last_error = None
+        self._current = None
+        self._failed_version = None
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def get(self):
+        """
+        Return the current model and its version
+
+        Returns:
+            model_version (ModelVersion): current model and version, None if no model was loaded
+        """
+        return self._current
+
+    def _load_version(self, version):
+        """
+        Load the artifact and validate it with a smoke prediction
+
+        Args:
+            version (str): version of the artifact being loaded
+
+        Returns:
+            model_version (ModelVersion): loaded model and version
+        """
+        model = self.loader(self.model_pickle_filename)
+        Y_pred = model.predict(self.smoke_messages)
+        if getattr(Y_pred, "ndim", 0) != 2 or Y_pred.shape[0] != len(self.smoke_messages):
+            raise ValueError(
+                "Smoke prediction returned shape {}".format(getattr(Y_pred, "shape", None))
+            )
+        return ModelVersion(model, version)
+
+    def reload(self, force=False):
+        """
+        Load the artifact if its version differs from the current one and swap it in once validated.
+        A version failing to load or validate is not retried until the artifact changes again. While
+        the artifact does not exist (e.g. the first training is still running) nothing is loaded
+
+        Args:
+            force (bool): if True load the artifact even if its version did not change. Default value False
+
+        Returns:
+            reloaded (bool): True if a new version was swapped in
+        """
+        with self._reload_lock:
+            # The version is read before loading: if the artifact is replaced during the load the
+            # next check sees a different version and loads it again
+            version = cache.get_model_version(self.model_pickle_filename)
+            current = self._current
+            if version is None:
+                return False
+            if force is False and (
+                (current is not None and version == current.version)
+                or version == self._failed_version
+            ):
+                return False
+            start = time.perf_counter()
+            try:
+                new_current = self._load_version(version)
+            except LOAD_ERRORS as e:
+                error = "{}: {}".format(type(e).__name__, e)
+                if error != self.last_error:
+                    print("Model version {} rejected: {}".format(version, error))
+                self._failed_version = version
+                self.last_error = error
+                return False
+            self._current = new_current
+            self._failed_version = None
+            self.last_error = None
+            self.n_reloads += 1
+            print(
+                "Model version {} loaded in {:.2f} s (previous: {})".format(
+                    version,
+                    time.perf_counter() - start,
+                    None if current is None else current.version,
+                )
+            )
+            return True
+
+    def _watch(self):
+        """
+        Check the artifact every poll_interval seconds until stopped
+
+        Returns:
+            None
+        """
+        while not self._stop_event.wait(self.poll_interval):
+            self.reload()
+
+    def start(self):
+        """
+        Start the background thread watching the artifact
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread
+
+        Returns:
+            None
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def get_stats(self):
+        """
+        Return the status of the registry
+
+        Returns:
+            stats (dict): current version, number of reloads and last load error
+        """
+        current = self._current
+        return {
+            "model_version": None if current is None else current.version,
+            "reloads": self.n_reloads,
+            "last_error": self.last_error,
+        }
+
+
+def get_readiness(model_registry, training_process=None):
+    """
+    Return the readiness of a server using the registry, for its readiness endpoint
+
+    Args:
+        model_registry (ModelRegistry): registry of the served model
+        training_process (multiprocessing.Process): process training the first model. Default value None
+
+    Returns:
+        ready (bool): True if a model is loaded and requests can be classified
+        status (dict): status (ready, warming or failed), model version and last load error
+    """
+    stats = model_registry.get_stats()
+    if stats["model_version"] is not None:
+        status = "ready"
+    elif (
+        training_process is not None
+        and not training_process.is_alive()
+        and training_process.exitcode != 0
+    ):
+        status = "failed"
+    else:
+        status = "warming"
+    return status == "ready", {
+        "status": status,
+        "model_version": stats["model_version"],
+        "last_error": stats["last_error"],
+    }
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        model_pickle_filename (str): pickle filename. Default value MODEL_PICKLE_FILENAME
+        poll_interval (float): seconds between two checks of the artifact. Default value DEFAULT_POLL_INTERVAL
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Model Registry")
+    parser.add_argument(
+        "--model_pickle_filename",
+        type=str,
+        default=MODEL_PICKLE_FILENAME,
+        help="Pickle filename of the model artifact",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="Seconds between two checks of the model artifact",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.model_pickle_filename, args.poll_interval
+
+
+if __name__ == "__main__":
+    print("Registry of the served model")
+    model_pickle_filename, poll_interval = parse_input_arguments()
+    registry = ModelRegistry(model_pickle_filename, poll_interval=poll_interval)
+    registry.reload()
+    registry.start()
+    try:
+        while True:
+            time.sleep(poll_interval)
+            print(registry.get_stats())
+    except KeyboardInterrupt:
+        registry.stop()
+else:
+    pass
@@ -0,0 +1,547 @@
+# Asynchronous HTTP inference service with micro-batching
+#
+# python -m src.inference.service --port 8000 --max_batch_size 64 --max_wait_ms 5 --concurrency 2
+
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.inference.cache import DEFAULT_CACHE_SIZE, PredictionCache, get_preprocessor
+from src.inference.metrics import PROMETHEUS_CONTENT_TYPE, InferenceMetrics, LatencyRecorder
+from src.inference.registry import ModelRegistry, get_readiness
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_CONCURRENCY = 1
+MAX_BODY_SIZE = 2**20
+
+logger = logging.getLogger(__name__)
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class MicroBatcher:
+    """
+    Gather the messages of concurrent requests in micro-batches and classify each micro-batch with a
+    single call to predict. A batch is closed when it reaches max_batch_size messages or when its
+    first message has waited max_wait_ms. At most concurrency batches are classified at the same time
+    """
+
+    def __init__(
+        self,
+        predict,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms=DEFAULT_MAX_WAIT_MS,
+        concurrency=DEFAULT_CONCURRENCY,
+    ):
+        """
+        Args:
+            predict (callable): function classifying a list of messages, e.g. model.predict
+            max_batch_size (int): maximum number of messages of a batch. Default value DEFAULT_MAX_BATCH_SIZE
+            max_wait_ms (float): maximum wait of the first message of a batch. Default value DEFAULT_MAX_WAIT_MS
+            concurrency (int): number of batches classified at the same time. Default value DEFAULT_CONCURRENCY
+        """
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.concurrency = concurrency
+        self.batch_latency = LatencyRecorder()
+        self._queue = None
+        self._semaphore = None
+        self._executor = None
+        self._task = None
+        self._batch_tasks = set()
+
+    async def start(self):
+        """
+        Start gathering the messages in batches. Must be called from the running event loop
+
+        Returns:
+            None
+        """
+        self._queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self._task = asyncio.create_task(self._gather_batches())
+
+    async def stop(self):
+        """
+        Stop gathering the messages and wait for the batches being classified
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def classify(self, message):
+        """
+        Return the prediction of a message once the batch it belongs to has been classified
+
+        Args:
+            message (str): message to be classified
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories of the message
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, future))
+        return await future
+
+    async def _gather_batches(self):
+        """
+        Gather the queued messages in batches and start classifying them
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._classify_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _classify_batch(self, batch):
+        """
+        Classify a batch in the thread pool and resolve the futures of its messages
+
+        Args:
+            batch (list): list of (message, future)
+
+        Returns:
+            None
+        """
+        try:
+            start = time.perf_counter()
+            category_predicted = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.predict, [message for message, _ in batch]
+            )
+            self.batch_latency.record(time.perf_counter() - start, len(batch))
+            for (_, future), row in zip(batch, category_predicted, strict=True):
+                if not future.done():
+                    future.set_result(row)
+        except Exception as e:  # noqa: BLE001 - any model error is forwarded to the waiting requests
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._semaphore.release()
+
+
+class InferenceService:
+    """
+    HTTP server exposing the micro-batched model:
+        POST /classify {"message": "..."} or {"messages": ["...", ...]}
+        GET /metrics latency percentiles and throughput
+        GET /metrics/prometheus requests, stage latencies, batch sizes and cache hits in the Prometheus text format
+        GET /health
+        GET /ready 200 once a model is loaded, 503 while it is warming up
+    When the model is a registry.ModelRegistry every batch is classified by its current model and the
+    responses report the model version
+    """
+
+    def __init__(
+        self, model, category_names, prediction_cache=None, training_process=None, **batcher_params
+    ):
+        """
+        Args:
+            model (pipeline.Pipeline): model used to classify the messages (or registry.ModelRegistry)
+            category_names (list): list of the category names, or function returning it called at the first request (e.g. while the database is being created)
+            prediction_cache (cache.PredictionCache): cache of the predictions. Default value None (In case of None every message is classified)
+            training_process (multiprocessing.Process): process training the first model, reported by /ready. Default value None
+            **batcher_params: max_batch_size, max_wait_ms and concurrency of the MicroBatcher
+        """
+        self._category_names = category_names if callable(category_names) else list(category_names)
+        self.prediction_cache = prediction_cache
+        self.training_process = training_process
+        self.model = model
+        self.model_registry = model if isinstance(model, ModelRegistry) else None
+        self.inference_metrics = InferenceMetrics()
+        self.batcher = MicroBatcher(self._predict, **batcher_params)
+        self.request_latency = self.inference_metrics.request_latency
+        self._server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Start the micro-batcher and the HTTP server
+
+        Args:
+            host (str): host to bind. Default value DEFAULT_HOST
+            port (int): port to bind (0 for a free port). Default value DEFAULT_PORT
+
+        Returns:
+            port (int): port the server is listening on
+        """
+        await self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+        Stop the HTTP server and the micro-batcher
+
+        Returns:
+            None
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+    async def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Start the service and serve until cancelled
+
+        Args:
+            host (str): host to bind. Default value DEFAULT_HOST
+            port (int): port to bind. Default value DEFAULT_PORT
+
+        Returns:
+            None
+        """
+        port = await self.start(host, port)
+        print("Serving on http://{}:{}".format(host, port))
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    @property
+    def category_names(self):
+        """
+        Return the category names, calling the function given to the constructor the first time
+
+        Returns:
+            category_names (list): list of the category names
+        """
+        if callable(self._category_names):
+            self._category_names = list(self._category_names())
+        return self._category_names
+
+    def is_ready(self):
+        """
+        Return the readiness of the service
+
+        Returns:
+            ready (bool): True if a model is loaded
+            status (dict): status (ready, warming or failed) and model version
+        """
+        if self.model_registry is None:
+            return True, {"status": "ready", "model_version": None, "last_error": None}
+        return get_readiness(self.model_registry, self.training_process)
+
+    def _predict(self, messages):
+        """
+        Classify the messages with the model (the current model of the registry) recording the
+        latency of its stages
+
+        Args:
+            messages (list): list of messages
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories (messages, categories)
+        """
+        return self.inference_metrics.predict(self.get_model(), messages)
+
+    def get_model(self):
+        """
+        Return the served model
+
+        Returns:
+            model: the model or the current model of the registry
+        """
+        return self.model if self.model_registry is None else self.model_registry.get().model
+
+    def get_model_version(self):
+        """
+        Return the version of the served model
+
+        Returns:
+            model_version (str): current version of the registry or None without a registry
+        """
+        if self.model_registry is None:
+            return None
+        current = self.model_registry.get()
+        return None if current is None else current.version
+
+    def get_metrics(self):
+        """
+        Return the latency and throughput counters of the service
+
+        Returns:
+            metrics (dict): request and batch statistics
+        """
+        metrics = {
+            "requests": self.request_latency.get_stats(),
+            "batches": self.batcher.batch_latency.get_stats(),
+            "stages": self.inference_metrics.get_stats()["stages"],
+        }
+        if self.prediction_cache is not None:
+            metrics["prediction_cache"] = self.prediction_cache.get_stats()
+        if self.model_registry is not None:
+            metrics["model_registry"] = self.model_registry.get_stats()
+        return metrics
+
+    async def _classify_message(self, message):
+        """
+        Return the prediction of a message from the cache or from the micro-batcher
+
+        Args:
+            message (str): message to be classified
+
+        Returns:
+            category_predicted (numpy.ndarray): predicted categories of the message
+        """
+        if self.prediction_cache is None:
+            return await self.batcher.classify(message)
+        model_version = self.get_model_version()
+        preprocessor = get_preprocessor(self.get_model())
+        row = self.prediction_cache.get(message, model_version, preprocessor)
+        if row is None:
+            row = await self.batcher.classify(message)
+            self.prediction_cache.put(message, row, model_version, preprocessor)
+        return row
+
+    async def classify(self, messages):
+        """
+        Return the predicted category names of the messages
+
+        Args:
+            messages (list): list of messages
+
+        Returns:
+            results (list): list of dictionaries (message, categories)
+        """
+        rows = await asyncio.gather(*(self._classify_message(message) for message in messages))
+        results = [
+            {
+                "message": message,
+                "categories": [
+                    name for name, flag in zip(self.category_names, row, strict=True) if flag == 1
+                ],
+            }
+            for message, row in zip(messages, rows, strict=True)
+        ]
+        if self.model_registry is not None:
+            model_version = self.get_model_version()
+            for result in results:
+                result["model_version"] = model_version
+        return results
+
+    async def _route(self, method, path, body):
+        """
+        Return the response of a request
+
+        Args:
+            method (str): HTTP method
+            path (str): request path
+            body (bytes): request body
+
+        Returns:
+            status (int): HTTP status
+            response (dict): response serialized as json (str for a text response)
+        """
+        if path == "/health":
+            if self.model_registry is not None:
+                return 200, {"status": "ok", "model_version": self.get_model_version()}
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.get_metrics()
+        if path == "/metrics/prometheus":
+            return 200, self.inference_metrics.to_prometheus(
+                self.prediction_cache, self.get_model_version()
+            )
+        if path == "/ready":
+            is_ready, status = self.is_ready()
+            return 200 if is_ready else 503, status
+        if path != "/classify":
+            return 404, {"error": "Not found"}
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+        is_ready, status = self.is_ready()
+        if is_ready is False:
+            return 503, status
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise TypeError("The request must be a json object")
+            messages = request["messages"] if "messages" in request else [request["message"]]
+            if not isinstance(messages, list):
+                raise TypeError("Messages must be a list")
+            if not all(isinstance(message, str) for message in messages):
+                raise TypeError("Messages must be strings")
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": "Invalid request: {}".format(e)}
+        start = time.perf_counter()
+        try:
+            results = await self.classify(messages)
+        except Exception as e:  # noqa: BLE001 - any model error is answered with a 500, not a closed connection
+            logger.exception("Classification of {} messages failed".format(len(messages)))
+            return 500, {"error": "Classification failed: {}".format(e)}
+        self.inference_metrics.record_request(time.perf_counter() - start, len(messages))
+        return 200, {"results": results} if "messages" in request else results[0]
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Serve the HTTP/1.1 requests of a connection
+
+        Args:
+            reader (asyncio.StreamReader): connection reader
+            writer (asyncio.StreamWriter): connection writer
+
+        Returns:
+            None
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                content_length = int(headers.get("content-length", 0))
+                if content_length > MAX_BODY_SIZE:
+                    status, response = 400, {"error": "Request too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(content_length)
+                    status, response = await self._route(method, path.split("?")[0], body)
+                    keep_alive = (
+                        headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                    )
+                # Text responses are metrics in the Prometheus format, the others json
+                if isinstance(response, str):
+                    payload = response.encode("utf-8")
+                    content_type = PROMETHEUS_CONTENT_TYPE
+                else:
+                    payload = json.dumps(response).encode("utf-8")
+                    content_type = "application/json"
+                writer.write(
+                    (
+                        "HTTP/1.1 {} {}\r\nContent-Type: {}\r\n"
+                        "Content-Length: {}\r\nConnection: {}\r\n\r\n".format(
+                            status,
+                            HTTP_REASONS[status],
+                            content_type,
+                            len(payload),
+                            "keep-alive" if keep_alive else "close",
+                        )
+                    ).encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        host (str): host to bind
+        port (int): port to bind
+        max_batch_size (int): maximum number of messages of a batch
+        max_wait_ms (float): maximum wait of the first message of a batch
+        concurrency (int): number of batches classified at the same time
+        cache_size (int): maximum number of cached predictions (0 to disable the cache)
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Inference Service")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Host to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to bind")
+    parser.add_argument(
+        "--max_batch_size",
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help="Maximum number of messages classified together",
+    )
+    parser.add_argument(
+        "--max_wait_ms",
+        type=float,
+        default=DEFAULT_MAX_WAIT_MS,
+        help="Maximum wait in ms of a message for other messages to batch with",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Number of batches classified at the same time",
+    )
+    parser.add_argument(
+        "--cache_size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="Maximum number of cached predictions (0 to disable the cache)",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return (
+        args.host,
+        args.port,
+        args.max_batch_size,
+        args.max_wait_ms,
+        args.concurrency,
+        args.cache_size,
+    )
+
+
+if __name__ == "__main__":
+    import disaster_response_pipeline
+
+    print("Asynchronous HTTP inference service with micro-batching")
+    host, port, max_batch_size, max_wait_ms, concurrency, cache_size = parse_input_arguments()
+    # The service answers at once: a missing model is trained in the background and the registry
+    # loads it (and reloads it when the pickle file is rewritten)
+    training_process = disaster_response_pipeline.start_background_training()
+    model_registry = ModelRegistry()
+    model_registry.reload()
+    model_registry.start()
+    service = InferenceService(
+        model_registry,
+        disaster_response_pipeline.get_category_names,
+        training_process=training_process,
+        prediction_cache=PredictionCache(cache_size) if cache_size > 0 else None,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        concurrency=concurrency,
+    )
+    asyncio.run(service.serve_forever(host, port))
+else:
+    pass
@@ -0,0 +1,374 @@
+# Stage timing and profiling of the pipeline
+#
+# python -m src.instrumentation --metrics_filename data/metrics.jsonl
+
+
+import argparse
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+from src.memory_usage import get_peak_rss_mb, get_rss_mb, reset_peak_rss
+
+# Environment variables configuring the instrumentation when the module is imported, so that it
+# can be enabled for any entry point (etl, train, web app) without changing its arguments
+METRICS_FILENAME_VARIABLE = "DRP_METRICS_FILENAME"
+PROFILE_DIRNAME_VARIABLE = "DRP_PROFILE_DIRNAME"
+PROFILE_STAGES_VARIABLE = "DRP_PROFILE_STAGES"
+TRACE_MEMORY_VARIABLE = "DRP_TRACE_MEMORY"
+# Metrics filename sending the records to the logger instead of a file
+LOG_METRICS_FILENAME = "-"
+
+logger = logging.getLogger(__name__)
+
+_enabled = False
+_metrics_filename = None
+_profile_dirname = None
+_profile_stages = None
+_trace_memory = False
+_emit_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(metrics_filename=None, profile_dirname=None, profile_stages=None, trace_memory=False):
+    """
+    Configure the instrumentation. It is enabled if a metrics filename or a profile directory is set,
+    otherwise span and instrumented do nothing but a flag check
+
+    Args:
+        metrics_filename (str): json lines file the stage records are appended to. Default value None (In case of LOG_METRICS_FILENAME the records are logged at INFO level, in case of None they are not written)
+        profile_dirname (str): directory of the cProfile statistics of the stages. Default value None (In case of None the stages are not profiled)
+        profile_stages (list): names of the stages profiled. Default value None (In case of None all the stages are profiled)
+        trace_memory (bool): if True trace the Python allocations with tracemalloc and record their peak (slow). Default value False
+
+    Returns:
+        None
+    """
+    global _enabled, _metrics_filename, _profile_dirname, _profile_stages, _trace_memory
+    _metrics_filename = metrics_filename or None
+    _profile_dirname = profile_dirname or None
+    _profile_stages = None if profile_stages is None else set(profile_stages)
+    _trace_memory = trace_memory
+    _enabled = _metrics_filename is not None or _profile_dirname is not None
+    if _profile_dirname is not None:
+        os.makedirs(_profile_dirname, exist_ok=True)
+
+
+def configure_from_environment(environ=None):
+    """
+    Configure the instrumentation from the environment variables DRP_METRICS_FILENAME,
+    DRP_PROFILE_DIRNAME, DRP_PROFILE_STAGES (comma separated stage names) and DRP_TRACE_MEMORY (1 to enable)
+
+    Args:
+        environ (dict): environment variables. Default value None (In case of None os.environ will be used)
+
+    Returns:
+        None
+    """
+    environ = os.environ if environ is None else environ
+    profile_stages = environ.get(PROFILE_STAGES_VARIABLE)
+    configure(
+        metrics_filename=environ.get(METRICS_FILENAME_VARIABLE),
+        profile_dirname=environ.get(PROFILE_DIRNAME_VARIABLE),
+        profile_stages=None if not profile_stages else profile_stages.split(","),
+        trace_memory=environ.get(TRACE_MEMORY_VARIABLE, "0") not in ("", "0"),
+    )
+
+
+def is_enabled():
+    """
+    Return True if the stages are measured
+
+    Returns:
+        enabled (bool): True if the instrumentation is enabled
+    """
+    return _enabled
+
+
+def _get_stack():
+    """
+    Return the stack of the open spans of the current thread
+
+    Returns:
+        stack (list): list of the open spans, the innermost last
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _emit(record):
+    """
+    Write a stage record to the metrics file or to the logger
+
+    Args:
+        record (dict): stage record
+
+    Returns:
+        None
+    """
+    line = json.dumps(record)
+    if _metrics_filename == LOG_METRICS_FILENAME:
+        logger.info(line)
+    elif _metrics_filename is not None:
+        with _emit_lock, open(_metrics_filename, "a") as f:
+            f.write(line + "\n")
+
+
+class Span:
+    """
+    Measure a stage: wall time, CPU time of the process (child processes excluded), rows processed,
+    resident memory and its peak during the stage, and optionally the peak of the Python
+    allocations and a cProfile of the stage. Spans can be nested: the peak of an inner span is
+    included in the peak of the outer one and the record names its parent
+    """
+
+    def __init__(self, name, rows=None, **fields):
+        """
+        Args:
+            name (str): stage name (e.g. etl.clean_data)
+            rows (int): number of rows processed, can be set later with set_rows. Default value None
+            **fields: additional fields of the record
+        """
+        self.name = name
+        self.rows = rows
+        self.fields = fields
+        self.parent = None
+        self.peak_rss_mb = None
+        self.traced_peak_mb = None
+        self._profiler = None
+        self._started_tracing = False
+
+    def set_rows(self, rows):
+        """
+        Set the number of rows processed by the stage
+
+        Args:
+            rows (int): number of rows
+
+        Returns:
+            None
+        """
+        self.rows = rows
+
+    def set(self, **fields):
+        """
+        Add fields to the record of the stage
+
+        Returns:
+            None
+        """
+        self.fields.update(fields)
+
+    def _update_peaks(self):
+        """
+        Fold the peaks reached since the last reset into the peaks of the span
+
+        Returns:
+            None
+        """
+        peak_rss_mb = get_peak_rss_mb()
+        if peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, peak_rss_mb)
+        if tracemalloc.is_tracing():
+            traced_peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            self.traced_peak_mb = max(self.traced_peak_mb or 0.0, traced_peak_mb)
+
+    def __enter__(self):
+        stack = _get_stack()
+        if len(stack) > 0:
+            # The peaks are reset to measure this span, the parent keeps the ones reached so far
+            self.parent = stack[-1]
+            self.parent._update_peaks()
+        if _trace_memory is True and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        reset_peak_rss()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        stack.append(self)
+        if _profile_dirname is not None and (
+            _profile_stages is None or self.name in _profile_stages
+        ):
+            # Profiles can not be nested: an inner stage is part of the outer profile
+            if not any(span._profiler is not None for span in stack):
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                    self._profiler = profiler
+                except ValueError:
+                    # Another profiler is active (e.g. in another thread)
+                    pass
+        self._start_time = time.time()
+        self._rss_mb = get_rss_mb()
+        self._start_cpu = time.process_time()
+        self._start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_seconds = time.perf_counter() - self._start_wall
+        cpu_seconds = time.process_time() - self._start_cpu
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(
+                os.path.join(_profile_dirname, "{}.{}.prof".format(self.name, os.getpid()))
+            )
+            self._profiler = None
+        self._update_peaks()
+        if self._started_tracing is True:
+            tracemalloc.stop()
+        stack = _get_stack()
+        if len(stack) > 0 and stack[-1] is self:
+            stack.pop()
+        if self.parent is not None and self.peak_rss_mb is not None:
+            self.parent.peak_rss_mb = max(self.parent.peak_rss_mb or 0.0, self.peak_rss_mb)
+        if self.parent is not None and self.traced_peak_mb is not None:
+            self.parent.traced_peak_mb = max(self.parent.traced_peak_mb or 0.0, self.traced_peak_mb)
+        rss_mb = get_rss_mb()
+        record = {
+            "stage": self.name,
+            "parent": None if self.parent is None else self.parent.name,
+            "pid": os.getpid(),
+            "start": self._start_time,
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+            "rows": self.rows,
+            "rows_per_second": None
+            if self.rows is None or wall_seconds <= 0
+            else self.rows / wall_seconds,
+            "rss_mb": rss_mb,
+            "rss_delta_mb": None
+            if rss_mb is None or self._rss_mb is None
+            else rss_mb - self._rss_mb,
+            "peak_rss_mb": self.peak_rss_mb,
+            "traced_peak_mb": self.traced_peak_mb,
+            "status": "ok" if exc_type is None else "error",
+            **self.fields,
+        }
+        _emit(record)
+        return False
+
+
+class _DisabledSpan:
+    """
+    Span returned while the instrumentation is disabled, doing nothing
+    """
+
+    def set_rows(self, rows):
+        pass
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_DISABLED_SPAN = _DisabledSpan()
+
+
+def span(name, rows=None, **fields):
+    """
+    Return a context manager measuring a stage (see Span)
+
+    Args:
+        name (str): stage name
+        rows (int): number of rows processed, can be set later with set_rows. Default value None
+        **fields: additional fields of the record
+
+    Returns:
+        span (Span): span of the stage, a shared object doing nothing if the instrumentation is disabled
+    """
+    if _enabled is False:
+        return _DISABLED_SPAN
+    return Span(name, rows, **fields)
+
+
+def instrumented(name=None):
+    """
+    Decorator measuring every call of a function as a stage
+
+    Args:
+        name (str): stage name. Default value None (In case of None the qualified name of the function will be used)
+
+    Returns:
+        decorator (callable): decorator of the function
+    """
+
+    def decorator(function):
+        stage_name = name or "{}.{}".format(function.__module__, function.__qualname__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _enabled is False:
+                return function(*args, **kwargs)
+            with Span(stage_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def read_metrics(metrics_filename):
+    """
+    Read the stage records of a metrics file
+
+    Args:
+        metrics_filename (str): json lines metrics filename
+
+    Returns:
+        records (list): list of the stage records
+    """
+    with open(metrics_filename) as f:
+        return [json.loads(line) for line in f if line.strip() != ""]
+
+
+def parse_input_arguments():
+    """
+    Parse the command line arguments
+
+    Returns:
+        metrics_filename (str): json lines metrics filename
+    """
+    parser = argparse.ArgumentParser(description="Disaster Response Pipeline Stage Metrics")
+    parser.add_argument(
+        "--metrics_filename",
+        type=str,
+        required=True,
+        help="Json lines metrics file written with DRP_METRICS_FILENAME",
+    )
+    args = parser.parse_args()
+    # print(args)
+    return args.metrics_filename
+
+
+configure_from_environment()
+
+
+if __name__ == "__main__":
+    print("Stage metrics")
+    metrics_filename = parse_input_arguments()
+    for record in read_metrics(metrics_filename):
+        print(
+            "{:<8} {:<32} {:>10.3f} s {:>10.3f} s cpu {:>10} rows {:>9} MB peak {}".format(
+                record["pid"],
+                record["stage"],
+                record["wall_seconds"],
+                record["cpu_seconds"],
+                "-" if record["rows"] is None else record["rows"],
+                "-" if record["peak_rss_mb"] is None else "{:.1f}".format(record["peak_rss_mb"]),
+                "" if record["status"] == "ok" else record["status"],
+            )
+        )
+else:
+    pass
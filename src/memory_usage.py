@@ -0,0 +1,105 @@
+# Memory usage of the current process
+#
+# python -m src.memory_usage
+
+
+import ctypes
+import os
+import sys
+
+
+def _get_windows_memory_counters():
+    """
+    Return the memory counters of the current process on Windows
+
+    Returns:
+        counters (ctypes.Structure): PROCESS_MEMORY_COUNTERS of the current process
+    """
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", ctypes.c_ulong),
+            ("PageFaultCount", ctypes.c_ulong),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    windll = ctypes.windll  # type: ignore[attr-defined]
+    windll.psapi.GetProcessMemoryInfo(
+        windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+    )
+    return counters
+
+
+def get_rss_mb():
+    """
+    Return the resident memory of the current process
+
+    Returns:
+        rss (float): resident memory in MB or None if not available on this platform
+    """
+    if sys.platform == "win32":
+        return _get_windows_memory_counters().WorkingSetSize / 2**20
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return None
+
+
+def get_peak_rss_mb():
+    """
+    Return the peak resident memory of the current process
+
+    Returns:
+        peak_rss (float): peak resident memory in MB or None if not available on this platform
+    """
+    if sys.platform == "win32":
+        return _get_windows_memory_counters().PeakWorkingSetSize / 2**20
+    # VmHWM is the same peak as ru_maxrss but it can be reset with reset_peak_rss
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident memory of the current process to the current resident memory, so that
+    the peak of a single stage can be measured. Supported on Linux only
+
+    Returns:
+        reset (bool): True if the peak was reset
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    print("Memory usage")
+    print("RSS: {} MB".format(get_rss_mb()))
+    print("Peak RSS: {} MB".format(get_peak_rss_mb()))
+else:
+    pass
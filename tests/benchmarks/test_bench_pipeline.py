@@ -0,0 +1,68 @@
+# Test bench_pipeline
+#
+# python test_bench_pipeline.py
+
+
+from benchmarks import bench_pipeline, synthetic
+from src.data_preparation import etl_pipeline
+
+
+def test_make_synthetic_dataset():
+    messages, categories = synthetic.make_synthetic_dataset(500, seed=1)
+    df = etl_pipeline.clean_data(messages.merge(categories, on="id"))
+    assert len(messages) == len(categories) > 500
+    assert len(df) == 500
+    assert list(df.columns[-len(synthetic.CATEGORY_NAMES) :]) == synthetic.CATEGORY_NAMES
+    assert df["child_alone"].sum() == 0
+    assert 0.6 < (df["related"] == 1).mean() < 0.9
+    messages_again, _ = synthetic.make_synthetic_dataset(500, seed=1)
+    assert messages_again.equals(messages)
+
+
+def test_run_pipeline(fake_nltk, tmp_path):
+    stages = bench_pipeline.run_pipeline(300, str(tmp_path), n_estimators=2, n_single_predictions=5)
+    assert list(stages) == [
+        "etl_load_data",
+        "etl_clean_data",
+        "etl_save_data",
+        "train_load_data",
+        "tokenize",
+        "fit",
+        "save_model",
+        "load_model",
+        "predict_single",
+        "predict_batch",
+    ]
+    assert all(stage["seconds"] >= 0 for stage in stages.values())
+    assert stages["etl_save_data"]["items"] == 300
+    assert stages["predict_single"]["items"] == 5
+    assert stages["predict_single"]["p99_ms"] >= stages["predict_single"]["p50_ms"]
+
+
+def make_results(seconds, peak_rss_mb):
+    return {
+        "runs": [
+            {
+                "n_messages": 1000,
+                "stages": {"fit": {"seconds": seconds, "peak_rss_mb": peak_rss_mb}},
+            }
+        ]
+    }
+
+
+def test_compare_results():
+    base = make_results(1.0, 100.0)
+    comparison = bench_pipeline.compare_results(base, make_results(1.1, 103.0), threshold=0.2)
+    assert [row["regression"] for row in comparison] == [False, False]
+    comparison = bench_pipeline.compare_results(base, make_results(1.5, 200.0), threshold=0.2)
+    assert [(row["metric"], row["regression"]) for row in comparison] == [
+        ("seconds", True),
+        ("peak_rss_mb", True),
+    ]
+    # Relative increases below the noise level are not regressions
+    comparison = bench_pipeline.compare_results(
+        make_results(0.01, 1.0), make_results(0.03, 3.0), threshold=0.2
+    )
+    assert not any(row["regression"] for row in comparison)
+    # Sizes missing from the base are skipped
+    assert bench_pipeline.compare_results({"runs": []}, base) == []
@@ -0,0 +1,106 @@
+# Test bundle
+#
+# python test_bundle.py
+
+
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.pipeline import Pipeline
+
+from src.classifier import bundle, train
+
+CATEGORY_NAMES = ["related", "water", "food", "child_alone"]
+WORDS = ["water", "food", "storm", "help", "need", "tents", "rain", "http://a.com", "Flood"]
+
+
+def make_dataset(n_messages=300, seed=0):
+    rng = np.random.default_rng(seed)
+    messages = [" ".join(rng.choice(WORDS, size=rng.integers(1, 8))) for _ in range(n_messages)]
+    Y = np.array(
+        [
+            [
+                2 if "storm" in message else int("help" in message or "need" in message),
+                int("water" in message and rng.random() > 0.1),
+                int("food" in message),
+                0,
+            ]
+            for message in messages
+        ]
+    )
+    return messages, Y
+
+
+@pytest.fixture
+def pipeline(fake_nltk):
+    messages, Y = make_dataset()
+    pipeline = Pipeline(
+        [
+            (
+                "vect",
+                CountVectorizer(tokenizer=train.my_tokenizer, token_pattern="", ngram_range=(1, 2)),
+            ),
+            ("tfidf", TfidfTransformer(sublinear_tf=True)),
+            ("clf", MultiOutputClassifier(RandomForestClassifier(n_estimators=10, random_state=0))),
+        ]
+    )
+    return pipeline.fit(messages, Y)
+
+
+def test_bundle_predict(pipeline, tmp_path):
+    bundle_dirname = str(tmp_path / "bundle")
+    bundle.export_bundle(pipeline, CATEGORY_NAMES, bundle_dirname)
+    model = bundle.load_bundle(bundle_dirname)
+    messages, _ = make_dataset(100, seed=1)
+    messages += ["", "unknown words only"]
+    np.testing.assert_allclose(
+        model.transform(messages).toarray(),
+        pipeline[:-1].transform(messages).toarray(),
+    )
+    np.testing.assert_array_equal(model.predict(messages), pipeline.predict(messages))
+    assert model.category_names == CATEGORY_NAMES
+    assert isinstance(model.arrays["value"], np.memmap)
+    assert model.build_preprocessor()("Need WATER") == "need water"
+
+
+def test_bundle_predict_in_memory(pipeline, tmp_path):
+    bundle_dirname = str(tmp_path / "bundle")
+    bundle.export_bundle(pipeline, CATEGORY_NAMES, bundle_dirname)
+    model = bundle.load_bundle(bundle_dirname, mmap_mode=None)
+    messages, _ = make_dataset(10, seed=2)
+    np.testing.assert_array_equal(model.predict(messages), pipeline.predict(messages))
+    assert model.predict([]).shape == (0, len(CATEGORY_NAMES))
+
+
+def test_export_bundle_wrong_category_names(pipeline, tmp_path):
+    with pytest.raises(ValueError):
+        bundle.export_bundle(pipeline, CATEGORY_NAMES[:2], str(tmp_path / "bundle"))
+
+
+def test_export_bundle_versions(pipeline, tmp_path):
+    bundle_dirname = str(tmp_path / "bundle")
+    bundle.export_bundle(pipeline, CATEGORY_NAMES, bundle_dirname)
+    first_model = bundle.load_bundle(bundle_dirname)
+    messages, _ = make_dataset(10, seed=3)
+    for _ in range(3):
+        bundle.export_bundle(pipeline, CATEGORY_NAMES, bundle_dirname)
+    version = bundle.get_current_version(bundle_dirname)
+    assert bundle.load_bundle(bundle_dirname).bundle_dirname == os.path.join(
+        bundle_dirname, version
+    )
+    # The current and the previous versions are kept, the older ones are removed
+    assert (
+        len([name for name in os.listdir(bundle_dirname) if name != bundle.CURRENT_FILENAME]) == 2
+    )
+    assert not os.path.exists(first_model.bundle_dirname)
+    np.testing.assert_array_equal(first_model.predict(messages), pipeline.predict(messages))
+
+
+def test_load_bundle_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        bundle.load_bundle(str(tmp_path / "bundle"))
+    assert bundle.is_bundle_current(str(tmp_path / "bundle"), str(tmp_path / "model.pkl")) is False
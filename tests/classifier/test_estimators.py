@@ -0,0 +1,69 @@
+# Test estimators
+#
+# python test_estimators.py
+
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from src.classifier import bundle, estimators, parallelism, train
+from tests.classifier.test_bundle import make_dataset
+
+
+def test_linear_multilabel_classifier():
+    messages, Y = make_dataset()
+    X = TfidfVectorizer().fit_transform(messages)
+    model = estimators.LinearMultiLabelClassifier().fit(X, Y)
+    Y_pred = model.predict(X)
+    assert Y_pred.shape == Y.shape
+    # water and food are binary: the same prediction of a single logistic regression
+    for j in [1, 2]:
+        expected = LogisticRegression(solver="liblinear").fit(X, Y[:, j]).predict(X)
+        np.testing.assert_array_equal(Y_pred[:, j], expected)
+    # related has three classes and child_alone a single one
+    assert set(Y_pred[:, 0]) == {0, 1, 2}
+    assert (Y_pred[:, 3] == 0).all()
+    assert model.coef_.shape[1] == 3 + 1 + 1
+
+
+@pytest.mark.parametrize("classifier", train.CLASSIFIERS)
+def test_build_model_classifiers(fake_nltk, classifier):
+    messages, Y = make_dataset()
+    model = train.build_model(classifier=classifier)
+    model.set_params(**{name: 10 for name in model.get_params() if name.endswith("n_estimators")})
+    parallelism.apply_parallelism_plan(model, parallelism.ParallelismPlan(1, 1, 2))
+    model.fit(messages, Y)
+    Y_pred = model.predict(messages)
+    assert Y_pred.shape == Y.shape
+    assert model.score(messages, Y) == estimators.subset_accuracy(Y, Y_pred)
+    assert set(train.get_parameter_grid(classifier)) <= set(model.get_params())
+
+
+@pytest.mark.parametrize("use_idf", [True, False])
+@pytest.mark.parametrize("sublinear_tf", [True, False])
+def test_online_tfidf_transformer(use_idf, sublinear_tf):
+    messages, _ = make_dataset()
+    X = CountVectorizer().fit_transform(messages)
+    params = {"use_idf": use_idf, "sublinear_tf": sublinear_tf}
+    expected = TfidfTransformer(**params).fit_transform(X)
+    transformer = estimators.OnlineTfidfTransformer(**params)
+    transformer.partial_fit(X[:100]).partial_fit(X[100:])
+    np.testing.assert_allclose(transformer.transform(X).toarray(), expected.toarray())
+    # fit forgets the previous batches
+    transformer.fit(X[:100])
+    assert transformer.n_samples_ == 100
+    with pytest.raises(ValueError):
+        transformer.partial_fit(X[:, :5])
+
+
+def test_build_model_hashing_vectorizer(fake_nltk):
+    messages, Y = make_dataset()
+    model = train.build_model(classifier="linear", vectorizer="hashing")
+    model.fit(messages, Y)
+    assert model.named_steps["tfidf"].document_frequency_.shape == (train.DEFAULT_N_FEATURES,)
+    assert model.predict(messages).shape == Y.shape
+    assert set(train.get_parameter_grid("linear", "hashing")) <= set(model.get_params())
+    with pytest.raises(ValueError):
+        bundle._export_vectorizer(model.named_steps["vect"], model.named_steps["tfidf"])
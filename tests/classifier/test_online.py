@@ -0,0 +1,108 @@
+# Test online
+#
+# python test_online.py
+
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.classifier import online, train
+from src.config import TABLE_NAME
+from src.data_preparation import database, etl_pipeline
+from tests.conftest import make_raw_dataframe
+
+
+def train_model(database_filename, model_pickle_filename, vectorizer="hashing", n_held_out=0):
+    X, Y, _ = train.load_data(database_filename)
+    # The first rows are held out, as the test split of train.train
+    X_train, Y_train = X.iloc[n_held_out:], Y.iloc[n_held_out:]
+    model = train.build_model(classifier="sgd", vectorizer=vectorizer)
+    if vectorizer == "hashing":
+        model.set_params(vect__n_features=2**10)
+    model.fit(X_train, Y_train)
+    model.table_generation_ = train.get_table_generation(database_filename)
+    model.learned_ids_ = train.get_learned_ids(X_train)
+    train.save_model(model, model_pickle_filename)
+    return model
+
+
+def test_update_model(fake_nltk, database_filename, tmp_path):
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    model = train_model(database_filename, model_pickle_filename)
+    n_samples = model.named_steps["tfidf"].n_samples_
+    df = database.read_messages(database_filename)
+    new_df = df.iloc[:3].assign(id=df["id"] + 100, message="Flood water everywhere")
+    with database.connect(database_filename) as connection:
+        database.insert_messages(connection, new_df, TABLE_NAME)
+
+    stats = online.update_model(database_filename, model_pickle_filename, batch_size=2)
+    assert stats["n_messages"] == 3
+    assert stats["n_learned_ids"] == len(df) + 3
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+    updated_model = train.load_model(model_pickle_filename)
+    assert updated_model.named_steps["tfidf"].n_samples_ == n_samples + 3
+    assert np.array_equal(
+        updated_model.learned_ids_, np.union1d(df["id"], new_df["id"]).astype(np.int64)
+    )
+    assert updated_model.predict(["Flood water"]).shape == (1, len(df.columns) - 4)
+
+    # Nothing new: the pickle is not rewritten
+    identity = database.get_file_identity(model_pickle_filename)
+    assert online.update_model(database_filename, model_pickle_filename)["n_messages"] == 0
+    assert database.get_file_identity(model_pickle_filename) == identity
+
+
+def test_update_model_not_updatable(fake_nltk, database_filename, tmp_path):
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    train_model(database_filename, model_pickle_filename, vectorizer="count")
+    with pytest.raises(ValueError):
+        online.update_model(database_filename, model_pickle_filename)
+
+
+def test_update_model_learns_held_out_rows(fake_nltk, database_filename, tmp_path):
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    train_model(database_filename, model_pickle_filename, n_held_out=2)
+    stats = online.update_model(database_filename, model_pickle_filename)
+    assert stats["n_messages"] == 2
+    assert online.update_model(database_filename, model_pickle_filename)["n_messages"] == 0
+
+
+def test_read_new_messages(database_filename):
+    ids = database.read_messages(database_filename)["id"].to_numpy()
+    batches = list(online.read_new_messages(database_filename, learned_ids=ids[:1], batch_size=2))
+    assert [len(messages) for messages, _, _ in batches] == [2, 2, 1]
+    assert np.array_equal(np.concatenate([batch_ids for _, _, batch_ids in batches]), ids[1:])
+    assert all(Y.dtype == np.uint8 for _, Y, _ in batches)
+
+
+def write_input_files(tmp_path, df):
+    messages_filename = str(tmp_path / "messages.csv")
+    categories_filename = str(tmp_path / "categories.csv")
+    df[["id", "message", "original", "genre"]].to_csv(messages_filename, index=False)
+    df[["id", "categories"]].to_csv(categories_filename, index=False)
+    return messages_filename, categories_filename
+
+
+def test_update_model_after_incremental_etl(fake_nltk, tmp_path):
+    # With ids larger than the number of rows the rowid of a full run (insertion order) and the
+    # rowid of an incremental run (the id) differ
+    df = make_raw_dataframe().assign(id=lambda df: df["id"] * 100)
+    database_filename = str(tmp_path / "db.sqlite3")
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    etl_pipeline.process(*write_input_files(tmp_path, df), database_filename)
+    train_model(database_filename, model_pickle_filename)
+
+    for new_id in [700, 250]:
+        df = pd.concat([df, df.iloc[[2]].assign(id=new_id, message="Flood water everywhere")])
+        # The first incremental run upserts all the rows but only the new id is learned
+        etl_pipeline.process_incremental(*write_input_files(tmp_path, df), database_filename)
+        assert online.update_model(database_filename, model_pickle_filename)["n_messages"] == 1
+    assert online.update_model(database_filename, model_pickle_filename)["n_messages"] == 0
+
+    # A full run rebuilds the table: the model must be trained again
+    etl_pipeline.process(*write_input_files(tmp_path, df), database_filename)
+    with pytest.raises(ValueError):
+        online.update_model(database_filename, model_pickle_filename)
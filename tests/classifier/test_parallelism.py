@@ -0,0 +1,66 @@
+# Test parallelism
+#
+# python test_parallelism.py
+
+
+import numpy as np
+import pytest
+from sklearn.model_selection import GridSearchCV
+
+from src.classifier import parallelism, tokenizer, train
+from tests.classifier.test_bundle import make_dataset
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2, 3, 8, 32, 64])
+@pytest.mark.parametrize("n_search_tasks", [1, 5, 540])
+def test_make_parallelism_plan(n_jobs, n_search_tasks):
+    plan = parallelism.make_parallelism_plan(n_jobs, n_search_tasks)
+    assert plan.search_n_jobs * plan.output_n_jobs * plan.forest_n_jobs <= n_jobs
+    assert plan.search_n_jobs <= n_search_tasks
+    assert plan.output_n_jobs <= parallelism.DEFAULT_N_OUTPUTS
+    if n_search_tasks == 1:
+        assert plan.output_n_jobs == min(n_jobs, parallelism.DEFAULT_N_OUTPUTS)
+
+
+def test_make_parallelism_plan_explicit_levels():
+    plan = parallelism.make_parallelism_plan(16, 540, forest_n_jobs=4)
+    assert plan == parallelism.ParallelismPlan(4, 1, 4)
+    with pytest.raises(ValueError):
+        parallelism.make_parallelism_plan(4, output_n_jobs=4, forest_n_jobs=2)
+
+
+def test_get_n_search_tasks():
+    assert parallelism.get_n_search_tasks(train.build_model()) == 1
+    assert parallelism.get_n_search_tasks(train.build_model(grid_search_cv=True)) == 108 * 5
+
+
+def test_apply_parallelism_plan(fake_nltk):
+    messages, Y = make_dataset()
+    model = train.build_model()
+    model.set_params(clf__estimator__n_estimators=10, clf__estimator__random_state=0)
+    expected = model.fit(messages, Y).predict(messages)
+
+    parallelism.apply_parallelism_plan(model, parallelism.ParallelismPlan(1, 1, 2))
+    assert model.get_params()["clf__estimator__n_jobs"] == 2
+    assert all(estimator.n_jobs == 2 for estimator in model.named_steps["clf"].estimators_)
+    np.testing.assert_array_equal(model.fit(messages, Y).predict(messages), expected)
+
+
+def test_search_backend_shares_corpus_tokens(fake_nltk, monkeypatch):
+    messages, Y = make_dataset(n_messages=60)
+    tokenizer.pretokenize(messages)
+
+    def _tokenize(text):
+        raise AssertionError("Message tokenized again: {}".format(text))
+
+    monkeypatch.setattr(tokenizer, "_tokenize", _tokenize)
+    model = GridSearchCV(
+        train.build_model(), {"clf__estimator__n_estimators": [5, 10]}, cv=2, n_jobs=2
+    )
+    plan = parallelism.ParallelismPlan(2, 1, 1)
+    parallelism.apply_parallelism_plan(model, plan)
+    with parallelism.search_backend(model, plan):
+        model.fit(messages, Y)
+    assert model.best_params_["clf__estimator__n_estimators"] in (5, 10)
+    with parallelism.search_backend(train.build_model(), plan):
+        pass
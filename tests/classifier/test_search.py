@@ -0,0 +1,63 @@
+# Test search
+#
+# python test_search.py
+
+
+import json
+
+import pytest
+
+from src.classifier import parallelism, search, train
+from tests.classifier.test_bundle import make_dataset
+
+PARAMETER_GRID = {
+    "vect__ngram_range": [(1, 1), (1, 2)],
+    "tfidf__use_idf": [True, False],
+    "clf__estimator__n_estimators": [5, 10],
+}
+
+
+def make_search(tmp_path, **search_params):
+    model = train.build_model()
+    model.set_params(clf__estimator__random_state=0)
+    return search.ParameterSearch(
+        model,
+        PARAMETER_GRID,
+        n_candidates=6,
+        n_folds=2,
+        checkpoint_filename=str(tmp_path / "checkpoint.json"),
+        cache_dirname=str(tmp_path / "cache"),
+        **search_params,
+    )
+
+
+@pytest.mark.parametrize("mode", search.SEARCH_MODES)
+def test_parameter_search(fake_nltk, tmp_path, mode):
+    messages, Y = make_dataset(120)
+    model = make_search(tmp_path, mode=mode).fit(messages, Y)
+    assert model.best_params_ in search.ParameterSampler(PARAMETER_GRID, 6, random_state=0)
+    assert model.predict(messages).shape == Y.shape
+    iterations = {result["iteration"] for result in model.cv_results_}
+    assert iterations == ({0} if mode == "random" else {0, 1})
+    assert parallelism.get_n_search_tasks(model) == 12
+
+
+def test_parameter_search_resume(fake_nltk, tmp_path, monkeypatch):
+    messages, Y = make_dataset(120)
+    with pytest.raises(RuntimeError):
+        make_search(tmp_path, time_budget=0).fit(messages, Y)
+    with open(tmp_path / "checkpoint.json") as f:
+        assert len(json.load(f)["scores"]) == 1
+
+    n_fits = []
+    fit_and_score = search._fit_and_score
+    monkeypatch.setattr(
+        search, "_fit_and_score", lambda *args: n_fits.append(1) or fit_and_score(*args)
+    )
+    model = make_search(tmp_path).fit(messages, Y)
+    first_run_fits = len(n_fits)
+    n_fits.clear()
+    make_search(tmp_path).fit(messages, Y)
+    assert len(n_fits) == 0
+    assert first_run_fits == 6 * 2 + 2 * 2 - 1
+    assert model.best_estimator_.get_params()["memory"] is None
@@ -0,0 +1,42 @@
+# Test token cache
+#
+# python test_token_cache.py
+
+
+import sqlite3
+
+from src.classifier import token_cache, tokenizer
+from src.config import TABLE_NAME
+
+
+def test_update_token_cache(database_filename, fake_nltk, monkeypatch):
+    calls = []
+    monkeypatch.setattr(tokenizer, "download_nltk_data", lambda: calls.append("download"))
+    assert token_cache.update_token_cache(database_filename) == (0, 6)
+    tokenizer.clear_corpus_cache()
+    assert token_cache.update_token_cache(database_filename) == (6, 0)
+    # The NLTK resources are checked even when every message is read from the cache
+    assert calls == ["download", "download"]
+    # The capitalized messages are found when the vectorizer passes them lowercased
+    assert tokenizer.get_untokenized_texts(["We need water and food please"]) == []
+    assert (
+        tokenizer.tokenize("we need water and food please")
+        is tokenizer.pretokenize(["We need water and food please"])[0]
+    )
+
+
+def test_update_token_cache_changed_message(database_filename, fake_nltk, monkeypatch):
+    monkeypatch.setattr(tokenizer, "download_nltk_data", lambda: None)
+    token_cache.update_token_cache(database_filename)
+    with sqlite3.connect(database_filename) as connection:
+        connection.execute("UPDATE {} SET message = 'Need tents' WHERE id = 3".format(TABLE_NAME))
+    corpus_tokens, missing_messages = token_cache.load_token_cache(database_filename)
+    assert missing_messages == [(3, "Need tents")]
+    assert len(corpus_tokens) == 5
+
+
+def test_update_token_cache_new_tokenizer_version(database_filename, fake_nltk, monkeypatch):
+    monkeypatch.setattr(tokenizer, "download_nltk_data", lambda: None)
+    token_cache.update_token_cache(database_filename)
+    monkeypatch.setattr(tokenizer, "TOKENIZER_VERSION", tokenizer.TOKENIZER_VERSION + 1)
+    assert token_cache.update_token_cache(database_filename) == (0, 6)
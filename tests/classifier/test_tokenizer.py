@@ -0,0 +1,118 @@
+# Test tokenizer
+#
+# python test_tokenizer.py
+
+
+import multiprocessing
+
+import nltk
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src.classifier import tokenizer
+
+MESSAGES = [
+    "Storm at sacred heart of Jesus",
+    "We need Tents and Waters at http://example.com/help?id=1 and https://example.org",
+    "Look http://a.com and http://a.com/b",
+    "",
+]
+
+
+def nltk_data_available():
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+        nltk.data.find("corpora/wordnet")
+    except LookupError:
+        return False
+    return True
+
+
+def test_replace_urls():
+    assert tokenizer.replace_urls("Look http://a.com and http://a.com/b") == (
+        "Look urlplaceholder and urlplaceholder/b"
+    )
+
+
+def test_tokenize(fake_nltk):
+    assert tokenizer.tokenize(MESSAGES[1]) == [
+        "we",
+        "need",
+        "tent",
+        "and",
+        "water",
+        "at",
+        "urlplaceholder",
+        "and",
+        "urlplaceholder",
+    ]
+
+
+def test_pretokenize(fake_nltk):
+    expected = [tokenizer.tokenize(tokenizer.preprocess(message)) for message in MESSAGES]
+    assert tokenizer.pretokenize(MESSAGES + MESSAGES) == expected + expected
+    assert (
+        tokenizer.tokenize(tokenizer.preprocess(MESSAGES[0]))
+        is tokenizer.pretokenize([MESSAGES[0]])[0]
+    )
+    tokenizer.clear_corpus_cache()
+    assert [tokenizer.tokenize(tokenizer.preprocess(message)) for message in MESSAGES] == expected
+
+
+def test_pretokenize_capitalized_messages_hit_vectorizer_calls(fake_nltk, monkeypatch):
+    messages = ["Storm at sacred heart of Jesus", "We need TENTS", "HTTP://a.com Flood"]
+    tokenizer.pretokenize(messages)
+
+    def _tokenize(text):
+        raise AssertionError("Message tokenized again: {}".format(text))
+
+    monkeypatch.setattr(tokenizer, "_tokenize", _tokenize)
+    vectorizer = CountVectorizer(tokenizer=tokenizer.tokenize, token_pattern=None)
+    vectorizer.fit(messages)
+    assert "tent" in vectorizer.vocabulary_
+    assert tokenizer.get_untokenized_texts(messages) == []
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork", reason="fake NLTK is not inherited by workers"
+)
+def test_pretokenize_pool(fake_nltk, monkeypatch):
+    monkeypatch.setattr(tokenizer, "PRETOKENIZE_CHUNK_SIZE", 1)
+    expected = [tokenizer._tokenize(tokenizer.preprocess(message)) for message in MESSAGES]
+    assert tokenizer.pretokenize(MESSAGES, n_jobs=2) == expected
+
+
+@pytest.mark.skipif(not nltk_data_available(), reason="NLTK data not available")
+def test_tokenize_matches_reference():
+    from benchmarks.bench_tokenizer import reference_tokenizer
+
+    for message in MESSAGES:
+        assert tokenizer.tokenize(message) == reference_tokenizer(message)
+
+
+def test_download_nltk_data_uses_local_resources(monkeypatch):
+    def download(*args, **kwargs):
+        raise AssertionError("No download expected")
+
+    monkeypatch.setattr(nltk.data, "find", lambda resource_name: resource_name)
+    monkeypatch.setattr(nltk, "download", download)
+    assert tokenizer.get_missing_nltk_resources() == []
+    tokenizer.download_nltk_data()
+
+
+def test_download_nltk_data_missing_resources(monkeypatch):
+    def find(resource_name):
+        if resource_name == "corpora/wordnet":
+            raise LookupError(resource_name)
+        return resource_name
+
+    downloaded = []
+    monkeypatch.setattr(nltk.data, "find", find)
+    monkeypatch.setattr(
+        nltk, "download", lambda info_or_id, **kwargs: downloaded.append(info_or_id) or True
+    )
+    with pytest.raises(LookupError):
+        tokenizer.download_nltk_data(download=False)
+    assert downloaded == []
+    tokenizer.download_nltk_data()
+    assert downloaded == [["wordnet"]]
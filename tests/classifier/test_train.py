@@ -2,4 +2,87 @@
 #
 # python test_train.py
 
-# TODO
+
+import os
+
+import numpy as np
+import pytest
+from sklearn.pipeline import Pipeline
+
+from src.classifier import bundle, tokenizer, train
+from tests.classifier.test_bundle import CATEGORY_NAMES, make_dataset
+
+
+def test_save_and_load_model(fake_nltk, tmp_path):
+    messages, Y = make_dataset()
+    model = train.build_model()
+    model.set_params(clf__estimator__n_estimators=5)
+    model.fit(messages, Y)
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    train.save_model(model, model_pickle_filename, CATEGORY_NAMES)
+    assert os.path.isdir(train.get_bundle_dirname(model_pickle_filename))
+
+    loaded_model = train.load_model(model_pickle_filename)
+    assert isinstance(loaded_model, bundle.BundleModel)
+    np.testing.assert_array_equal(loaded_model.predict(messages), model.predict(messages))
+    assert not isinstance(
+        train.load_model(model_pickle_filename, use_bundle=False), bundle.BundleModel
+    )
+
+    # A pickle saved without category names makes the old bundle stale
+    train.save_model(model, model_pickle_filename)
+    assert not isinstance(train.load_model(model_pickle_filename), bundle.BundleModel)
+
+
+def test_save_model_bundle_error(fake_nltk, monkeypatch, tmp_path):
+    messages, Y = make_dataset()
+    model = train.build_model()
+    model.set_params(clf__estimator__n_estimators=5)
+    model.fit(messages, Y)
+
+    def export_bundle(*args, **kwargs):
+        raise PermissionError("bundle in use")
+
+    monkeypatch.setattr(bundle, "export_bundle", export_bundle)
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    train.save_model(model, model_pickle_filename, CATEGORY_NAMES)
+    assert not isinstance(train.load_model(model_pickle_filename), bundle.BundleModel)
+
+
+class CaseSensitiveLemmatizer:
+    """
+    Lemmatizer knowing only the lowercase forms, as WordNet
+    """
+
+    def lemmatize(self, word):
+        return {"houses": "house", "flooded": "flood"}.get(word, word)
+
+
+@pytest.mark.parametrize("vectorizer", train.VECTORIZERS)
+def test_vectorizer_ignores_case(fake_nltk, monkeypatch, vectorizer):
+    monkeypatch.setattr(tokenizer, "_lemmatizer", CaseSensitiveLemmatizer())
+    messages = ["Houses FLOODED", "houses flooded"]
+    features = Pipeline(train.build_vectorizer(vectorizer)).fit_transform(messages).toarray()
+    np.testing.assert_array_equal(features[0], features[1])
+    tokenizer.pretokenize(messages)
+    np.testing.assert_array_equal(
+        Pipeline(train.build_vectorizer(vectorizer)).fit_transform(messages).toarray(), features
+    )
+
+
+def test_save_model_publishes_bundle_first(fake_nltk, monkeypatch, tmp_path):
+    messages, Y = make_dataset()
+    model = train.build_model()
+    model.set_params(clf__estimator__n_estimators=5)
+    model.fit(messages, Y)
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    export_bundle = bundle.export_bundle
+
+    def checked_export_bundle(*args, **kwargs):
+        # A registry polling now must not load a new pickle file without its bundle
+        assert not os.path.exists(model_pickle_filename)
+        export_bundle(*args, **kwargs)
+
+    monkeypatch.setattr(bundle, "export_bundle", checked_export_bundle)
+    train.save_model(model, model_pickle_filename, CATEGORY_NAMES)
+    assert isinstance(train.load_model(model_pickle_filename), bundle.BundleModel)
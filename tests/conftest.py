@@ -0,0 +1,80 @@
+# Shared test fixtures
+#
+# python -m pytest tests
+
+
+import re
+
+import pandas as pd
+import pytest
+
+from src.classifier import tokenizer
+from src.data_preparation import etl_pipeline
+
+CATEGORY_NAMES = ["related", "request", "offer", "aid_related", "child_alone"]
+
+
+def make_raw_dataframe():
+    """
+    Return a small uncleaned dataset shaped like the merge of disaster_messages.csv and disaster_categories.csv
+
+    Returns:
+        df (pandas.DataFrame): dataframe containing the uncleaned dataset
+    """
+    rows = [
+        (1, "Weather update - a cold front from Cuba", "Un front froid", "direct", "1;0;0;0;0"),
+        (2, "Is the Hurricane over or is it not over", "Cyclone nan fini", "direct", "1;0;0;1;0"),
+        (3, "We need water and food please", "Nou bezwen dlo", "direct", "1;1;0;1;0"),
+        (4, "There's nothing to eat and water", "Bon repo", "news", "1;1;0;1;0"),
+        (5, "Storm at sacred heart of Jesus", "", "social", "2;0;0;0;0"),
+        (5, "Storm at sacred heart of Jesus", "", "social", "2;0;0;0;0"),
+        (6, "Information about the national palace", "", "news", "0;0;1;0;0"),
+    ]
+    df = pd.DataFrame(rows, columns=["id", "message", "original", "genre", "categories"])
+    df["categories"] = df["categories"].apply(
+        lambda value: ";".join(
+            "{}-{}".format(name, flag)
+            for name, flag in zip(CATEGORY_NAMES, value.split(";"), strict=True)
+        )
+    )
+    return df
+
+
+@pytest.fixture
+def database_filename(tmp_path):
+    """
+    Return the filename of a small database created with the etl pipeline
+    """
+    filename = str(tmp_path / "db.sqlite3")
+    etl_pipeline.save_data(etl_pipeline.clean_data(make_raw_dataframe()), filename)
+    return filename
+
+
+class FakeLemmatizer:
+    """
+    Lemmatizer removing the plural "s", used instead of WordNet that needs the NLTK data
+    """
+
+    def lemmatize(self, word):
+        return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def fake_word_tokenize(text):
+    """
+    Tokenizer used instead of word_tokenize that needs the NLTK data
+    """
+    return re.findall(r"\w+|[^\w\s]", text)
+
+
+@pytest.fixture
+def fake_nltk(monkeypatch):
+    """
+    Replace the NLTK tokenizer and lemmatizer with implementations that need no downloaded data
+    """
+    monkeypatch.setattr(tokenizer, "word_tokenize", fake_word_tokenize)
+    monkeypatch.setattr(tokenizer, "_lemmatizer", FakeLemmatizer())
+    tokenizer.clean_token.cache_clear()
+    tokenizer.clear_corpus_cache()
+    yield
+    tokenizer.clean_token.cache_clear()
+    tokenizer.clear_corpus_cache()
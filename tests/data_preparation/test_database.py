@@ -0,0 +1,33 @@
+# Test database
+#
+# python test_database.py
+
+
+import pandas as pd
+
+from src.data_preparation import database, etl_pipeline
+from tests.conftest import make_raw_dataframe
+
+
+def test_write_and_read_messages(tmp_path):
+    database_filename = str(tmp_path / "db.sqlite3")
+    df = etl_pipeline.clean_data(make_raw_dataframe())
+    pragmas = {"journal_mode": "WAL", "synchronous": "OFF", "page_size": 8192}
+    database.write_messages(database_filename, df, pragmas=pragmas)
+    result = database.read_messages(database_filename)
+    pd.testing.assert_frame_equal(result, df.reset_index(drop=True), check_dtype=False)
+    assert (result.dtypes.iloc[database.N_MESSAGE_COLUMNS :] == "uint8").all()
+    with database.connect(database_filename) as connection:
+        assert connection.execute("PRAGMA page_size").fetchone()[0] == 8192
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        indexes = [row[1] for row in connection.execute('PRAGMA index_list("disaster_message")')]
+    assert sorted(indexes) == ["disaster_message_genre", "disaster_message_id"]
+
+
+def test_read_empty_table(tmp_path):
+    database_filename = str(tmp_path / "db.sqlite3")
+    df = etl_pipeline.clean_data(make_raw_dataframe()).iloc[:0]
+    database.write_messages(database_filename, df)
+    result = database.read_messages(database_filename)
+    assert len(result) == 0
+    assert list(result.columns) == list(df.columns)
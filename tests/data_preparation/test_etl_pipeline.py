@@ -2,4 +2,149 @@
 #
 # python test_etl_pipeline.py
 
-# TODO
+
+import os
+
+import pandas as pd
+import pytest
+
+from src import instrumentation
+from src.classifier import train
+from src.data_preparation import database, etl_pipeline, snapshot
+from tests.conftest import make_raw_dataframe
+
+
+@pytest.fixture
+def input_filenames(tmp_path):
+    df = make_raw_dataframe()
+    # Same id with two category rows, as in the original dataset
+    df = pd.concat([df, df.iloc[[2]].assign(categories=df["categories"].iloc[0])])
+    messages_filename = str(tmp_path / "messages.csv")
+    categories_filename = str(tmp_path / "categories.csv")
+    df[["id", "message", "original", "genre"]].to_csv(messages_filename, index=False)
+    df[["id", "categories"]].to_csv(categories_filename, index=False)
+    return messages_filename, categories_filename
+
+
+def test_process(input_filenames, tmp_path):
+    database_filename = str(tmp_path / "db.sqlite3")
+    etl_pipeline.process(*input_filenames, database_filename)
+    df = train.get_df_from_database(database_filename)
+    assert len(df) == 7
+    assert list(df.columns[:4]) == ["id", "message", "original", "genre"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_process_streaming(input_filenames, tmp_path, chunk_size):
+    expected_filename = str(tmp_path / "expected.sqlite3")
+    database_filename = str(tmp_path / "db.sqlite3")
+    etl_pipeline.process(*input_filenames, expected_filename)
+    stats = etl_pipeline.process_streaming(*input_filenames, database_filename, chunk_size)
+    expected = train.get_df_from_database(expected_filename)
+    df = train.get_df_from_database(database_filename)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    assert stats["rows_saved"] == len(expected)
+    assert stats["duplicates"] == 5
+    assert not os.path.exists(database_filename + ".staging")
+
+
+def test_process_streaming_empty_input(input_filenames, tmp_path):
+    database_filename = str(tmp_path / "db.sqlite3")
+    pd.read_csv(input_filenames[0]).iloc[:0].to_csv(input_filenames[0], index=False)
+    with pytest.raises(ValueError):
+        etl_pipeline.process_streaming(*input_filenames, database_filename)
+    assert not os.path.exists(database_filename + ".staging")
+
+
+def test_process_streaming_staging_error(tmp_path):
+    database_filename = str(tmp_path / "db.sqlite3")
+    categories_filename = str(tmp_path / "categories.csv")
+    pd.DataFrame({"id": [1], "other": ["a"]}).to_csv(categories_filename, index=False)
+    with pytest.raises(KeyError):
+        etl_pipeline.process_streaming(
+            str(tmp_path / "messages.csv"), categories_filename, database_filename
+        )
+    assert not os.path.exists(database_filename + ".staging")
+
+
+def test_clean_data_matches_reference():
+    from benchmarks.bench_clean_data import reference_clean_data
+
+    df = make_raw_dataframe()
+    expected = reference_clean_data(df)
+    cleaned = etl_pipeline.clean_data(df)
+    pd.testing.assert_frame_equal(cleaned, expected, check_dtype=False)
+    assert (cleaned.dtypes.iloc[4:] == "uint8").all()
+
+
+def test_decode_categories_reorders_by_name():
+    categories = pd.Series(["a-1;b-0;c-2", "b-1;a-0;c-1", "a-0;b-10;c-0"])
+    category_names, values = etl_pipeline.decode_categories(categories)
+    assert category_names == ["a", "b", "c"]
+    assert values.tolist() == [[1, 0, 2], [0, 1, 1], [0, 0, 0]]
+
+
+def test_decode_categories_invalid_names():
+    with pytest.raises(ValueError):
+        etl_pipeline.decode_categories(pd.Series(["a-1;b-0", "a-1;x-0"]))
+
+
+def test_process_incremental(input_filenames, tmp_path):
+    messages_filename, categories_filename = input_filenames
+    database_filename = str(tmp_path / "db.sqlite3")
+    stats = etl_pipeline.process_incremental(*input_filenames, database_filename)
+    assert (stats["inserted"], stats["updated"], stats["skipped"]) == (6, 0, 0)
+
+    stats = etl_pipeline.process_incremental(*input_filenames, database_filename)
+    assert stats["changed"] is False
+    assert (stats["inserted"], stats["updated"], stats["skipped"]) == (0, 0, 6)
+
+    messages = pd.read_csv(messages_filename)
+    messages.loc[0, "message"] = "Weather update - a warm front"
+    new_message = messages.iloc[[1]].assign(id=7)
+    pd.concat([messages, new_message]).to_csv(messages_filename, index=False)
+    categories = pd.read_csv(categories_filename)
+    pd.concat([categories, categories.iloc[[1]].assign(id=7)]).to_csv(
+        categories_filename, index=False
+    )
+    stats = etl_pipeline.process_incremental(*input_filenames, database_filename)
+    assert (stats["inserted"], stats["updated"], stats["skipped"]) == (1, 1, 5)
+
+    df = train.get_df_from_database(database_filename)
+    assert len(df) == 7
+    assert df.set_index("id").loc[1, "message"] == "Weather update - a warm front"
+
+
+def test_process_incremental_after_full_process(input_filenames, tmp_path):
+    database_filename = str(tmp_path / "db.sqlite3")
+    etl_pipeline.process(*input_filenames, database_filename)
+    etl_pipeline.process_incremental(*input_filenames, database_filename)
+    df = train.get_df_from_database(database_filename)
+    assert df["id"].is_unique
+    assert len(df) == 6
+    with database.connect(database_filename) as connection:
+        assert database.has_primary_key(connection)
+
+    etl_pipeline.process(*input_filenames, database_filename)
+    stats = etl_pipeline.process_incremental(*input_filenames, database_filename)
+    assert stats["changed"] is True
+
+
+def test_process_exports_snapshot(input_filenames, tmp_path):
+    database_filename = str(tmp_path / "db.sqlite3")
+    snapshot_dirname = str(tmp_path / "snapshot")
+    etl_pipeline.process(*input_filenames, database_filename, snapshot_dirname=snapshot_dirname)
+    assert len(snapshot.load_snapshot(snapshot_dirname).messages) == 7
+
+
+def test_process_records_stages(input_filenames, tmp_path):
+    metrics_filename = str(tmp_path / "metrics.jsonl")
+    instrumentation.configure(metrics_filename=metrics_filename)
+    try:
+        etl_pipeline.process(*input_filenames, str(tmp_path / "db.sqlite3"))
+    finally:
+        instrumentation.configure()
+    records = {record["stage"]: record for record in instrumentation.read_metrics(metrics_filename)}
+    assert list(records) == ["etl.load_data", "etl.clean_data", "etl.save_data", "etl.process"]
+    assert records["etl.save_data"]["rows"] == records["etl.process"]["rows"] == 7
+    assert records["etl.clean_data"]["parent"] == "etl.process"
@@ -0,0 +1,71 @@
+# Test metadata
+#
+# python test_metadata.py
+
+
+import numpy as np
+
+from src.config import GENRE_COUNT_TABLE_NAME
+from src.data_preparation import database, etl_pipeline, metadata
+from tests.conftest import CATEGORY_NAMES, make_raw_dataframe
+
+
+def test_get_metadata(database_filename):
+    dataset_metadata = metadata.get_metadata(database_filename)
+    assert dataset_metadata.category_names == CATEGORY_NAMES
+    assert dataset_metadata.genre_distribution == {"direct": 3, "news": 2, "social": 1}
+    assert dataset_metadata.category_totals == {
+        "related": 6,
+        "request": 2,
+        "offer": 1,
+        "aid_related": 3,
+        "child_alone": 0,
+    }
+
+
+def test_get_metadata_is_cached(database_filename):
+    assert metadata.get_metadata(database_filename) is metadata.get_metadata(database_filename)
+
+
+def test_get_metadata_invalidated_by_etl(database_filename):
+    before = metadata.get_metadata(database_filename)
+    df = etl_pipeline.clean_data(make_raw_dataframe().iloc[:3])
+    etl_pipeline.save_data(df, database_filename)
+    after = metadata.get_metadata(database_filename)
+    assert after is not before
+    assert sum(after.genre_distribution.values()) == 3
+
+
+def test_refresh_metadata(database_filename):
+    before = metadata.get_metadata(database_filename)
+    metadata.refresh_metadata(database_filename)
+    assert metadata.get_metadata(database_filename) is not before
+
+
+def test_category_cooccurrence(database_filename):
+    cooccurrence = metadata.get_metadata(database_filename).category_cooccurrence
+    # related is 2 for one message: co-occurrence counts messages, totals sum the values
+    np.testing.assert_array_equal(
+        cooccurrence,
+        [
+            [5, 2, 0, 3, 0],
+            [2, 2, 0, 2, 0],
+            [0, 0, 1, 0, 0],
+            [3, 2, 0, 3, 0],
+            [0, 0, 0, 0, 0],
+        ],
+    )
+
+
+def test_metadata_without_aggregate_tables(database_filename):
+    expected = metadata.get_metadata(database_filename)
+    with database.connect(database_filename) as connection:
+        assert database.table_exists(connection, GENRE_COUNT_TABLE_NAME)
+        connection.execute('DROP TABLE "{}"'.format(GENRE_COUNT_TABLE_NAME))
+    metadata.refresh_metadata(database_filename)
+    dataset_metadata = metadata.get_metadata(database_filename)
+    assert dataset_metadata.genre_distribution == expected.genre_distribution
+    assert dataset_metadata.category_totals == expected.category_totals
+    np.testing.assert_array_equal(
+        dataset_metadata.category_cooccurrence, expected.category_cooccurrence
+    )
@@ -0,0 +1,34 @@
+# Test snapshot
+#
+# python test_snapshot.py
+
+
+import numpy as np
+import pandas as pd
+
+from src.classifier import train
+from src.data_preparation import snapshot
+from tests.conftest import CATEGORY_NAMES
+
+
+def test_export_and_load_snapshot(database_filename, tmp_path):
+    snapshot_dirname = str(tmp_path / "snapshot")
+    assert snapshot.export_snapshot(database_filename, snapshot_dirname, chunk_size=2) == 6
+    training_snapshot = snapshot.load_snapshot(snapshot_dirname)
+    df = train.get_df_from_database(database_filename)
+    assert training_snapshot.category_names == CATEGORY_NAMES
+    assert training_snapshot.messages == df["message"].tolist()
+    assert training_snapshot.ids.tolist() == df["id"].tolist()
+    assert training_snapshot.labels.dtype == np.uint8
+    np.testing.assert_array_equal(training_snapshot.labels, df.iloc[:, 4:].to_numpy())
+    assert not snapshot.is_snapshot(str(tmp_path / "snapshot.tmp"))
+
+
+def test_load_data_from_snapshot(database_filename, tmp_path):
+    snapshot_dirname = str(tmp_path / "snapshot")
+    snapshot.export_snapshot(database_filename, snapshot_dirname)
+    X, Y, category_names = train.load_data(snapshot_dirname)
+    expected_X, expected_Y, expected_category_names = train.load_data(database_filename)
+    assert category_names == expected_category_names
+    pd.testing.assert_series_equal(X, expected_X, check_dtype=False)
+    pd.testing.assert_frame_equal(Y, expected_Y, check_dtype=False)
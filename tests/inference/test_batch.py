@@ -0,0 +1,90 @@
+# Test batch
+#
+# python test_batch.py
+
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config import PREDICTION_TABLE_NAME
+from src.inference import batch
+
+CATEGORY_NAMES = ["related", "request", "water"]
+
+
+class KeywordModel:
+    """
+    Model predicting each category when its name appears in the message
+    """
+
+    def __init__(self):
+        self.n_calls = 0
+
+    def predict(self, messages):
+        self.n_calls += 1
+        return np.array([[int(name in message) for name in CATEGORY_NAMES] for message in messages])
+
+
+def write_messages(filename, n_messages):
+    df = pd.DataFrame(
+        {
+            "id": range(n_messages),
+            "message": ["need water {}".format(i) for i in range(n_messages)],
+            "genre": "direct",
+        }
+    )
+    if filename.endswith(".csv"):
+        df.to_csv(filename, index=False)
+    else:
+        df.to_json(filename, orient="records", lines=True)
+
+
+def test_predict_file_csv(tmp_path):
+    input_filename = str(tmp_path / "messages.csv")
+    output_filename = str(tmp_path / "predictions.csv")
+    write_messages(input_filename, 25)
+    model = KeywordModel()
+    n_rows = batch.predict_file(
+        model, input_filename, output_filename, CATEGORY_NAMES, chunk_size=10
+    )
+    assert n_rows == 25
+    assert model.n_calls == 3
+    predictions = pd.read_csv(output_filename)
+    assert list(predictions.columns) == ["id", "message"] + CATEGORY_NAMES
+    assert predictions["id"].tolist() == list(range(25))
+    assert predictions["water"].sum() == 25
+    assert predictions["request"].sum() == 0
+
+
+def test_predict_file_parquet_schema(tmp_path):
+    pytest.importorskip("pyarrow")
+    input_filename = str(tmp_path / "messages.csv")
+    output_filename = str(tmp_path / "predictions.parquet")
+    # The second chunk has no ids (read as floating point) and no messages (all null)
+    pd.DataFrame(
+        {
+            "id": [0, 1, 2, None, None, None],
+            "message": ["need water", "request", "water", None, None, None],
+            "genre": "direct",
+        }
+    ).to_csv(input_filename, index=False)
+    batch.predict_file(KeywordModel(), input_filename, output_filename, CATEGORY_NAMES, 3)
+    predictions = pd.read_parquet(output_filename)
+    assert len(predictions) == 6
+    assert predictions["id"].tolist()[:3] == [0, 1, 2]
+    assert predictions["id"].isna().sum() == 3
+    assert predictions["water"].tolist() == [1, 0, 1, 0, 0, 0]
+
+
+def test_predict_file_jsonl_to_sqlite(tmp_path):
+    input_filename = str(tmp_path / "messages.jsonl")
+    output_filename = str(tmp_path / "predictions.sqlite3")
+    write_messages(input_filename, 7)
+    batch.predict_file(KeywordModel(), input_filename, output_filename, CATEGORY_NAMES, 3)
+    with sqlite3.connect(output_filename) as connection:
+        predictions = pd.read_sql("SELECT * FROM {}".format(PREDICTION_TABLE_NAME), connection)
+    assert len(predictions) == 7
+    assert predictions["water"].tolist() == [1] * 7
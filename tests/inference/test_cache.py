@@ -0,0 +1,82 @@
+# Test cache
+#
+# python test_cache.py
+
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.tree import DecisionTreeClassifier
+
+from src.classifier import tokenizer
+from src.inference import cache
+from tests.inference.test_batch import KeywordModel
+
+
+def test_normalize_message():
+    assert cache.normalize_message(
+        "  Need WATER at http://a.com/x\n now ", tokenizer.preprocess
+    ) == ("need water at urlplaceholder now")
+    assert cache.normalize_message("Need  WATER") == "Need WATER"
+
+
+def test_prediction_cache_predict():
+    model = KeywordModel()
+    prediction_cache = cache.PredictionCache()
+    first = prediction_cache.predict(model, ["need water", "Need  WATER", "request"])
+    second = prediction_cache.predict(model, ["need water http://a.com", "need water"])
+    # The model has no vectorizer lowercasing the messages: the case is kept in the keys
+    np.testing.assert_array_equal(first, [[0, 0, 1], [0, 0, 0], [0, 1, 0]])
+    np.testing.assert_array_equal(second, [[0, 0, 1], [0, 0, 1]])
+    assert model.n_calls == 2
+    assert prediction_cache.get_stats()["hits"] == 1
+
+
+def test_prediction_cache_lru_and_ttl(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    prediction_cache = cache.PredictionCache(maxsize=2, ttl=10)
+    prediction_cache.put("a", 1)
+    prediction_cache.put("b", 2)
+    assert prediction_cache.get("a") == 1
+    prediction_cache.put("c", 3)
+    assert prediction_cache.get("b") is None
+    now[0] = 11.0
+    assert prediction_cache.get("a") is None
+
+
+def test_prediction_cache_model_version():
+    prediction_cache = cache.PredictionCache()
+    prediction_cache.put("a", 1, model_version="1")
+    assert prediction_cache.get("a", model_version="1") == 1
+    assert prediction_cache.get("a", model_version="2") is None
+    assert prediction_cache.get_stats()["size"] == 0
+
+
+def test_get_model_version(tmp_path):
+    model_pickle_filename = tmp_path / "model.pkl"
+    assert cache.get_model_version(str(model_pickle_filename)) is None
+    model_pickle_filename.write_bytes(b"model")
+    version = cache.get_model_version(str(model_pickle_filename))
+    model_pickle_filename.write_bytes(b"new model")
+    assert cache.get_model_version(str(model_pickle_filename)) != version
+
+
+@pytest.mark.parametrize("lowercase", [True, False])
+def test_prediction_cache_follows_model_preprocessing(lowercase):
+    messages = ["Flood here", "flood here"] * 5
+    Y = np.array([[1, 0], [0, 1]] * 5)
+    model = Pipeline(
+        [("vect", CountVectorizer(lowercase=lowercase)), ("clf", DecisionTreeClassifier())]
+    ).fit(messages, Y)
+    prediction_cache = cache.PredictionCache()
+    np.testing.assert_array_equal(
+        prediction_cache.predict(model, ["Flood here", "flood here"]),
+        model.predict(["Flood here", "flood here"]),
+    )
+    np.testing.assert_array_equal(
+        prediction_cache.predict(model, ["flood  here", "FLOOD here"]),
+        model.predict(["flood  here", "FLOOD here"]),
+    )
+    assert prediction_cache.get_stats()["size"] == (1 if lowercase else 3)
@@ -0,0 +1,104 @@
+# Test metrics
+#
+# python test_metrics.py
+
+
+import numpy as np
+import pytest
+
+from src.classifier import bundle, tokenizer, train
+from src.inference import cache, metrics
+from tests.inference.test_batch import KeywordModel
+
+
+def test_latency_recorder():
+    recorder = metrics.LatencyRecorder(window=10)
+    for i in range(20):
+        recorder.record(i / 1000, items=2)
+    stats = recorder.get_stats()
+    assert stats["count"] == 20 and stats["items"] == 40
+    # Percentiles on the 10 most recent latencies
+    assert stats["p50_ms"] == 14.5
+
+
+def test_histogram_prometheus():
+    histogram = metrics.Histogram((1, 4))
+    for value in [1, 2, 3, 10]:
+        histogram.observe(value)
+    assert histogram.to_prometheus("size", {"stage": 'a"b'}) == [
+        'size_bucket{stage="a\\"b",le="1"} 1',
+        'size_bucket{stage="a\\"b",le="4"} 3',
+        'size_bucket{stage="a\\"b",le="+Inf"} 4',
+        'size_sum{stage="a\\"b"} 16.0',
+        'size_count{stage="a\\"b"} 4',
+    ]
+
+
+def train_model(database_filename, vectorizer=train.DEFAULT_VECTORIZER):
+    X, Y, category_names = train.load_data(database_filename)
+    model = train.build_model(classifier="linear", vectorizer=vectorizer)
+    model.fit(X, Y)
+    return model, X, category_names
+
+
+@pytest.mark.parametrize("vectorizer", train.VECTORIZERS)
+def test_predict_with_stages(fake_nltk, database_filename, vectorizer):
+    model, X, _ = train_model(database_filename, vectorizer)
+    messages = list(X) + ["A message never seen"]
+    category_predicted, stage_seconds = metrics.predict_with_stages(model, messages)
+    assert np.array_equal(category_predicted, model.predict(messages))
+    assert all(stage_seconds[stage] >= 0 for stage in metrics.INFERENCE_STAGES)
+    # The texts pre-tokenized for the training are not used nor modified by the serving path
+    assert tokenizer.get_untokenized_texts(messages) == list(dict.fromkeys(messages))
+    tokenizer.pretokenize(X)
+    metrics.predict_with_stages(model, messages)
+    assert tokenizer.get_untokenized_texts(messages) == ["A message never seen"]
+    assert model.named_steps["vect"].analyzer == "word"
+    np.testing.assert_array_equal(
+        metrics.predict_with_stages(model, messages)[0], category_predicted
+    )
+
+
+def test_predict_with_stages_bundle(fake_nltk, database_filename, tmp_path):
+    X, Y, category_names = train.load_data(database_filename)
+    model = train.build_model()
+    model.set_params(clf__estimator__n_estimators=3)
+    model.fit(X, Y)
+    bundle_dirname = str(tmp_path / "bundle")
+    bundle.export_bundle(model, category_names, bundle_dirname)
+    bundle_model = bundle.load_bundle(bundle_dirname)
+    category_predicted, stage_seconds = metrics.predict_with_stages(bundle_model, list(X))
+    assert np.array_equal(category_predicted, bundle_model.predict(list(X)))
+    assert stage_seconds["vectorize"] is not None
+
+
+def test_predict_with_stages_not_a_pipeline():
+    category_predicted, stage_seconds = metrics.predict_with_stages(KeywordModel(), ["water"])
+    assert category_predicted.shape[0] == 1
+    assert stage_seconds["tokenize"] is None and stage_seconds["vectorize"] is None
+    assert stage_seconds["classify"] >= 0
+
+
+def test_inference_metrics():
+    inference_metrics = metrics.InferenceMetrics()
+    prediction_cache = cache.PredictionCache()
+    model = metrics.InstrumentedModel(KeywordModel(), inference_metrics)
+    for messages in [["water", "need water"], ["water"]]:
+        prediction_cache.predict(model, messages)
+        inference_metrics.record_request(0.002, len(messages))
+    stats = inference_metrics.get_stats(prediction_cache)
+    assert stats["requests"]["count"] == 2 and stats["requests"]["items"] == 3
+    assert stats["batches"] == {"count": 1, "messages": 2}
+    assert stats["stages"]["classify"]["count"] == 1
+    assert stats["prediction_cache"]["hits"] == 1
+
+    text = inference_metrics.to_prometheus(prediction_cache, model_version="123")
+    lines = text.splitlines()
+    assert "disaster_response_requests_total 2" in lines
+    assert "disaster_response_messages_total 3" in lines
+    assert 'disaster_response_stage_seconds_count{stage="classify"} 1' in lines
+    assert 'disaster_response_stage_seconds_count{stage="tokenize"} 0' in lines
+    assert 'disaster_response_batch_size_bucket{le="2"} 1' in lines
+    assert "disaster_response_prediction_cache_hits_total 1" in lines
+    assert 'disaster_response_model_info{version="123"} 1' in lines
+    assert "# TYPE disaster_response_request_seconds histogram" in lines
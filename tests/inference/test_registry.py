@@ -0,0 +1,146 @@
+# Test registry
+#
+# python test_registry.py
+
+
+import asyncio
+import pickle
+import time
+
+import numpy as np
+
+from src.inference import cache, registry, service
+from tests.inference.test_batch import CATEGORY_NAMES, KeywordModel
+from tests.inference.test_service import post
+
+
+class BrokenModel:
+    """
+    Model returning a prediction with the wrong shape
+    """
+
+    def predict(self, messages):
+        return np.zeros(len(messages))
+
+
+def write_model(filename, model, tag):
+    # The tag changes the size of the file, so that the version changes even within the mtime resolution
+    model.tag = tag
+    with open(filename, "wb") as f:
+        pickle.dump(model, f)
+
+
+def load_model(filename):
+    with open(filename, "rb") as f:
+        return pickle.load(f)
+
+
+def test_reload(tmp_path):
+    filename = str(tmp_path / "model.pkl")
+    model_registry = registry.ModelRegistry(filename, loader=load_model)
+    assert model_registry.reload() is False
+    assert model_registry.get() is None
+
+    write_model(filename, KeywordModel(), "a")
+    assert model_registry.reload() is True
+    old = model_registry.get()
+    assert old.version == cache.get_model_version(filename)
+    assert model_registry.reload() is False
+
+    write_model(filename, KeywordModel(), "bb")
+    assert model_registry.reload() is True
+    assert model_registry.get().version != old.version
+    # A caller holding the old version keeps using it
+    assert old.model.predict(["water"]).tolist() == [[0, 0, 1]]
+
+    write_model(filename, BrokenModel(), "ccc")
+    current = model_registry.get()
+    assert model_registry.reload() is False
+    assert model_registry.get() is current
+    assert model_registry.get_stats()["last_error"].startswith("ValueError")
+    assert model_registry.reload() is False
+    assert model_registry.get_stats()["reloads"] == 2
+
+    # A truncated pickle file is rejected as well
+    with open(filename, "wb") as f:
+        f.write(pickle.dumps(KeywordModel())[:10])
+    assert model_registry.reload() is False
+    assert model_registry.get() is current
+
+
+def test_watcher(tmp_path):
+    filename = str(tmp_path / "model.pkl")
+    write_model(filename, KeywordModel(), "a")
+    model_registry = registry.ModelRegistry(filename, loader=load_model, poll_interval=0.01)
+    model_registry.reload()
+    version = model_registry.get().version
+    model_registry.start()
+    try:
+        write_model(filename, KeywordModel(), "bb")
+        deadline = time.monotonic() + 5
+        while model_registry.get().version == version and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        model_registry.stop()
+    assert model_registry.get().version == cache.get_model_version(filename)
+
+
+def test_service_model_version(tmp_path):
+    filename = str(tmp_path / "model.pkl")
+    write_model(filename, KeywordModel(), "a")
+    model_registry = registry.ModelRegistry(filename, loader=load_model)
+    model_registry.reload()
+
+    async def run():
+        inference_service = service.InferenceService(model_registry, CATEGORY_NAMES)
+        port = await inference_service.start("127.0.0.1", 0)
+        try:
+            return await post(port, "/classify", {"message": "need water"})
+        finally:
+            await inference_service.stop()
+
+    status, response = asyncio.run(run())
+    assert status == 200
+    assert response["categories"] == ["water"]
+    assert response["model_version"] == model_registry.get().version
+
+
+class FinishedProcess:
+    """
+    Stand-in of a multiprocessing.Process that has exited
+    """
+
+    def __init__(self, exitcode):
+        self.exitcode = exitcode
+
+    def is_alive(self):
+        return False
+
+
+def test_readiness(tmp_path):
+    filename = str(tmp_path / "model.pkl")
+    model_registry = registry.ModelRegistry(filename, loader=load_model)
+    assert registry.get_readiness(model_registry)[1]["status"] == "warming"
+    assert registry.get_readiness(model_registry, FinishedProcess(1))[1]["status"] == "failed"
+
+    async def run():
+        inference_service = service.InferenceService(
+            model_registry, lambda: CATEGORY_NAMES, training_process=FinishedProcess(0)
+        )
+        port = await inference_service.start("127.0.0.1", 0)
+        try:
+            warming = await post(port, "/ready", {})
+            rejected = await post(port, "/classify", {"message": "need water"})
+            write_model(filename, KeywordModel(), "a")
+            model_registry.reload()
+            ready = await post(port, "/ready", {})
+            classified = await post(port, "/classify", {"message": "need water"})
+        finally:
+            await inference_service.stop()
+        return warming, rejected, ready, classified
+
+    warming, rejected, ready, classified = asyncio.run(run())
+    assert warming == (503, {"status": "warming", "model_version": None, "last_error": None})
+    assert rejected[0] == 503
+    assert ready[0] == 200 and ready[1]["model_version"] == model_registry.get().version
+    assert classified[1]["categories"] == ["water"]
@@ -0,0 +1,123 @@
+# Test service
+#
+# python test_service.py
+
+
+import asyncio
+import json
+
+from src.inference import service
+from tests.inference.test_batch import CATEGORY_NAMES, KeywordModel
+
+
+class FailingModel:
+    """
+    Model failing to predict
+    """
+
+    def predict(self, messages):
+        raise RuntimeError("model failure")
+
+
+async def post(port, path, payload):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        "POST {} HTTP/1.1\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+            path, len(body)
+        ).encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, response_body = response.partition(b"\r\n\r\n")
+    return int(status_line.split()[1]), json.loads(response_body)
+
+
+async def get_text(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write("GET {} HTTP/1.1\r\nConnection: close\r\n\r\n".format(path).encode("latin-1"))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    headers, _, response_body = response.partition(b"\r\n\r\n")
+    assert b"Content-Type: text/plain" in headers
+    return response_body.decode("utf-8")
+
+
+def test_micro_batching():
+    async def run():
+        model = KeywordModel()
+        inference_service = service.InferenceService(
+            model, CATEGORY_NAMES, max_batch_size=8, max_wait_ms=50
+        )
+        port = await inference_service.start("127.0.0.1", 0)
+        try:
+            responses = await asyncio.gather(
+                *(post(port, "/classify", {"message": "need water"}) for _ in range(16))
+            )
+            status, batch_response = await post(
+                port, "/classify", {"messages": ["request", "water"]}
+            )
+            metrics = inference_service.get_metrics()
+            prometheus = await get_text(port, "/metrics/prometheus")
+            not_found = await post(port, "/unknown", {})
+            bad_request = await post(port, "/classify", {"text": "water"})
+        finally:
+            await inference_service.stop()
+        return model, responses, status, batch_response, metrics, prometheus, not_found, bad_request
+
+    model, responses, status, batch_response, metrics, prometheus, not_found, bad_request = (
+        asyncio.run(run())
+    )
+    assert all(
+        response == (200, {"message": "need water", "categories": ["water"]})
+        for response in responses
+    )
+    assert model.n_calls < 16
+    assert status == 200
+    assert [result["categories"] for result in batch_response["results"]] == [
+        ["request"],
+        ["water"],
+    ]
+    assert metrics["batches"]["items"] == 18
+    assert metrics["requests"]["count"] == 17
+    assert metrics["requests"]["p99_ms"] >= metrics["requests"]["p50_ms"]
+    assert metrics["stages"]["classify"]["items"] == 18
+    assert "disaster_response_requests_total 17" in prometheus.splitlines()
+    assert not_found[0] == 404
+    assert bad_request[0] == 400
+
+
+def test_invalid_requests():
+    async def run():
+        inference_service = service.InferenceService(KeywordModel(), CATEGORY_NAMES)
+        port = await inference_service.start("127.0.0.1", 0)
+        try:
+            return await asyncio.gather(
+                post(port, "/classify", {"messages": "abc"}),
+                post(port, "/classify", ["water"]),
+                post(port, "/classify", {"messages": [1]}),
+            )
+        finally:
+            await inference_service.stop()
+
+    assert [status for status, _ in asyncio.run(run())] == [400, 400, 400]
+
+
+def test_model_failure():
+    async def run():
+        inference_service = service.InferenceService(FailingModel(), CATEGORY_NAMES)
+        port = await inference_service.start("127.0.0.1", 0)
+        try:
+            failure = await post(port, "/classify", {"message": "water"})
+            health = await post(port, "/health", {})
+        finally:
+            await inference_service.stop()
+        return failure, health
+
+    (status, response), health = asyncio.run(run())
+    assert status == 500
+    assert "model failure" in response["error"]
+    assert health[0] == 200
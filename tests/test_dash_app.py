@@ -2,4 +2,44 @@
 #
 # python test_dash_app.py
 
-# TODO
+
+import dash_app
+import disaster_response_pipeline
+from src.data_preparation import etl_pipeline
+from tests.conftest import make_raw_dataframe
+
+
+def test_ready_while_warming(monkeypatch, tmp_path):
+    # No model in the working directory and no training started
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(disaster_response_pipeline, "start_background_training", lambda: None)
+    app = dash_app._create_app()
+    response = app.server.test_client().get("/ready")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "warming"
+
+
+def test_overview_figures_cached(database_filename):
+    figures = dash_app.get_overview_figures(database_filename)
+    assert dash_app.get_overview_figures(database_filename) is figures
+    assert figures["genre_distribution"]["data"][0]["y"] == [3, 2, 1]
+    assert len(figures["categories_cooccurrence"]["data"][0]["z"]) == 5
+
+    # Rewriting the database rebuilds the figures
+    df = etl_pipeline.clean_data(make_raw_dataframe().iloc[:3])
+    etl_pipeline.save_data(df, database_filename)
+    new_figures = dash_app.get_overview_figures(database_filename)
+    assert new_figures is not figures
+    assert new_figures["genre_distribution"]["data"][0]["y"] == [3]
+
+
+def test_metrics_endpoint(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(disaster_response_pipeline, "start_background_training", lambda: None)
+    app = dash_app._create_app()
+    response = app.server.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    assert "# TYPE disaster_response_stage_seconds histogram" in text
+    assert "disaster_response_prediction_cache_hits_total" in text
@@ -2,4 +2,136 @@
 #
 # python test_disaster_response_pipeline.py
 
-# TODO
+
+import os
+
+import disaster_response_pipeline
+from src.classifier import train
+from src.data_preparation import etl_pipeline
+
+
+def test_get_category_names(database_filename):
+    assert disaster_response_pipeline.get_category_names(database_filename) == [
+        "related",
+        "request",
+        "offer",
+        "aid_related",
+        "child_alone",
+    ]
+
+
+def test_get_genre_distribution(database_filename):
+    assert disaster_response_pipeline.get_genre_distribution(database_filename) == {
+        "direct": 3,
+        "news": 2,
+        "social": 1,
+    }
+
+
+def test_get_top_n_categories(database_filename):
+    top_n_categories = disaster_response_pipeline.get_top_n_categories(database_filename)
+    assert list(top_n_categories) == ["aid_related", "request", "offer", "child_alone"]
+    assert disaster_response_pipeline.get_top_n_categories(database_filename, n=3) == {
+        "aid_related": 3,
+        "request": 2,
+    }
+
+
+def test_prepare_model_uses_database_filename(monkeypatch, database_filename, tmp_path):
+    calls = []
+    monkeypatch.setattr(etl_pipeline, "process", lambda **kwargs: calls.append("etl"))
+    monkeypatch.setattr(
+        train,
+        "train",
+        lambda **kwargs: calls.append(kwargs["database_filename"]),
+    )
+    disaster_response_pipeline.prepare_model(
+        database_filename=database_filename, model_pickle_filename=str(tmp_path / "model.pkl")
+    )
+    # The database exists, so the data is not processed again
+    assert calls == [database_filename]
+    assert not os.path.exists(str(tmp_path / "model.pkl.lock"))
+
+
+def test_prepare_model_waits_for_other_training(monkeypatch, database_filename, tmp_path):
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    # Another running process (this one) holds the lock and writes the pickle file
+    with open(model_pickle_filename + ".lock", "w") as f:
+        f.write(str(os.getpid()))
+    calls = []
+    monkeypatch.setattr(train, "train", lambda **kwargs: calls.append("train"))
+
+    def sleep(seconds):
+        with open(model_pickle_filename, "wb") as f:
+            f.write(b"")
+
+    monkeypatch.setattr(disaster_response_pipeline.time, "sleep", sleep)
+    disaster_response_pipeline.prepare_model(
+        database_filename=database_filename, model_pickle_filename=model_pickle_filename
+    )
+    assert calls == []
+
+
+def test_prepare_model_removes_stale_lock(monkeypatch, database_filename, tmp_path):
+    model_pickle_filename = str(tmp_path / "model.pkl")
+    with open(model_pickle_filename + ".lock", "w") as f:
+        f.write("999999999")
+    calls = []
+    monkeypatch.setattr(train, "train", lambda **kwargs: calls.append("train"))
+    disaster_response_pipeline.prepare_model(
+        database_filename=database_filename, model_pickle_filename=model_pickle_filename
+    )
+    assert calls == ["train"]
+    assert not os.path.exists(model_pickle_filename + ".lock")
+
+
+def test_start_background_training_model_present(tmp_path):
+    model_pickle_filename = tmp_path / "model.pkl"
+    model_pickle_filename.write_bytes(b"")
+    assert (
+        disaster_response_pipeline.start_background_training(
+            model_pickle_filename=str(model_pickle_filename)
+        )
+        is None
+    )
+
+
+def test_get_category_cooccurrence(database_filename):
+    category_cooccurrence = disaster_response_pipeline.get_category_cooccurrence(database_filename)
+    assert list(category_cooccurrence.columns) == list(category_cooccurrence.index)
+    assert category_cooccurrence.loc["related", "aid_related"] == 3
+    assert category_cooccurrence.loc["offer", "offer"] == 1
+
+
+def test_acquire_training_lock_without_pid(tmp_path):
+    lock_filename = str(tmp_path / "model.pkl.lock")
+    # Created but its pid not written yet: the lock is held
+    open(lock_filename, "w").close()
+    assert disaster_response_pipeline._acquire_training_lock(lock_filename) is False
+    # Left empty by a process that died before writing its pid
+    old = (
+        os.stat(lock_filename).st_mtime - 2 * disaster_response_pipeline.TRAINING_LOCK_STALE_SECONDS
+    )
+    os.utime(lock_filename, (old, old))
+    assert disaster_response_pipeline._acquire_training_lock(lock_filename) is True
+    with open(lock_filename) as f:
+        assert f.read() == str(os.getpid())
+
+
+def test_acquire_training_lock_keeps_fresh_lock(monkeypatch, tmp_path):
+    lock_filename = str(tmp_path / "model.pkl.lock")
+    with open(lock_filename, "w") as f:
+        f.write("999999999")
+    replace = os.replace
+
+    def replace_after_other_waiter(source, destination):
+        # Another waiter removed the stale lock and created its own in the meantime
+        with open(source, "w") as f:
+            f.write(str(os.getpid()))
+        replace(source, destination)
+
+    monkeypatch.setattr(disaster_response_pipeline.os, "replace", replace_after_other_waiter)
+    assert disaster_response_pipeline._acquire_training_lock(lock_filename) is False
+    with open(lock_filename) as f:
+        assert f.read() == str(os.getpid())
+    assert os.listdir(str(tmp_path)) == ["model.pkl.lock"]
@@ -0,0 +1,57 @@
+# Test import time
+#
+# python test_import_time.py
+
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules needed only to train the model or to tokenize, imported when they are used
+DEFERRED_MODULES = ["sklearn", "nltk", "src.classifier.train", "src.data_preparation.etl_pipeline"]
+# Generous bound of the import of the CLI module, that takes a few tenths of a second when
+# the deferred modules are not imported and seconds when they are
+CLI_IMPORT_TIME_BUDGET = 1.5
+
+
+def get_import_times(module_name):
+    """
+    Return the cumulative import time of every module imported by a fresh interpreter importing module_name
+
+    Args:
+        module_name (str): module imported
+
+    Returns:
+        import_times (dict): dictionary of the cumulative import times in seconds (module, seconds)
+    """
+    environ = {name: value for name, value in os.environ.items() if not name.startswith("DRP_")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import {}".format(module_name)],
+        cwd=PROJECT_FOLDER,
+        env=environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        import_times[name.strip()] = int(cumulative) / 10**6
+    return import_times
+
+
+@pytest.mark.parametrize("module_name", ["disaster_response_pipeline", "dash_app"])
+def test_deferred_imports(module_name):
+    import_times = get_import_times(module_name)
+    assert module_name in import_times
+    assert [name for name in DEFERRED_MODULES if name in import_times] == []
+
+
+def test_cli_import_time():
+    import_times = get_import_times("disaster_response_pipeline")
+    assert import_times["disaster_response_pipeline"] < CLI_IMPORT_TIME_BUDGET
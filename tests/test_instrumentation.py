@@ -0,0 +1,91 @@
+# Test instrumentation
+#
+# python test_instrumentation.py
+
+
+import os
+
+import pytest
+
+from src import instrumentation
+
+
+@pytest.fixture
+def metrics_filename(tmp_path):
+    filename = str(tmp_path / "metrics.jsonl")
+    instrumentation.configure(metrics_filename=filename)
+    yield filename
+    instrumentation.configure()
+
+
+def test_disabled():
+    assert instrumentation.is_enabled() is False
+    with instrumentation.span("stage", rows=10) as stage:
+        stage.set_rows(20)
+        stage.set(mode="full")
+    assert instrumentation.span("other") is stage
+
+
+def test_span(metrics_filename):
+    with instrumentation.span("outer", mode="full") as outer:
+        with instrumentation.span("inner", rows=100):
+            data = bytearray(2**20)
+        outer.set_rows(len(data))
+    records = instrumentation.read_metrics(metrics_filename)
+    assert [record["stage"] for record in records] == ["inner", "outer"]
+    inner, outer = records
+    assert inner["parent"] == "outer" and outer["parent"] is None
+    assert inner["rows"] == 100 and outer["rows"] == 2**20
+    assert outer["mode"] == "full"
+    assert outer["wall_seconds"] >= inner["wall_seconds"] >= 0
+    assert inner["cpu_seconds"] >= 0
+    if inner["peak_rss_mb"] is not None:
+        assert outer["peak_rss_mb"] >= inner["peak_rss_mb"]
+    assert inner["status"] == "ok"
+
+
+def test_span_error(metrics_filename):
+    with pytest.raises(ValueError):
+        with instrumentation.span("failing"):
+            raise ValueError("failed")
+    (record,) = instrumentation.read_metrics(metrics_filename)
+    assert record["status"] == "error"
+    with instrumentation.span("next"):
+        pass
+    assert instrumentation.read_metrics(metrics_filename)[-1]["parent"] is None
+
+
+def test_instrumented(metrics_filename):
+    @instrumentation.instrumented("square")
+    def square(x):
+        return x * x
+
+    assert square(3) == 9
+    assert instrumentation.read_metrics(metrics_filename)[0]["stage"] == "square"
+
+
+def test_profile_and_trace_memory(tmp_path):
+    profile_dirname = str(tmp_path / "profiles")
+    metrics_filename = str(tmp_path / "metrics.jsonl")
+    instrumentation.configure(metrics_filename, profile_dirname, ["outer"], trace_memory=True)
+    try:
+        with instrumentation.span("outer"):
+            with instrumentation.span("inner"):
+                data = [str(i) for i in range(10000)]
+    finally:
+        instrumentation.configure()
+    assert len(data) == 10000
+    assert os.listdir(profile_dirname) == ["outer.{}.prof".format(os.getpid())]
+    inner, outer = instrumentation.read_metrics(metrics_filename)
+    assert inner["traced_peak_mb"] > 0
+    assert outer["traced_peak_mb"] >= inner["traced_peak_mb"]
+
+
+def test_configure_from_environment(tmp_path):
+    metrics_filename = str(tmp_path / "metrics.jsonl")
+    instrumentation.configure_from_environment({"DRP_METRICS_FILENAME": metrics_filename})
+    try:
+        assert instrumentation.is_enabled() is True
+    finally:
+        instrumentation.configure_from_environment({})
+    assert instrumentation.is_enabled() is False